@@ -0,0 +1,263 @@
+# Benchmarks.py
+# Banco de pruebas de rendimiento sin red sobre el libro incluido y versiones escaladas.
+# Uso: python Benchmarks.py [--scales 1 10 100 1000] [--no-pdf] [--compare REF]
+# La primera ejecución genera los XLSX escalados (x100 tarda varios minutos).
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import RecipeLoader
+from RecipeLoader import LOCAL_EXCEL, compile_workbook, is_recipe_sheet
+from RecipeIndex import RecipeIndex
+from CocinaCore import CocinaCore
+from MenuOptimizer import MenuOptimizer
+from RecipeSearch import RecipeSearch
+from WeekPlanner import WeekPlan
+from PdfRenderer import render_pdf
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, ".benchmarks")
+BOOKS_DIR = os.path.join(RESULTS_DIR, "books")
+
+MENU_REQUEST = {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Pescados': 2, 'Postres': 1}
+PANTRY = ['Sal', 'Aceite de oliva', 'Cebolla', 'Diente de ajo', 'Pimienta',
+          'Perejil', 'Patata', 'Huevo', 'Harina', 'Leche']
+# Semanas del plan multisemana
+WEEKS = 8
+# A partir de este factor no se escribe/parsea el XLSX (minutos con openpyxl)
+MAX_LOAD_SCALE = 100
+# Tiempo mínimo de medida por prueba y número máximo de repeticiones
+MIN_TIME = 0.5
+MAX_REPEATS = 50
+# Diferencia relativa a partir de la cual se marca una regresión
+REGRESSION_THRESHOLD = 0.2
+
+
+def scale_sheets(sheets, factor):
+    """Libro con cada hoja de recetas repetida `factor` veces (platos renombrados)"""
+    if factor == 1:
+        return sheets
+    scaled = {}
+    for name, df in sheets.items():
+        if not is_recipe_sheet(df):
+            scaled[name] = df
+            continue
+        copies = []
+        for i in range(factor):
+            copy = df.copy()
+            copy['Plato'] = copy['Plato'].astype('string') + f" ({i + 1})"
+            copies.append(copy)
+        scaled[name] = pd.concat(copies, ignore_index=True)
+    # Mismo vocabulario común que un libro recién cargado
+    RecipeLoader.intern_frames([df for df in scaled.values() if is_recipe_sheet(df)])
+    return scaled
+
+
+def scaled_book_path(sheets, factor):
+    """XLSX del libro escalado, generado una sola vez en .benchmarks/books"""
+    if factor == 1:
+        return LOCAL_EXCEL
+    path = os.path.join(BOOKS_DIR, f"CocinaArguinyano-x{factor}.xlsx")
+    if not os.path.exists(path):
+        os.makedirs(BOOKS_DIR, exist_ok=True)
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            for name, df in scale_sheets(sheets, factor).items():
+                df.to_excel(writer, sheet_name=name, index=False)
+    return path
+
+
+def measure(func, min_time=MIN_TIME, max_repeats=MAX_REPEATS):
+    """
+    Ejecuta func hasta acumular min_time segundos (como mínimo una vez) y
+    devuelve los tiempos en ms junto con el pico de memoria de una
+    ejecución adicional bajo tracemalloc.
+    """
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        while len(times) < max_repeats and sum(times) < min_time * 1000:
+            gc.collect()
+            t0 = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - t0) * 1000)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'min_ms': min(times),
+        'median_ms': statistics.median(times),
+        'repeats': len(times),
+        'peak_mb': peak / 2**20,
+    }
+
+
+def bench_scale(base_sheets, factor, cache_dir):
+    """Pruebas de un libro escalado por `factor`"""
+    results = {}
+    sheets = scale_sheets(base_sheets, factor)
+
+    if factor <= MAX_LOAD_SCALE:
+        path = scaled_book_path(base_sheets, factor)
+        with open(path, "rb") as f:
+            data = f.read()
+        results['load_recipes_cold'] = measure(lambda: compile_workbook(data), max_repeats=3)
+        # Primera llamada para generar la instantánea; después se mide la carga en caliente
+        with contextlib.redirect_stdout(io.StringIO()):
+            RecipeLoader.load_recipes(path, cache_dir)
+        results['load_recipes'] = measure(lambda: RecipeLoader.load_recipes(path, cache_dir))
+
+    results['build_index'] = measure(lambda: RecipeIndex.from_sheets(sheets), max_repeats=5)
+
+    if factor <= MAX_LOAD_SCALE:
+        # El índice de búsqueda se construye al compilar (va en la instantánea)
+        results['build_search'] = measure(lambda: RecipeSearch.from_sheets(sheets), max_repeats=3)
+        search = RecipeSearch.from_sheets(sheets)
+        results['search'] = measure(lambda: search.search_ids("algo con garbanzos"))
+        results['search_fuzzy'] = measure(lambda: search.search_ids("garbansos"))
+
+    core = CocinaCore(selected_dishes=MENU_REQUEST)
+    core.load(sheets)
+    results['get_selected_dishes'] = measure(lambda: core.get_selected_dishes())
+    optimizer = MenuOptimizer(core.recipe_index, 'distinct')
+    results['pantry_filter'] = measure(lambda: core.recipe_index.pantry_filter(PANTRY, 4))
+    results['optimize_menu'] = measure(lambda: optimizer.select(MENU_REQUEST), max_repeats=10)
+    plan = WeekPlan.generate(core.recipe_index, MENU_REQUEST, WEEKS, verbose=False)
+    results['plan_weeks'] = measure(lambda: WeekPlan.generate(core.recipe_index, MENU_REQUEST,
+                                                              WEEKS, verbose=False))
+    results['swap_dish'] = measure(lambda: plan.swap(0, plan.weeks[0][0]))
+    results['get_ingredients_from_dishes'] = measure(
+        lambda: core.get_ingredients_from_dishes(saving_ingredients=False))
+    # Equivalente a main(): un plan, platos y lista de la compra
+    results['get_ingredients_and_dishes'] = measure(
+        lambda: core.get_ingredients_and_dishes(saving=False))
+    return results
+
+
+def bench_pdfs(sheets):
+    """PDFs de un menú y de todo el libro con ambos motores"""
+    results = {}
+    core = CocinaCore(selected_dishes=MENU_REQUEST,
+                      dish_columns=('Tipo', 'Plato', 'Elaboración'))
+    core.load(sheets)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plan = core.plan_menu()
+    index = core.recipe_index
+    all_ids = np.arange(len(index))
+    tables = {
+        'menu_recipes': plan.dishes,
+        'menu_shopping': plan.shopping_list,
+        'book_recipes': index.get_dishes(all_ids, ['Tipo', 'Plato', 'Elaboración']),
+        'book_shopping': index.shopping_list(all_ids),
+    }
+    for backend in ('reportlab', 'fpdf'):
+        for name, table in tables.items():
+            results[f"pdf_{backend}_{name}"] = measure(
+                lambda: render_pdf(table, io.BytesIO(), name, backend), max_repeats=10)
+    return results
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "sin-git"
+    return f"{revision}-dirty" if dirty else revision
+
+
+def previous_results(revision):
+    """Resultados guardados más recientes de otra revisión"""
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    files = [os.path.join(RESULTS_DIR, name) for name in os.listdir(RESULTS_DIR)
+             if name.endswith(".json") and name != f"{revision}.json"]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def compare(results, reference_path):
+    """Imprime las diferencias con una ejecución anterior y devuelve las regresiones"""
+    with open(reference_path, encoding="utf-8") as f:
+        reference = json.load(f)["results"]
+    print(f"\nComparación con {os.path.basename(reference_path)}:")
+    regressions = []
+    for name, result in results.items():
+        if name not in reference:
+            continue
+        before, after = reference[name]['min_ms'], result['min_ms']
+        change = (after - before) / before if before else 0.0
+        mark = ""
+        if change > REGRESSION_THRESHOLD:
+            mark = "  <-- REGRESIÓN"
+            regressions.append(name)
+        print(f"{name:50s} {before:10.2f} -> {after:10.2f} ms ({change:+.0%}){mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de Cocina Arguiñano (sin red)")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--no-pdf", action="store_true", help="Omitir los PDFs")
+    parser.add_argument("--compare", help="JSON de referencia (por defecto el último guardado)")
+    args = parser.parse_args(argv)
+
+    with open(LOCAL_EXCEL, "rb") as f:
+        base_sheets = compile_workbook(f.read())
+
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for factor in args.scales:
+            for name, result in bench_scale(base_sheets, factor, cache_dir).items():
+                results[f"x{factor}/{name}"] = result
+                print(f"x{factor:<5d} {name:40s} {result['min_ms']:10.2f} ms "
+                      f"(mediana {result['median_ms']:.2f}, pico {result['peak_mb']:.2f} MB)")
+    if not args.no_pdf:
+        for name, result in bench_pdfs(base_sheets).items():
+            results[name] = result
+            print(f"{name:46s} {result['min_ms']:10.2f} ms "
+                  f"(mediana {result['median_ms']:.2f}, pico {result['peak_mb']:.2f} MB)")
+
+    # Un JSON por revisión, para comparar entre commits
+    revision = git_revision()
+    reference_path = args.compare or previous_results(revision)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_path = os.path.join(RESULTS_DIR, f"{revision}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({
+            'revision': revision,
+            'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': sys.version.split()[0],
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'results': results,
+        }, f, indent=2)
+    print(f"\nResultados guardados en {output_path}")
+
+    if reference_path:
+        regressions = compare(results, reference_path)
+        if regressions:
+            print(f"{len(regressions)} regresiones de más del {REGRESSION_THRESHOLD:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,35 @@
+# Bitsets.py
+# Conjuntos de ingredientes empaquetados en palabras de 64 bits (uint64)
+import numpy as np
+
+WORD_BITS = 64
+
+# Tabla de bits por byte para numpy < 2.0, que no tiene np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def num_words(size):
+    """Palabras uint64 necesarias para `size` bits"""
+    return max(1, (size + WORD_BITS - 1) // WORD_BITS)
+
+
+def pack_positions(rows, positions, num_rows, size):
+    """
+    Matriz (num_rows x palabras) con el bit positions[i] activado en la
+    fila rows[i]. Las posiciones repetidas no cambian el resultado.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.int64)
+    bits = np.zeros((num_rows, num_words(size)), dtype=np.uint64)
+    masks = np.left_shift(np.uint64(1), (positions % WORD_BITS).astype(np.uint64))
+    np.bitwise_or.at(bits, (rows, positions // WORD_BITS), masks)
+    return bits
+
+
+def popcount(bits):
+    """Número de bits activos sumando sobre la última dimensión"""
+    bits = np.asarray(bits, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+    as_bytes = np.ascontiguousarray(bits).view(np.uint8).reshape(bits.shape[:-1] + (-1,))
+    return _BYTE_POPCOUNT[as_bytes].sum(axis=-1, dtype=np.int64)
@@ -1,18 +1,10 @@
 # -*- coding: utf-8 -*-
 #%%
-# Importamos las librerías necesarias
-import numpy as np
-import pandas as pd
-import requests
-from io import BytesIO
+# Importamos la lógica común (pandas se importa al cargar las recetas)
+import argparse
 
-# Configuración de rutas
-EXCEL_URL = "https://raw.githubusercontent.com/alherca25/CocinaArguinyano/main/CocinaArguinyano.xlsx"
-
-response = requests.get(EXCEL_URL)
-print(f"Status: {response.status_code}")
-print(f"URL probada: {EXCEL_URL}")
-print(f"Primeros 100 bytes: {response.content[:100]}")
+import Tracing
+from CocinaCore import CocinaCore
 
 # Generamos el diccionario de platos deseados
 DESIRED_PLATES = {
@@ -21,22 +13,48 @@ DESIRED_PLATES = {
     'Verduras': 3,
 }
 
-def load_excel_github():
-    """Lee XLSX directamente desde GitHub raw URL"""
-    try:
-        # Método 1: directo con pandas (funciona muchas veces)
-        return pd.read_excel(EXCEL_URL, sheet_name=None)
-    except:
-        # Método 2: requests + BytesIO (100% fiable para XLSX)
-        response = requests.get(EXCEL_URL)
-        response.raise_for_status()  # Lanza error si falla
-        return pd.read_excel(BytesIO(response.content), sheet_name=None)
-    
+# Criterio de selección: None (al azar), 'distinct', 'overlap' o 'quantity'
+OBJECTIVE = None
+
+# Ingredientes disponibles en casa (None: sin filtrar) y cuántos pueden faltar por plato
+PANTRY = None
+MAX_MISSING = 0
+
+# Hogares para los que generar menú y PDFs en lote, y procesos (None: núcleos - 1)
+HOUSEHOLDS = 0
+PDF_WORKERS = None
+
+# Semanas a planificar de una vez (1: un único menú) y fichero de historial
+WEEKS = 1
+HISTORY_FILE = None
+
+# Catálogo de precios (CSV o SQLite, None: sin precios) y coste máximo del menú
+PRICES_FILE = None
+MAX_COST = None
+
+# Libros adicionales (URLs o rutas de XLSX) que se suman al del repositorio
+EXTRA_BOOKS = ()
+
+def load_excel_github(books=EXTRA_BOOKS, lazy=True):
+    """Lee XLSX desde GitHub raw URL, revalidando la copia en caché"""
+    # Con más libros se cargan todos en un catálogo (None: el del repositorio)
+    if books:
+        return CocinaCore(url=[None, *books]).load_recipes()
+    # Sin instantánea solo se parsean las hojas que se pidan
+    return CocinaCore().load_recipes(lazy=lazy)
+
+def search_dishes(query, limit=10, books=EXTRA_BOOKS):
+    """Busca platos por nombre, ingredientes o elaboración"""
+    # La búsqueda usa todas las hojas: carga completa, con la búsqueda en la instantánea
+    return load_excel_github(books, lazy=False).search.search(query, limit)
+
 # Definimos la función principal
-def main():
+def main(objective=OBJECTIVE, pantry=PANTRY, max_missing=MAX_MISSING,
+         weeks=WEEKS, window=None, history=HISTORY_FILE, books=EXTRA_BOOKS,
+         prices=PRICES_FILE, max_cost=MAX_COST):
     # Cargamos el excel
     #df_excel = pd.read_excel(EXCEL_PATH, sheet_name=None)
-    df_excel = load_excel_github()
+    df_excel = load_excel_github(books)
 
     # Mostramos el tipo de platos disponibles
     '''
@@ -46,86 +64,105 @@ def main():
             print(f'- {sheet}')
     '''
     
-    # Acumulador para todos los ingredientes y platos seleccionados
-    all_ingredients = []
-    selected_dishes = []
-
-    # Recorremos el diccionario de platos deseados
-    for plate_type, desired_num in DESIRED_PLATES.items():
-        # Verificamos si el tipo de plato existe
-        if plate_type not in df_excel:
-            print(f'No se han encontrado recetas de {plate_type}')
-            continue
-        
-        # Verificamos que se solicite al menos un plato
-        if desired_num <= 0:
-            print(f'No se han solicitado platos de tipo {plate_type}')
-            continue
-
-        # Cargamos el tipo de platos solicitado
-        df_plate = df_excel[plate_type].copy()
-        
-        # Rellenamos valores NaN en la columna 'Plato' antes de procesar
-        df_plate['Plato'] = df_plate['Plato'].ffill()
-        
-        # Extraemos platos únicos disponibles
-        platos = df_plate['Plato'].drop_duplicates().dropna()
-
-        # Ajustamos la cantidad de platos si es necesario
-        plate_num = min(len(platos), desired_num)
-
-        # Comprobamos si hay platos disponibles
-        if plate_num == 0:
-            print(f'No hay platos disponibles de tipo {plate_type}')
-            continue
-
-        print(f'\nSeleccionando {plate_num} platos de tipo {plate_type}...\n')
-
-        # Extraemos platos al azar
-        try:
-            selected_plates = np.random.choice(platos.values, plate_num, replace=False)
-        except ValueError as e:
-            print(f'Error al seleccionar platos de {plate_type}: {e}')
-            continue
-
-        # Filtramos por platos seleccionados
-        mask = df_plate['Plato'].isin(selected_plates)
-        df_selected = df_plate[mask]
-        
-        # Obtenemos información única de cada plato seleccionado
-        page_col = 'Página' if 'Página' in df_selected.columns else 'Pagina'
-        plate_info = df_selected.groupby('Plato', as_index=False).first()
-        
-        # Almacenamos información de los platos seleccionados (más eficiente que iterrows)
-        plate_info['Tipo'] = plate_type
-        plate_info['Página'] = plate_info[page_col].astype('Int64')  # Int64 admite NaN
-        selected_dishes.extend(plate_info[['Tipo', 'Plato', 'Página']].to_dict('records'))
-
-        # Extraemos ingredientes
-        ingredients_df = df_selected[['Ingredientes', 'Cantidades', 'Unidades']].copy()
-        all_ingredients.append(ingredients_df)
-
-    # Consolidamos todos los ingredientes
-    if not all_ingredients:
-        ingredients_result = pd.DataFrame(columns=['Ingredientes', 'Cantidades', 'Unidades'])
-    else:
-        combined_df = pd.concat(all_ingredients, ignore_index=True)
-        # Agrupamos por ingrediente y sumamos cantidades
-        ingredients_result = combined_df.groupby('Ingredientes', as_index=False).agg({
-            'Cantidades': 'sum',
-            'Unidades': 'first'  # Asumimos que las unidades son consistentes por ingrediente
-        })
-
-    # Creamos dataframe de platos seleccionados
-    dishes_result = pd.DataFrame(selected_dishes)
-
-    return ingredients_result, dishes_result
+    # Construimos el índice de platos e ingredientes de los tipos solicitados
+    core = CocinaCore(selected_dishes=DESIRED_PLATES, objective=objective,
+                      prices=prices, max_cost=max_cost)
+    requested = [plate_type for plate_type, num in DESIRED_PLATES.items() if num > 0]
+    core.load(df_excel, categories=requested)
+
+    # Filtramos los platos que no se pueden cocinar con la despensa
+    if pantry is not None:
+        unknown = core.set_pantry(pantry, max_missing)
+        if unknown:
+            print(f"Ingredientes de la despensa que no aparecen en las recetas: {', '.join(unknown)}")
+
+    # Varias semanas: un plan sin repeticiones con una lista de la compra por semana
+    if weeks > 1:
+        return core.plan_weeks(weeks, window, history)
+
+    # Seleccionamos los platos una sola vez; de ese plan salen platos e ingredientes
+    return core.get_ingredients_and_dishes(saving=False)
+
+def batch_pdfs(households=HOUSEHOLDS, workers=PDF_WORKERS, objective=OBJECTIVE,
+               books=EXTRA_BOOKS):
+    """Un menú por hogar y sus PDFs de recetas y compra, generados en paralelo"""
+    core = CocinaCore(selected_dishes=DESIRED_PLATES, objective=objective,
+                      dish_columns=('Tipo', 'Plato', 'Elaboración'), pdf_workers=workers)
+    requested = [plate_type for plate_type, num in DESIRED_PLATES.items() if num > 0]
+    core.load(load_excel_github(books), categories=requested)
+    plans = [core.plan_menu() for _ in range(households)]
+
+    def progress(done, total):
+        print(f"\rPDFs generados: {done}/{total}", end="", flush=True)
+
+    pdf_files = core.render_batch(plans, progress)
+    core.pdf_pool.shutdown()
+    print()
+    return pdf_files
 
 if __name__ == '__main__':
-    Ingr_cant, platos_seleccionados = main()
-    print('\n=== INGREDIENTES NECESARIOS ===')
-    print(Ingr_cant)
-    print('\n=== PLATOS SELECCIONADOS ===')
-    print(platos_seleccionados)
+    from MenuOptimizer import OBJECTIVES
+
+    parser = argparse.ArgumentParser(description="Selección de platos y lista de la compra")
+    parser.add_argument("--optimize", choices=OBJECTIVES, default=OBJECTIVE,
+                        help="Optimizar la selección en lugar de elegir al azar")
+    parser.add_argument("--pantry", default=PANTRY,
+                        help="Ingredientes disponibles separados por comas")
+    parser.add_argument("--max-missing", type=int, default=MAX_MISSING,
+                        help="Ingredientes que pueden faltar por plato (con --pantry)")
+    parser.add_argument("--search", help="Buscar platos en lugar de generar el menú")
+    parser.add_argument("--households", type=int, default=HOUSEHOLDS,
+                        help="Generar en paralelo los PDFs de este número de menús")
+    parser.add_argument("--workers", type=int, default=PDF_WORKERS,
+                        help="Procesos para los PDFs (por defecto, núcleos - 1)")
+    parser.add_argument("--trace", choices=Tracing.MODES,
+                        help="Medir cada etapa (time) y también su pico de memoria (memory)")
+    parser.add_argument("--trace-file", help="Guardar la traza JSON (chrome://tracing)")
+    parser.add_argument("--profile", help="Guardar un perfil de cProfile de toda la ejecución")
+    parser.add_argument("--weeks", type=int, default=WEEKS,
+                        help="Semanas a planificar sin repetir platos")
+    parser.add_argument("--window", type=int,
+                        help="Semanas seguidas en las que un plato no se repite")
+    parser.add_argument("--history", default=HISTORY_FILE,
+                        help="Historial JSON de semanas planificadas (se actualiza)")
+    parser.add_argument("--book", action="append", default=list(EXTRA_BOOKS),
+                        help="Otro libro (URL o ruta del XLSX) que se suma al del repositorio")
+    parser.add_argument("--prices", default=PRICES_FILE,
+                        help="Catálogo de precios CSV o SQLite (Ingrediente, Precio, Cantidad, Unidad)")
+    parser.add_argument("--budget", type=float, default=MAX_COST,
+                        help="Coste máximo del menú, o de cada semana con --weeks (requiere --prices)")
+    args = parser.parse_args()
+    pantry = args.pantry.split(',') if args.pantry is not None else None
+    if args.budget is not None and args.prices is None:
+        parser.error("--budget necesita un catálogo de precios (--prices)")
+    # Sin --trace se respeta COCINA_TRACE; pedir traza o perfil basta para activarla
+    if args.trace or args.trace_file or args.profile:
+        Tracing.enable(args.trace or 'time', args.trace_file, args.profile)
+    with Tracing.run('main'):
+        if args.search:
+            resultados = search_dishes(args.search, books=args.book)
+            print(f'\n=== RESULTADOS PARA "{args.search}" ===')
+            print(resultados)
+        elif args.households > 0:
+            pdf_files = batch_pdfs(args.households, args.workers, args.optimize, args.book)
+            print(f'{len(pdf_files)} PDFs en la carpeta actual')
+        elif args.weeks > 1:
+            plan = main(args.optimize, pantry, args.max_missing, args.weeks, args.window, args.history,
+                        args.book, args.prices, args.budget)
+            for week in range(len(plan)):
+                print(f'\n=== SEMANA DEL {plan.week_date(week)} ===')
+                print(plan.index.get_dishes(plan.weeks[week], ['Tipo', 'Plato', 'Página']))
+                print('\n--- Ingredientes necesarios ---')
+                print(plan.shopping_list(week))
+                if args.prices is not None:
+                    print(f'Coste estimado: {plan.cost(week):.2f}')
+        else:
+            Ingr_cant, platos_seleccionados = main(args.optimize, pantry, args.max_missing,
+                                                   books=args.book, prices=args.prices,
+                                                   max_cost=args.budget)
+            print('\n=== INGREDIENTES NECESARIOS ===')
+            print(Ingr_cant)
+            print('\n=== PLATOS SELECCIONADOS ===')
+            print(platos_seleccionados)
 
 #%%
\ No newline at end of file
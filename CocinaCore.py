@@ -0,0 +1,452 @@
+# CocinaCore.py
+# Lógica común de la CLI, Tk y Kivy, sin dependencias de interfaz gráfica.
+# pandas y los motores PDF se importan al usarse, no al importar este módulo,
+# para que las interfaces pinten su ventana antes y los usos sin interfaz
+# (lotes, servidor) arranquen rápido.
+import os
+from datetime import datetime
+
+from Tracing import span
+
+# Hojas del libro que no son tipos de plato
+NON_RECIPE_SHEETS = ('Ingredientes', 'Unidades')
+
+
+class CocinaCore:
+    """
+    Estado y operaciones de una sesión: carga del libro, platos deseados
+    {tipo: cantidad}, selección de platos, lista de la compra y PDFs.
+    Cada interfaz solo elige el motor PDF, la carpeta de salida y las
+    columnas de la tabla de platos.
+    """
+
+    def __init__(self, url=None, pdf_backend='reportlab', pdf_dir=".",
+                 dish_columns=('Tipo', 'Plato', 'Página'), selected_dishes=None,
+                 objective=None, pdf_workers=None, prices=None, max_cost=None):
+        self.EXCEL_URL = url
+        self.pdf_backend = pdf_backend
+        self.pdf_dir = pdf_dir
+        # Procesos para generar PDFs en paralelo (None: núcleos - 1)
+        self.pdf_workers = pdf_workers
+        self._pdf_pool = None
+        self.dish_columns = dish_columns
+        self.recipes_table = {}
+        self.recipe_index = None
+        self._search = None
+        self.selected_dishes = dict(selected_dishes or {})  # {tipo: cantidad}
+        # None: platos al azar; 'distinct', 'overlap' o 'quantity': MenuOptimizer
+        self.objective = objective
+        # Despensa: si no es None solo se eligen platos a los que falten
+        # como mucho max_missing ingredientes
+        self.pantry = None
+        self.max_missing = 0
+        # Catálogo de precios (PriceCatalog o ruta CSV/SQLite) y coste máximo
+        # del menú (None: sin límite; requiere precios)
+        self.prices = prices
+        self.max_cost = max_cost
+        # Platos concretos de cada tipo y su lista de la compra, actualizados
+        # por deltas al añadir, editar o quitar tipos (ver live_changed)
+        self.live_dishes = {}
+        self.live_list = None
+        self.actual_date = datetime.now().strftime("%Y-%m-%d")
+
+    # === Carga de recetas === #
+
+    def load_recipes(self, lazy=False):
+        """
+        Lee XLSX desde GitHub raw URL, revalidando la copia en caché. Si
+        la URL es una lista de libros (URLs o rutas; None es el libro del
+        repositorio) se devuelve un RecipeCatalog con todos ellos.
+        """
+        # La primera importación arrastra pandas, que se nota en el arranque
+        with span("import", modulo="RecipeLoader"):
+            import RecipeLoader
+        if isinstance(self.EXCEL_URL, (list, tuple)):
+            from RecipeCatalog import RecipeCatalog
+            return RecipeCatalog.load(self.EXCEL_URL)
+        # Sin URL explícita se usa la del repositorio (RecipeLoader.EXCEL_URL)
+        url = self.EXCEL_URL or RecipeLoader.EXCEL_URL
+        return RecipeLoader.load_recipes(url, lazy=lazy)
+
+    def load(self, recipes_table=None, categories=None):
+        """
+        Carga las recetas y construye el índice (se puede llamar desde otro
+        hilo). Con `categories` solo se indexan esos tipos de plato; un
+        RecipeCatalog ya trae su índice de todos los libros.
+        """
+        from RecipeIndex import RecipeIndex
+        if recipes_table is None:
+            recipes_table = self.load_recipes()
+        recipe_index = getattr(recipes_table, 'recipe_index', None)
+        if recipe_index is None:
+            recipe_index = RecipeIndex.from_sheets(recipes_table, categories)
+        self.recipes_table, self.recipe_index = recipes_table, recipe_index
+        self._search = None
+        self._join_prices()
+        self.reset_live()
+
+    def add_book(self, source, name=None):
+        """
+        Añade otro libro (URL o ruta del XLSX) a las recetas cargadas sin
+        volver a leer las que ya estaban; devuelve el nombre del libro.
+        """
+        from RecipeCatalog import RecipeCatalog, book_name
+        catalog = self.recipes_table
+        if not isinstance(catalog, RecipeCatalog):
+            # El libro ya cargado pasa a ser el primero del catálogo
+            catalog = RecipeCatalog()
+            if self.recipes_table:
+                import RecipeLoader
+                catalog.add_book(self.EXCEL_URL or RecipeLoader.EXCEL_URL,
+                                 sheets=self.recipes_table)
+        name = catalog.add_book(source, name)
+        self.load(catalog)
+        return name
+
+    def reload(self):
+        """
+        Recarga en caliente el libro: solo se parsean las hojas cuyo XML
+        ha cambiado y el índice se parchea. Los platos en vivo se vuelven a
+        elegir (sus identificadores cambian). Devuelve las hojas que han
+        cambiado.
+        """
+        if self.recipe_index is None:
+            self.load()
+            return []
+        return self.apply_reload(self.fetch_reload())
+
+    def fetch_reload(self):
+        """
+        Parte lenta de reload(): revalida el libro, parsea las hojas que han
+        cambiado y construye el índice parcheado sin tocar el estado de la
+        sesión, así que se puede llamar desde otro hilo. Devuelve lo que
+        necesita apply_reload: (recetas, índice, hojas cambiadas).
+        """
+        import RecipeLoader
+        from RecipeCatalog import RecipeCatalog
+        if isinstance(self.recipes_table, RecipeCatalog):
+            catalog, changes = self.recipes_table.reloaded()
+            return catalog, catalog.recipe_index, [sheet for sheets in changes.values()
+                                                   for sheet in sheets]
+        url = self.EXCEL_URL or RecipeLoader.EXCEL_URL
+        book, changed = RecipeLoader.reload_recipes(self.recipes_table, url)
+        if not changed:
+            return self.recipes_table, self.recipe_index, changed
+        return book, self.recipe_index.patched(book, changed), changed
+
+    def apply_reload(self, reloaded):
+        """Sustituye libro e índice por los de fetch_reload; devuelve las hojas cambiadas"""
+        recipes_table, recipe_index, changed = reloaded
+        if changed:
+            self.recipes_table, self.recipe_index = recipes_table, recipe_index
+            self._search = None
+            self._join_prices()
+            self.reset_live()
+        return changed
+
+    # === Precios === #
+
+    def set_prices(self, prices, max_cost=None):
+        """
+        Catálogo de precios (PriceCatalog o ruta de un CSV/SQLite) y coste
+        máximo del menú (None: sin límite). El catálogo se une una sola vez
+        al índice: cada plato queda con su coste precalculado.
+        """
+        self.prices, self.max_cost = prices, max_cost
+        if self.loaded:
+            self._join_prices()
+
+    def _join_prices(self):
+        if self.prices is None:
+            return
+        if isinstance(self.prices, str):
+            from PriceCatalog import PriceCatalog
+            self.prices = PriceCatalog.from_file(self.prices)
+        self.recipe_index.set_prices(self.prices)
+
+    @property
+    def loaded(self):
+        return self.recipe_index is not None
+
+    def get_recipe_types(self):
+        # Devuelve lista de tipos de plato (sin "Ingredientes", "Unidades")
+        return [sheet for sheet in self.recipes_table.keys()
+                if sheet not in NON_RECIPE_SHEETS]
+
+    def search(self, query, limit=10):
+        """
+        Platos que mejor encajan con una búsqueda libre por nombre,
+        ingredientes o elaboración (sin acentos y tolerante a erratas)
+        """
+        if self._search is None:
+            # Los libros cargados con RecipeLoader traen el índice en la instantánea
+            search = getattr(self.recipes_table, 'search', None)
+            if search is None:
+                from RecipeSearch import RecipeSearch
+                search = RecipeSearch.from_sheets(self.recipes_table)
+            self._search = search
+        return self._search.search(query, limit)
+
+    # === Platos deseados === #
+
+    @staticmethod
+    def _parse_quantity(dish_type, quantity):
+        # Cantidad validada y mensaje de error ("" si es correcta)
+        if not dish_type:
+            return None, "No se ha seleccionado tipo de receta"
+        try:
+            qty = int(quantity)
+        except ValueError:
+            return None, "La cantidad debe ser un número entero"
+        if qty <= 0:
+            return None, "La cantidad debe ser mayor que 0"
+        return qty, ""
+
+    def add_selected_dish(self, dish_type, quantity):
+        """Añade un tipo de plato; devuelve un mensaje de error o ""."""
+        qty, error = self._parse_quantity(dish_type, quantity)
+        if error:
+            return error
+        self.selected_dishes[dish_type] = qty
+        self._update_live(dish_type)
+        return ""
+
+    def remove_selected_dish(self, dish_type):
+        self.selected_dishes.pop(dish_type, None)
+        self._update_live(dish_type)
+
+    def edit_selected_dish(self, old_type, new_type, new_quantity):
+        qty, error = self._parse_quantity(new_type, new_quantity)
+        # Si la edición no es válida se conserva la selección anterior
+        if error:
+            return error
+        self.selected_dishes.pop(old_type, None)
+        self.selected_dishes[new_type] = qty
+        self._update_live(old_type, new_type)
+        return ""
+
+    def set_pantry(self, names, max_missing=0):
+        """
+        Fija la despensa usada para filtrar los platos y devuelve los
+        ingredientes que no aparecen en ninguna receta.
+        """
+        self.pantry = list(names)
+        self.max_missing = max_missing
+        if self.recipe_index is None:
+            return []
+        self.reset_live()
+        return self.recipe_index.pantry_bitset(self.pantry)[1]
+
+    # === Lista de la compra en vivo === #
+
+    def reset_live(self):
+        """Vuelve a elegir los platos en vivo de todos los tipos (p. ej. al cambiar el objetivo)"""
+        if self.recipe_index is None:
+            return
+        import numpy as np
+        from MenuPlanner import ShoppingTally
+        self._rng = np.random.default_rng()
+        self.live_dishes = {}
+        self.live_list = ShoppingTally(self.recipe_index)
+        for dish_type in list(self.selected_dishes):
+            self._sync_live(dish_type)
+
+    def _sync_live(self, dish_type):
+        # Ajusta los platos de un tipo a su cantidad deseada añadiendo o
+        # quitando solo la diferencia; devuelve los códigos afectados
+        import numpy as np
+        index = self.recipe_index
+        current = self.live_dishes.pop(dish_type, np.zeros(0, dtype=np.int64))
+        target = self.selected_dishes.get(dish_type, 0) if dish_type in index.category_slices else 0
+        if target < len(current):
+            kept, codes = current[:target], self.live_list.remove(current[target:])
+        else:
+            added = self._pick_live(dish_type, current, target - len(current))
+            kept, codes = np.concatenate([current, added]), self.live_list.add(added)
+        if len(kept):
+            self.live_dishes[dish_type] = kept
+        return codes
+
+    def _pick_live(self, dish_type, current, num):
+        # Platos nuevos de un tipo: al azar o, con objetivo, los que mejor
+        # encajan con los ya elegidos (de uno en uno, como MenuOptimizer)
+        import numpy as np
+        from MenuOptimizer import MenuOptimizer
+        index = self.recipe_index
+        allowed = self._allowed()
+        mask = np.ones(len(index), dtype=bool) if allowed is None else allowed.copy()
+        mask[current] = False
+        candidates = index.dish_ids(dish_type, mask)
+        num = min(num, len(candidates))
+        if self.objective is None:
+            return np.sort(self._rng.choice(candidates, num, replace=False))
+
+        optimizer = MenuOptimizer(index, self.objective)
+        chosen = np.concatenate([current, *self.live_dishes.values()]).astype(np.int64)
+        picked = []
+        for _ in range(num):
+            costs = optimizer.costs_with(np.concatenate([chosen, picked]), candidates)
+            best = int(np.argmin(costs))
+            picked.append(candidates[best])
+            candidates = np.delete(candidates, best)
+        return np.sort(np.array(picked, dtype=np.int64))
+
+    def _update_live(self, *dish_types):
+        if self.live_list is None:
+            return
+        import numpy as np
+        codes = np.unique(np.concatenate([self._sync_live(t) for t in dict.fromkeys(dish_types)]))
+        self.live_changed(codes)
+
+    def live_changed(self, codes):
+        """
+        Se llama tras cada cambio de la selección con los códigos del
+        vocabulario cuya cantidad ha cambiado; las interfaces lo redefinen
+        para actualizar solo esas filas (live_list.rows(codes)).
+        """
+
+    def live_plan(self):
+        """MenuPlan con los platos en vivo, en el orden de selected_dishes"""
+        import numpy as np
+        from MenuPlanner import MenuPlan
+        ids = [self.live_dishes[t] for t in self.selected_dishes if t in self.live_dishes]
+        ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        return MenuPlan(self.recipe_index, ids, dish_columns=self._dish_columns())
+
+    # === PDFs === #
+
+    def generate_pdf(self, from_df, title):
+        """Genera un PDF con una tabla a partir de un DataFrame"""
+        from PdfRenderer import render_pdf
+
+        if from_df is None or from_df.empty:
+            return ""
+
+        pdf_file = os.path.join(self.pdf_dir, f"{title}.pdf")
+        os.makedirs(self.pdf_dir, exist_ok=True)
+        render_pdf(from_df, pdf_file, title, self.pdf_backend)
+        print(f"PDF generado: {pdf_file}")
+        return pdf_file
+
+    @property
+    def pdf_pool(self):
+        if self._pdf_pool is None:
+            from PdfPool import PdfPool
+            self._pdf_pool = PdfPool(self.pdf_workers)
+        return self._pdf_pool
+
+    def pdf_jobs(self, plan, recipes=True, shopping=True, suffix=""):
+        """Trabajos (tabla, fichero, título, motor) de los PDFs no vacíos de un plan"""
+        from RecipeIndex import report_unit_conflicts
+        tables = []
+        if recipes:
+            tables.append((plan.dishes, f"Recetas-{self.actual_date}{suffix}"))
+        if shopping:
+            report_unit_conflicts(plan.shopping_list)
+            tables.append((plan.shopping_list, f"Compra-{self.actual_date}{suffix}"))
+        os.makedirs(self.pdf_dir, exist_ok=True)
+        return [(from_df, os.path.join(self.pdf_dir, f"{title}.pdf"), title, self.pdf_backend)
+                for from_df, title in tables if not from_df.empty]
+
+    def submit_pdfs(self, plan, recipes=True, shopping=True):
+        """
+        Encola los PDFs de un plan en el pool de procesos y vuelve sin
+        esperar; devuelve los Futures (resultado: ruta de cada PDF).
+        """
+        return [self.pdf_pool.submit(*job) for job in self.pdf_jobs(plan, recipes, shopping)]
+
+    def render_batch(self, plans, progress=None):
+        """
+        PDFs de recetas y compra de muchos planes (p. ej. un menú por hogar)
+        repartidos entre procesos; los ficheros llevan el sufijo -1, -2...
+        progress(hechos, total) se llama al terminar cada PDF.
+        """
+        jobs = [job for i, plan in enumerate(plans, 1)
+                for job in self.pdf_jobs(plan, suffix=f"-{i}")]
+        return self.pdf_pool.render_many(jobs, progress)
+
+    # === Selección de platos e ingredientes === #
+
+    def _dish_columns(self):
+        # Con varios libros la página solo tiene sentido junto al libro
+        if 'Libro' in self.recipe_index.dishes and 'Libro' not in self.dish_columns:
+            return (*self.dish_columns, 'Libro')
+        return self.dish_columns
+
+    def _allowed(self, pantry=None, max_missing=None):
+        # Máscara de platos cocinables con la despensa (None: todos)
+        pantry = self.pantry if pantry is None else pantry
+        max_missing = self.max_missing if max_missing is None else max_missing
+        if pantry is None:
+            return None
+        return self.recipe_index.pantry_filter(pantry, max_missing)
+
+    def plan_menu(self, pantry=None, max_missing=None):
+        """
+        Selecciona una única vez los platos de selected_dishes. `pantry` y
+        `max_missing` sustituyen, para esta selección, a los de set_pantry.
+        """
+        from MenuPlanner import MenuPlan
+        return MenuPlan.from_request(self.recipe_index, self.selected_dishes,
+                                     objective=self.objective,
+                                     allowed=self._allowed(pantry, max_missing),
+                                     max_cost=self.max_cost,
+                                     dish_columns=self._dish_columns())
+
+    def plan_weeks(self, num_weeks, window=None, history_path=None):
+        """
+        Menús de selected_dishes para num_weeks semanas sin repetir platos
+        en `window` semanas seguidas. Con history_path se tienen en cuenta
+        las semanas ya guardadas y el plan nuevo se añade al historial.
+        """
+        from WeekPlanner import WeekPlan, NO_REPEAT_WEEKS
+        window = NO_REPEAT_WEEKS if window is None else window
+        history = WeekPlan.read_history(self.recipe_index, history_path) if history_path else ()
+        plan = WeekPlan.generate(self.recipe_index, self.selected_dishes, num_weeks, window,
+                                 history, objective=self.objective, allowed=self._allowed(),
+                                 max_cost=self.max_cost)
+        if history_path:
+            plan.save(history_path)
+        return plan
+
+    def get_selected_dishes(self, saving_dishes=False, plan=None, pantry=None, max_missing=None):
+        """
+        Selecciona y retorna los platos basados en selected_dishes, opcionalmente
+        solo entre los que se pueden cocinar con la despensa `pantry`
+        """
+        plan = self.plan_menu(pantry, max_missing) if plan is None else plan
+
+        # Almacenamos los platos seleccionados
+        dishes_result = plan.dishes
+        if saving_dishes:
+            plan.recipes_pdf(self.generate_pdf, f"Recetas-{self.actual_date}")
+        return dishes_result
+
+    def get_ingredients_from_dishes(self, plan=None, saving_ingredients=True):
+        """Extrae y retorna los ingredientes de los platos seleccionados"""
+        from RecipeIndex import report_unit_conflicts
+        plan = self.plan_menu() if plan is None else plan
+
+        ingredients_result = plan.shopping_list
+        if ingredients_result.empty:
+            return ingredients_result
+        report_unit_conflicts(ingredients_result)
+        if self.prices is not None:
+            print(f'Coste estimado: {plan.cost:.2f}' + (
+                f' ({plan.unpriced} ingredientes sin precio)' if plan.unpriced else ''))
+
+        # Almacenamos los ingredientes seleccionados
+        if saving_ingredients:
+            plan.shopping_pdf(self.generate_pdf, f"Compra-{self.actual_date}")
+        return ingredients_result
+
+    def get_ingredients_and_dishes(self, saving=True, plan=None):
+        """Retorna tanto los platos como sus ingredientes, de un mismo plan"""
+        plan = self.plan_menu() if plan is None else plan
+        dishes_result = self.get_selected_dishes(saving, plan)
+        ingredients_result = self.get_ingredients_from_dishes(plan, saving)
+        return ingredients_result, dishes_result
+
+    def generate_list(self, plan=None):
+        # Generamos ambas listas a partir de un mismo plan (los PDFs se generan dentro)
+        return self.get_ingredients_and_dishes(plan=plan)
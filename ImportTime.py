@@ -0,0 +1,53 @@
+# ImportTime.py
+# Tiempo de importación de cada punto de entrada medido con `python -X importtime`
+import os
+import subprocess
+import sys
+
+MODULES = ['CocinaCore', 'CocinaArguinyano', 'MenuServer', 'PyInterface', 'MvInterface']
+# Dependencias pesadas que interesa saber si se arrastran al importar
+HEAVY = ['pandas', 'numpy', 'requests', 'reportlab', 'fpdf', 'tkinter', 'kivy']
+
+
+def import_times(module):
+    """
+    Importa `module` en un intérprete nuevo y devuelve {paquete: µs
+    acumulados} a partir de la salida de -X importtime, o None si falla.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return None
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    modules = argv or MODULES
+    repeats = 5
+
+    for module in modules:
+        runs = [import_times(module) for _ in range(repeats)]
+        runs = [times for times in runs if times]
+        if not runs:
+            print(f"{module:18s} no se puede importar en este entorno")
+            continue
+        # Nos quedamos con la ejecución más rápida (menos ruido del sistema)
+        times = min(runs, key=lambda times: times.get(module, 0))
+        heavy = [name for name in HEAVY if name in times]
+        print(f"{module:18s} {times.get(module, 0) / 1000:8.1f} ms  "
+              f"arrastra: {', '.join(heavy) or '-'}")
+
+
+if __name__ == '__main__':
+    # python ImportTime.py [módulo ...]
+    main()
@@ -0,0 +1,103 @@
+# LoadTest.py
+# Prueba de carga del servicio de menús: peticiones/s y latencias p50/p99
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+MENU_REQUEST = {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Pescados': 2, 'Postres': 1}
+
+
+def run_client(host, port, path, body, num_requests, latencies, errors):
+    # Una conexión persistente por cliente, reutilizada en todas sus peticiones
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    headers = {"Content-Type": "application/json"}
+    try:
+        for _ in range(num_requests):
+            t0 = time.perf_counter()
+            try:
+                connection.request("POST", path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors.append(response.status)
+            except (OSError, http.client.HTTPException) as e:
+                errors.append(repr(e))
+                connection.close()
+                continue
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        connection.close()
+
+
+def load_test(url, concurrency, total_requests, menu_request=MENU_REQUEST):
+    """Lanza total_requests peticiones repartidas en `concurrency` clientes"""
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    body = json.dumps(menu_request).encode("utf-8")
+    latencies, errors = [], []
+    per_client = [total_requests // concurrency + (i < total_requests % concurrency)
+                  for i in range(concurrency)]
+
+    threads = [threading.Thread(target=run_client,
+                                args=(parts.hostname, parts.port, path, body, n,
+                                      latencies, errors))
+               for n in per_client]
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'peticiones': len(latencies),
+        'errores': len(errors),
+        'segundos': elapsed,
+        'peticiones_s': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de menús")
+    parser.add_argument("--url", help="URL de /menu; sin ella se arranca un servidor local")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--pdf", choices=["recetas", "compra"], help="Pedir PDFs en lugar de JSON")
+    args = parser.parse_args(argv)
+
+    server = None
+    url = args.url
+    if url is None:
+        # Servidor en el mismo proceso, en un puerto libre
+        from MenuServer import MenuService, make_server
+        server = make_server(MenuService.load(), port=0, workers=args.workers)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/menu"
+    if args.pdf:
+        url += ("&" if "?" in url else "?") + f"pdf={args.pdf}"
+
+    try:
+        result = load_test(url, args.concurrency, args.requests)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    print(f"{result['peticiones']} peticiones en {result['segundos']:.2f} s "
+          f"({args.concurrency} clientes, {result['errores']} errores)")
+    print(f"{result['peticiones_s']:,.0f} peticiones/s")
+    if result['p99_ms'] is not None:
+        print(f"Latencia p50: {result['p50_ms']:.1f} ms, p99: {result['p99_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
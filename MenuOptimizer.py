@@ -0,0 +1,242 @@
+# MenuOptimizer.py
+# Selección de platos que abarata la lista de la compra, con un presupuesto de tiempo
+import sys
+import time
+
+import numpy as np
+
+from Bitsets import popcount
+
+# distinct: menos ingredientes distintos; overlap: más ingredientes compartidos
+# entre platos; quantity: menor cantidad total (en unidades base)
+OBJECTIVES = ('distinct', 'overlap', 'quantity')
+# Segundos de búsqueda por menú; suficiente para usarlo desde el botón "Ambas"
+DEFAULT_TIME_BUDGET = 0.1
+MAX_RESTARTS = 64
+# Reinicios seguidos sin mejorar tras los que se da la búsqueda por terminada
+PATIENCE = 8
+# Menús candidatos que se evalúan de una vez en la selección con presupuesto
+BUDGET_CANDIDATES = 4096
+
+
+class MenuOptimizer:
+    """
+    Búsqueda voraz con reinicios aleatorios y mejora local por intercambio.
+    Cada reinicio rellena los huecos {tipo: cantidad} en orden aleatorio
+    eligiendo el plato que menos empeora el objetivo; después se cambia
+    cada plato por otro de su tipo mientras el objetivo mejore. Los
+    ingredientes de cada plato son bitsets (RecipeIndex.dish_bitsets), así
+    que evaluar todos los candidatos de un tipo es un OR y un popcount.
+    """
+
+    def __init__(self, index, objective='distinct', time_budget=DEFAULT_TIME_BUDGET):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Objetivo desconocido: {objective} (opciones: {', '.join(OBJECTIVES)})")
+        self.index = index
+        self.objective = objective
+        self.time_budget = time_budget
+        self.bits = index.dish_bitsets
+        self.sizes = popcount(self.bits)
+        self.totals = index.dish_totals
+
+    def _costs(self, union, size_sum, total_sum, candidates):
+        # Coste del menú actual más cada uno de los candidatos
+        if self.objective == 'quantity':
+            return total_sum + self.totals[candidates]
+        distinct = popcount(union | self.bits[candidates])
+        if self.objective == 'distinct':
+            return distinct
+        # Solape = ingredientes contados con repetición - ingredientes distintos
+        return distinct - (size_sum + self.sizes[candidates])
+
+    def cost(self, ids):
+        """Valor del objetivo para un menú (menor es mejor)"""
+        ids = np.asarray(ids, dtype=np.int64)
+        union = np.bitwise_or.reduce(self.bits[ids], axis=0) if len(ids) else 0
+        if self.objective == 'quantity':
+            return float(self.totals[ids].sum())
+        distinct = int(popcount(union)) if len(ids) else 0
+        if self.objective == 'distinct':
+            return distinct
+        return distinct - int(self.sizes[ids].sum())
+
+    def menu_costs(self, menus):
+        """Valor del objetivo para cada fila de una matriz (menús x platos)"""
+        menus = np.asarray(menus, dtype=np.int64)
+        if self.objective == 'quantity':
+            return self.totals[menus].sum(axis=1)
+        distinct = popcount(np.bitwise_or.reduce(self.bits[menus], axis=1))
+        if self.objective == 'distinct':
+            return distinct
+        return distinct - self.sizes[menus].sum(axis=1)
+
+    def costs_with(self, ids, candidates):
+        """Valor del objetivo al añadir cada uno de los candidatos al menú `ids`"""
+        ids = np.asarray(ids, dtype=np.int64).tolist()
+        return self._costs(*self._state(ids), np.asarray(candidates, dtype=np.int64))
+
+    def _state(self, ids):
+        if not ids:
+            return np.zeros(self.bits.shape[1], dtype=np.uint64), 0, 0.0
+        union = np.bitwise_or.reduce(self.bits[ids], axis=0)
+        return union, int(self.sizes[ids].sum()), float(self.totals[ids].sum())
+
+    def _pick(self, costs, rng):
+        # Mínimo con desempate aleatorio, para no devolver siempre el mismo menú
+        best = np.flatnonzero(costs == costs.min())
+        return best[rng.integers(len(best))]
+
+    def _greedy(self, slots, pools, rng):
+        selected = []
+        for plate_type in slots:
+            candidates = np.setdiff1d(pools[plate_type], selected)
+            costs = self._costs(*self._state(selected), candidates)
+            selected.append(int(candidates[self._pick(costs, rng)]))
+        return selected
+
+    def _improve(self, selected, slots, pools, rng, deadline):
+        current = self.cost(selected)
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for i, plate_type in enumerate(slots):
+                candidates = np.setdiff1d(pools[plate_type], selected)
+                if not len(candidates):
+                    continue
+                others = selected[:i] + selected[i + 1:]
+                costs = self._costs(*self._state(others), candidates)
+                if costs.min() < current:
+                    selected[i] = int(candidates[self._pick(costs, rng)])
+                    current = costs.min()
+                    improved = True
+        return selected, current
+
+    def select(self, counts, rng=None, allowed=None):
+        """
+        Platos para {tipo: cantidad} (cantidades ya ajustadas a los platos
+        disponibles), agrupados por tipo en el orden de la petición. Con la
+        máscara `allowed` solo se consideran esos platos.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        pools = {plate_type: self.index.dish_ids(plate_type, allowed) for plate_type in counts}
+        slots = [plate_type for plate_type, num in counts.items() for _ in range(num)]
+        if not slots:
+            return np.zeros(0, dtype=np.int64)
+
+        deadline = time.perf_counter() + self.time_budget
+        best, best_cost, stale = None, None, 0
+        for _ in range(MAX_RESTARTS):
+            order = rng.permutation(len(slots))
+            shuffled = [slots[k] for k in order]
+            selected, current = self._improve(self._greedy(shuffled, pools, rng), shuffled,
+                                           pools, rng, deadline)
+            if best is None or current < best_cost:
+                best, best_cost, stale = selected, current, 0
+            else:
+                stale += 1
+            # La cantidad total es aditiva: la voraz ya es óptima
+            if (self.objective == 'quantity' or stale >= PATIENCE
+                    or time.perf_counter() >= deadline):
+                break
+
+        best = np.array(best, dtype=np.int64)
+        category = np.zeros(len(best), dtype=np.int64)
+        for rank, plate_type in enumerate(counts):
+            start, stop = self.index.category_slices[plate_type]
+            category[(best >= start) & (best < stop)] = rank
+        # Orden de los tipos en la petición y, dentro de cada tipo, por identificador
+        return best[np.lexsort((best, category))]
+
+
+def _sample_rows(rng, pool_size, k, n):
+    # n filas de k posiciones distintas de range(pool_size)
+    if pool_size <= 64 or k * k > pool_size:
+        return np.argpartition(rng.random((n, pool_size)), k - 1, axis=1)[:, :k]
+    # Tipos grandes: posiciones al azar y se repiten solo las filas con duplicados
+    rows = rng.integers(pool_size, size=(n, k))
+    repeated = np.ones(n, dtype=bool)
+    while True:
+        ordered = np.sort(rows[repeated], axis=1)
+        retry = np.flatnonzero(repeated)[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)]
+        if not len(retry):
+            return rows
+        rows[retry] = rng.integers(pool_size, size=(len(retry), k))
+        repeated[:] = False
+        repeated[retry] = True
+
+
+def select_within_budget(index, counts, max_cost, rng=None, allowed=None, objective=None,
+                         candidates=BUDGET_CANDIDATES):
+    """
+    Platos para {tipo: cantidad} con un coste total (index.dish_costs, ver
+    RecipeIndex.set_prices) de como mucho max_cost, en el mismo orden que
+    MenuOptimizer.select. Se generan `candidates` menús al azar en una
+    matriz (menús x platos) y su coste es un producto por dish_costs; de
+    los que caben se elige uno al azar o, con `objective`, el mejor. Si
+    ninguno cabe se devuelve el menú más barato, y None si ni ese cabe.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    costs = index.dish_costs
+    pools, cheapest = {}, {}
+    for plate_type, num in counts.items():
+        pool = index.dish_ids(plate_type, allowed)
+        num = min(num, len(pool))
+        if num > 0:
+            pools[plate_type] = pool
+            cheapest[plate_type] = pool[np.argsort(costs[pool], kind='stable')[:num]]
+    if not pools:
+        return np.zeros(0, dtype=np.int64)
+
+    # Cota inferior: el menú con los platos más baratos de cada tipo
+    min_total = sum(costs[ids].sum() for ids in cheapest.values())
+    if min_total > max_cost:
+        return None
+    # Un plato solo cabe si, con los más baratos en el resto de huecos, no se pasa
+    slack = max_cost - min_total
+    for plate_type, pool in pools.items():
+        pools[plate_type] = pool[costs[pool] <= costs[cheapest[plate_type]].max() + slack]
+
+    menus = np.concatenate([pool[_sample_rows(rng, len(pool), len(cheapest[plate_type]), candidates)]
+                            for plate_type, pool in pools.items()], axis=1)
+    ones = np.ones(menus.shape[1])
+    feasible = menus[costs[menus] @ ones <= max_cost]
+    if not len(feasible):
+        best = np.concatenate(list(cheapest.values()))
+    elif objective is None:
+        best = feasible[rng.integers(len(feasible))]
+    else:
+        scores = MenuOptimizer(index, objective).menu_costs(feasible)
+        best = feasible[rng.choice(np.flatnonzero(scores == scores.min()))]
+
+    # Orden de los tipos en la petición y, dentro de cada tipo, por identificador
+    bounds = np.cumsum([0] + [len(ids) for ids in cheapest.values()])
+    return np.concatenate([np.sort(best[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])])
+
+
+if __name__ == '__main__':
+    # Comparativa con la selección al azar: python MenuOptimizer.py [menús]
+    from RecipeLoader import load_recipes
+    from RecipeIndex import RecipeIndex
+
+    num_menus = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    index = RecipeIndex.from_sheets(load_recipes())
+    menu_request = {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Pescados': 2, 'Postres': 1}
+    rng = np.random.default_rng(0)
+    distinct = MenuOptimizer(index, 'distinct')
+
+    def report(name, menus, elapsed):
+        sizes = [distinct.cost(ids) for ids in menus]
+        totals = [float(index.dish_totals[ids].sum()) for ids in menus]
+        print(f"{name:10s} {np.mean(sizes):6.1f} ingredientes distintos, "
+              f"{np.mean(totals):9.0f} de cantidad total, {elapsed * 1000 / len(menus):7.2f} ms/menú")
+
+    t0 = time.perf_counter()
+    menus = [np.concatenate([index.sample(t, n, rng) for t, n in menu_request.items()])
+             for _ in range(num_menus)]
+    report('azar', menus, time.perf_counter() - t0)
+
+    for objective in OBJECTIVES:
+        optimizer = MenuOptimizer(index, objective)
+        t0 = time.perf_counter()
+        menus = [optimizer.select(menu_request, rng) for _ in range(num_menus)]
+        report(objective, menus, time.perf_counter() - t0)
@@ -0,0 +1,332 @@
+# MenuPlanner.py
+# Generación de menús sin interfaz: muchas peticiones {tipo: cantidad} de una vez
+import sys
+import time
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from MenuOptimizer import MenuOptimizer, DEFAULT_TIME_BUDGET, select_within_budget
+from RecipeIndex import INGREDIENT_COLUMNS
+from Tracing import span
+
+
+def request_matrix(index, menu_requests):
+    """
+    Convierte una lista de peticiones {tipo: cantidad} en una matriz
+    (menús x tipos) con las cantidades ya ajustadas a los platos disponibles.
+    Los tipos inexistentes y las cantidades no positivas se ignoran.
+    """
+    categories = index.categories
+    column = {plate_type: j for j, plate_type in enumerate(categories)}
+    counts = np.zeros((len(menu_requests), len(categories)), dtype=np.int64)
+    for i, menu_request in enumerate(menu_requests):
+        for plate_type, desired_num in menu_request.items():
+            if plate_type in column:
+                counts[i, column[plate_type]] = max(int(desired_num), 0)
+    available = np.array([len(index.dish_ids(t)) for t in categories], dtype=np.int64)
+    return np.minimum(counts, available)
+
+
+class MenuPlan:
+    """
+    Un menú concreto: los platos se eligen una sola vez y de ese mismo
+    plan se derivan, bajo demanda, la tabla de platos, la lista de la
+    compra y los PDFs, de modo que todos los resultados son coherentes.
+    """
+
+    def __init__(self, index, dish_ids, dish_columns=('Tipo', 'Plato', 'Página')):
+        self.index = index
+        self.dish_ids = np.asarray(dish_ids, dtype=np.int64)
+        self.dish_columns = list(dish_columns)
+        self._pdfs = {}
+
+    @classmethod
+    def from_request(cls, index, menu_request, rng=None, verbose=True, objective=None,
+                     time_budget=DEFAULT_TIME_BUDGET, allowed=None, max_cost=None, **kwargs):
+        """
+        Selecciona los platos de una petición {tipo: cantidad}: al azar o,
+        con `objective` ('distinct', 'overlap' o 'quantity'), con el
+        MenuOptimizer en como mucho time_budget segundos. Con la máscara
+        `allowed` (p. ej. RecipeIndex.pantry_filter) solo se eligen esos platos.
+        Con `max_cost` (requiere RecipeIndex.set_prices) el menú no puede
+        costar más; el objetivo solo decide entre los menús que caben.
+        Con verbose=False no se imprimen los avisos (p. ej. en el servidor).
+        """
+        log = print if verbose else (lambda *args: None)
+        counts = {}
+
+        for plate_type, desired_num in menu_request.items():
+            # Antes que el tipo: los tipos sin platos pedidos pueden no estar indexados
+            if desired_num <= 0:
+                log(f'No se han solicitado platos de tipo {plate_type}')
+                continue
+
+            if plate_type not in index.category_slices:
+                log(f'No se han encontrado recetas de {plate_type}')
+                continue
+
+            plate_num = min(len(index.dish_ids(plate_type, allowed)), desired_num)
+
+            if plate_num == 0:
+                log(f'No hay platos disponibles de tipo {plate_type}')
+                continue
+
+            log(f'\nSeleccionando {plate_num} platos de tipo {plate_type}...\n')
+            counts[plate_type] = plate_num
+
+        with span("select_dishes", objetivo=objective or "azar"):
+            if max_cost is not None:
+                selected_ids = select_within_budget(index, counts, max_cost, rng, allowed, objective)
+                if selected_ids is None:
+                    log(f'Ningún menú cuesta {max_cost:g} o menos')
+                    selected_ids = np.zeros(0, dtype=np.int64)
+            elif objective is not None:
+                optimizer = MenuOptimizer(index, objective, time_budget)
+                selected_ids = optimizer.select(counts, rng, allowed)
+            elif counts:
+                selected_ids = np.concatenate([index.sample(plate_type, plate_num, rng, allowed)
+                                               for plate_type, plate_num in counts.items()])
+            else:
+                selected_ids = np.zeros(0, dtype=np.int64)
+        return cls(index, selected_ids, **kwargs)
+
+    def __len__(self):
+        return len(self.dish_ids)
+
+    @property
+    def cost(self):
+        """Coste estimado del menú (RecipeIndex.menu_cost)"""
+        return self.index.menu_cost(self.dish_ids)
+
+    @property
+    def unpriced(self):
+        """Ingredientes sin precio en el catálogo, contados plato a plato"""
+        return int(self.index.dish_unpriced[self.dish_ids].sum())
+
+    @cached_property
+    def dishes(self):
+        """Tabla de los platos seleccionados"""
+        if not len(self.dish_ids):
+            return pd.DataFrame()
+        return self.index.get_dishes(self.dish_ids, self.dish_columns)
+
+    @cached_property
+    def shopping_list(self):
+        """Lista de la compra de los platos seleccionados"""
+        return self.index.shopping_list(self.dish_ids)
+
+    def _pdf(self, kind, from_df, generate_pdf, title):
+        # Cada PDF se genera una sola vez por plan y título
+        if (kind, title) not in self._pdfs:
+            self._pdfs[(kind, title)] = generate_pdf(from_df, title)
+        return self._pdfs[(kind, title)]
+
+    def recipes_pdf(self, generate_pdf, title):
+        """PDF de recetas generado con el backend de la interfaz (ReportLab o fpdf2)"""
+        return self._pdf('recipes', self.dishes, generate_pdf, title)
+
+    def shopping_pdf(self, generate_pdf, title):
+        """PDF de la lista de la compra generado con el backend de la interfaz"""
+        return self._pdf('shopping', self.shopping_list, generate_pdf, title)
+
+
+class ShoppingTally:
+    """
+    Lista de la compra mantenida por deltas: cantidad y número de filas de
+    receta de cada ingrediente del vocabulario. Añadir o quitar un plato
+    solo toca sus propios ingredientes, sin volver a agregar todo el menú.
+    """
+
+    def __init__(self, index, dish_ids=()):
+        self.index = index
+        self.quantities = np.zeros(len(index.vocabulary), dtype=np.float64)
+        self.uses = np.zeros(len(index.vocabulary), dtype=np.int64)
+        self.add(dish_ids)
+
+    def _rows(self, dish_ids):
+        rows = self.index.ingredient_rows(dish_ids)
+        codes = self.index.ingredient_codes[rows]
+        valid = codes >= 0
+        return codes[valid], self.index.quantities[rows][valid]
+
+    def _apply(self, dish_ids, sign):
+        codes, quantities = self._rows(dish_ids)
+        np.add.at(self.quantities, codes, sign * quantities)
+        np.add.at(self.uses, codes, sign)
+        # Sin filas que lo usen, el ingrediente vuelve a cero exacto (sin restos de redondeo)
+        self.quantities[codes[self.uses[codes] == 0]] = 0.0
+        return codes
+
+    def add(self, dish_ids):
+        """Suma los ingredientes de los platos dados; devuelve los códigos afectados"""
+        return self._apply(dish_ids, 1)
+
+    def remove(self, dish_ids):
+        """Resta los ingredientes de los platos dados; devuelve los códigos afectados"""
+        return self._apply(dish_ids, -1)
+
+    def replace(self, removed, added):
+        """
+        Quita y añade platos y devuelve el cambio de la lista: ingredientes
+        afectados con su cantidad nueva y la diferencia ('Cambio'). Los que
+        desaparecen de la lista quedan con cantidad 0.
+        """
+        codes = np.union1d(self._rows(removed)[0], self._rows(added)[0])
+        before = self.quantities[codes]
+        self.remove(removed)
+        self.add(added)
+        change = self.quantities[codes] - before
+        changed = (change != 0) | (self.uses[codes] == 0)
+        codes = codes[changed]
+        return pd.DataFrame({
+            'Ingredientes': self.index.vocabulary[codes],
+            'Cantidades': self.quantities[codes],
+            'Cambio': change[changed],
+            'Unidades': self.index.vocabulary_units[codes],
+        }, columns=['Ingredientes', 'Cantidades', 'Cambio', 'Unidades'])
+
+    def frame(self):
+        """Lista de la compra actual, igual que RecipeIndex.shopping_list"""
+        return self.index.vector_to_frame(self.quantities, self.uses > 0)
+
+    def rows(self, codes):
+        """
+        Filas de la lista para los códigos dados, con el código como índice.
+        Los ingredientes que ya no están en la lista tienen cantidad NaN.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        return pd.DataFrame({
+            'Ingredientes': self.index.vocabulary[codes],
+            'Cantidades': np.where(self.uses[codes] > 0, self.quantities[codes], np.nan),
+            'Unidades': self.index.vocabulary_units[codes],
+        }, index=codes, columns=INGREDIENT_COLUMNS)
+
+    def position(self, code):
+        """Posición de un ingrediente dentro de la lista actual (orden del vocabulario)"""
+        return int(np.count_nonzero(self.uses[:code] > 0))
+
+
+class MenuBatch:
+    """
+    Resultado de una generación por lotes. Los platos del menú m son
+    dish_ids[menu_offsets[m]:menu_offsets[m + 1]].
+    """
+
+    def __init__(self, index, dish_ids, menu_offsets):
+        self.index = index
+        self.dish_ids = dish_ids
+        self.menu_offsets = menu_offsets
+
+    def __len__(self):
+        return len(self.menu_offsets) - 1
+
+    @property
+    def menu_of_dish(self):
+        """Menú al que pertenece cada entrada de dish_ids"""
+        return np.repeat(np.arange(len(self)), np.diff(self.menu_offsets))
+
+    def menu(self, m):
+        return self.dish_ids[self.menu_offsets[m]:self.menu_offsets[m + 1]]
+
+    def dishes(self, columns=('Tipo', 'Plato', 'Página')):
+        """Platos de todos los menús apilados, con una columna 'Menú'"""
+        dishes_result = self.index.get_dishes(self.dish_ids, list(columns))
+        dishes_result.insert(0, 'Menú', self.menu_of_dish)
+        return dishes_result
+
+    def costs(self):
+        """Coste de cada menú, sumando dish_costs por menú"""
+        return np.bincount(self.menu_of_dish, weights=self.index.dish_costs[self.dish_ids],
+                           minlength=len(self))
+
+    def ingredient_entries(self):
+        """Ingredientes de cada menú en coordenadas: (menús, códigos, cantidades)"""
+        return self.index.menu_entries(self.dish_ids, self.menu_of_dish)
+
+    def shopping_lists(self):
+        """Listas de la compra de todos los menús apiladas, con una columna 'Menú'"""
+        menus, codes, quantities = self.ingredient_entries()
+        return pd.DataFrame({
+            'Menú': menus,
+            'Ingredientes': self.index.vocabulary[codes],
+            'Cantidades': quantities,
+            'Unidades': self.index.vocabulary_units[codes],
+        }, columns=['Menú'] + INGREDIENT_COLUMNS)
+
+
+def generate_menus(index, menu_requests, replicas=1, seed=None):
+    """
+    Genera en una sola pasada vectorizada un menú por cada petición
+    {tipo: cantidad} (una petición suelta se repite `replicas` veces).
+    `seed` puede ser un entero o un numpy.random.Generator.
+    """
+    if isinstance(menu_requests, dict):
+        menu_requests = [menu_requests]
+    menu_requests = [r for r in menu_requests for _ in range(replicas)]
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+    counts = request_matrix(index, menu_requests)
+    num_menus = len(menu_requests)
+    menu_parts, dish_parts = [], []
+
+    for j, plate_type in enumerate(index.categories):
+        k = counts[:, j]
+        if not k.any():
+            continue
+        start, stop = index.category_slices[plate_type]
+        # Una permutación aleatoria por menú; nos quedamos con las k primeras posiciones
+        order = np.argsort(rng.random((num_menus, stop - start)), axis=1)
+        take = np.arange(stop - start) < k[:, None]
+        menu_parts.append(np.repeat(np.arange(num_menus), k))
+        dish_parts.append(start + order[take])
+
+    if dish_parts:
+        menus = np.concatenate(menu_parts)
+        dish_ids = np.concatenate(dish_parts)
+        # Agrupamos por menú conservando el orden de los tipos
+        order = np.argsort(menus, kind='stable')
+        dish_ids = dish_ids[order]
+    else:
+        dish_ids = np.zeros(0, dtype=np.int64)
+
+    menu_offsets = np.zeros(num_menus + 1, dtype=np.int64)
+    np.cumsum(counts.sum(axis=1), out=menu_offsets[1:])
+    return MenuBatch(index, dish_ids, menu_offsets)
+
+
+def _loop_menus(index, menu_request, replicas):
+    # Referencia: un menú por llamada, como hacen main() y las interfaces
+    results = []
+    for _ in range(replicas):
+        selected_ids = [index.sample(plate_type, min(n, len(index.dish_ids(plate_type))))
+                        for plate_type, n in menu_request.items()
+                        if plate_type in index.category_slices and n > 0]
+        selected_ids = np.concatenate(selected_ids)
+        results.append((index.get_dishes(selected_ids), index.shopping_list(selected_ids)))
+    return results
+
+
+if __name__ == '__main__':
+    # Comparativa de rendimiento: python MenuPlanner.py [réplicas]
+    from RecipeLoader import load_recipes
+    from RecipeIndex import RecipeIndex
+
+    replicas = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    index = RecipeIndex.from_sheets(load_recipes())
+    menu_request = {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Pescados': 2, 'Postres': 1}
+
+    t0 = time.perf_counter()
+    batch = generate_menus(index, menu_request, replicas=replicas, seed=0)
+    batch.dishes()
+    batch.shopping_lists()
+    batch_time = time.perf_counter() - t0
+
+    loop_replicas = min(replicas, 200)
+    t0 = time.perf_counter()
+    _loop_menus(index, menu_request, loop_replicas)
+    loop_time = (time.perf_counter() - t0) * replicas / loop_replicas
+
+    print(f"Lote: {replicas / batch_time:,.0f} menús/s ({batch_time:.3f} s)")
+    print(f"Bucle: {replicas / loop_time:,.0f} menús/s ({loop_time:.3f} s estimados)")
@@ -0,0 +1,256 @@
+# MenuServer.py
+# Servicio HTTP/JSON de menús: el libro se carga una vez y se comparte entre peticiones
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from RecipeLoader import load_recipes, reload_recipes, EXCEL_URL
+from RecipeIndex import RecipeIndex, DISH_COLUMNS
+from MenuPlanner import MenuPlan
+from PdfRenderer import render_pdf, BACKENDS as PDF_BACKENDS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_WORKERS = 8
+# Segundos que una conexión keep-alive inactiva retiene a su hilo
+IDLE_TIMEOUT = 30
+
+PDF_KINDS = {'recetas': 'Recetas', 'compra': 'Lista de la compra'}
+
+
+class BadRequest(ValueError):
+    """Petición mal formada; se responde con un 400"""
+
+
+def frame_records(df):
+    """DataFrame como lista de diccionarios serializables (los NA pasan a None)"""
+    # Columna a columna con numpy: mucho más rápido que df.to_dict('records')
+    columns = [df[col].to_numpy(dtype=object, na_value=None).tolist() for col in df.columns]
+    return [dict(zip(df.columns, row)) for row in zip(*columns)]
+
+
+def parse_menu_request(body):
+    """Valida el cuerpo JSON {tipo: cantidad} de una petición de menú"""
+    try:
+        menu_request = json.loads(body or b'{}')
+    except ValueError as e:
+        raise BadRequest(f"JSON no válido: {e}")
+    if not isinstance(menu_request, dict):
+        raise BadRequest("Se esperaba un objeto {tipo: cantidad}")
+    for plate_type, desired_num in menu_request.items():
+        if isinstance(desired_num, bool) or not isinstance(desired_num, int):
+            raise BadRequest(f"La cantidad de {plate_type} debe ser un entero")
+    return menu_request
+
+
+def pdf_bytes(from_df, title, backend='reportlab'):
+    """Genera el PDF en memoria con el backend indicado"""
+    buffer = BytesIO()
+    render_pdf(from_df, buffer, title, backend)
+    return buffer.getvalue()
+
+
+class MenuService:
+    """
+    Lógica del servicio, independiente de HTTP. El índice es de solo
+    lectura, así que todas las peticiones lo comparten sin bloqueos; cada
+    petición usa su propio generador aleatorio.
+    """
+
+    def __init__(self, index, book=None, url=EXCEL_URL):
+        self.index = index
+        self.book = book
+        self.url = url
+        self._reload_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, url=EXCEL_URL):
+        book = load_recipes(url)
+        return cls(RecipeIndex.from_sheets(book), book, url)
+
+    def reload(self):
+        """
+        Aplica las hojas del libro que han cambiado. El índice parcheado se
+        construye aparte y se sustituye de una vez: las peticiones en curso
+        terminan con el anterior.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            book, changed = reload_recipes(self.book, self.url)
+            if changed:
+                self.index = self.index.patched(book, changed)
+                self.book = book
+            return {'cambiadas': changed, 'platos': len(self.index),
+                    'ms': round((time.perf_counter() - start) * 1000, 1)}
+
+    def categories(self):
+        """Número de platos de cada tipo"""
+        index = self.index
+        return {plate_type: len(index.dish_ids(plate_type)) for plate_type in index.categories}
+
+    def plan(self, menu_request, seed=None, objective=None):
+        # Una sola lectura de self.index: una recarga no cambia el índice a media petición
+        return MenuPlan.from_request(self.index, menu_request,
+                                     rng=np.random.default_rng(seed), verbose=False,
+                                     objective=objective, dish_columns=DISH_COLUMNS)
+
+    def menu(self, menu_request, seed=None, objective=None):
+        """Platos y lista de la compra de un menú como diccionario JSON"""
+        plan = self.plan(menu_request, seed, objective)
+        shopping_list = plan.shopping_list
+        names = shopping_list['Ingredientes']
+        return {
+            'platos': frame_records(plan.dishes),
+            'compra': frame_records(shopping_list),
+            'conflictos': sorted(set(names[names.duplicated()])),
+            'desconocidos': [t for t in menu_request if t not in plan.index.category_slices],
+        }
+
+    def menu_pdf(self, menu_request, kind, seed=None, backend='reportlab', objective=None):
+        """PDF de recetas o de la lista de la compra de un menú"""
+        if kind not in PDF_KINDS:
+            raise BadRequest(f"PDF desconocido: {kind} (opciones: {', '.join(PDF_KINDS)})")
+        if backend not in PDF_BACKENDS:
+            raise BadRequest(f"Motor PDF desconocido: {backend} (opciones: {', '.join(PDF_BACKENDS)})")
+        plan = self.plan(menu_request, seed, objective)
+
+        def generate_pdf(from_df, title):
+            return pdf_bytes(from_df, title, backend)
+
+        if kind == 'recetas':
+            return plan.recipes_pdf(generate_pdf, PDF_KINDS[kind])
+        return plan.shopping_pdf(generate_pdf, PDF_KINDS[kind])
+
+
+class MenuRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /tipos                      -> {tipo: número de platos}
+    POST /menu[?semilla=N]           -> {platos, compra, conflictos, desconocidos}
+    POST /menu?pdf=recetas|compra    -> application/pdf (&motor=reportlab|fpdf)
+    POST /recargar                   -> {cambiadas, platos, ms}: aplica las hojas editadas
+    &objetivo=distinct|overlap|quantity optimiza la selección (MenuOptimizer)
+    """
+    # HTTP/1.1: los clientes reutilizan la conexión entre peticiones
+    protocol_version = "HTTP/1.1"
+    timeout = IDLE_TIMEOUT
+    # Respuestas pequeñas: sin Nagle, para no esperar al ACK del cliente
+    disable_nagle_algorithm = True
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8")
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/tipos":
+            self._send_json(200, self.server.service.categories())
+        else:
+            self._send_json(404, {'error': f"Ruta desconocida: {self.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if url.path == "/recargar":
+            try:
+                result = self.server.service.reload()
+            except Exception as e:
+                # Sin red o con un libro mal formado se sigue sirviendo el índice anterior
+                self._send_json(500, {'error': f"No se pudo recargar el libro: {e}"})
+                return
+            self._send_json(200, result)
+            return
+        if url.path != "/menu":
+            self._send_json(404, {'error': f"Ruta desconocida: {self.path}"})
+            return
+
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        service = self.server.service
+        try:
+            menu_request = parse_menu_request(body)
+            seed = int(query['semilla']) if 'semilla' in query else None
+            objective = query.get('objetivo')
+            if 'pdf' in query:
+                pdf = service.menu_pdf(menu_request, query['pdf'], seed,
+                                       query.get('motor', 'reportlab'), objective)
+                self._send(200, pdf, "application/pdf")
+            else:
+                self._send_json(200, service.menu(menu_request, seed, objective))
+        except (BadRequest, ValueError) as e:
+            self._send_json(400, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    Servidor HTTP que atiende cada conexión en un pool fijo de hilos en
+    lugar de crear un hilo por conexión. Las conexiones keep-alive
+    conservan su hilo hasta que se cierran o superan IDLE_TIMEOUT.
+    """
+    request_queue_size = 128
+
+    def __init__(self, address, service, workers=DEFAULT_WORKERS, verbose=False):
+        super().__init__(address, MenuRequestHandler)
+        self.service = service
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="menu")
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS,
+                verbose=False):
+    return PooledHTTPServer((host, port), service, workers, verbose)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de menús de Cocina Arguiñano")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--url", default=EXCEL_URL, help="URL del libro de recetas")
+    parser.add_argument("--verbose", action="store_true", help="Registrar cada petición")
+    args = parser.parse_args(argv)
+
+    service = MenuService.load(args.url)
+    server = make_server(service, args.host, args.port, args.workers, args.verbose)
+    print(f"Sirviendo {len(service.index)} platos en http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,24 @@
 # MvInterface.py
 import sys
 import os
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.label import Label
 from kivy.uix.button import Button
+from kivy.uix.checkbox import CheckBox
 from kivy.uix.popup import Popup
 from kivy.uix.textinput import TextInput
 from kivy.uix.spinner import Spinner
 from kivy.uix.scrollview import ScrollView
 from kivy.properties import ListProperty, StringProperty
-from kivy.clock import mainthread
+from kivy.clock import Clock, mainthread
 
-import pandas as pd
-import requests
-from io import BytesIO
-import warnings
-import numpy as np
-
-# --- Librería para PDF (reemplaza ReportLab)
-from fpdf import FPDF
+# --- Lógica común; pandas y fpdf2 (en lugar de ReportLab) se importan al usarse
+import Tracing
+from CocinaCore import CocinaCore
 
 # --- Ruta donde se guardarán los PDFs (en Android /storage/emulated/0/Download)
 # Si usas android.storage, puedes cambiar PDF_DIR dinámicamente
@@ -31,204 +28,36 @@ try:
 except:
     PDF_DIR = "/storage/emulated/0/Download"  # ruta típica en Android
 
+# Instante de arranque, para medir el tiempo hasta el primer frame
+START_TIME = time.perf_counter()
+
 
 class DishEntry(BoxLayout):
     dish_type = StringProperty("")
     quantity = StringProperty("0")
 
 
-class CocinaArguinyano:
-    def __init__(self):
-        # Configuración de rutas
-        self.EXCEL_URL = "https://raw.githubusercontent.com/alherca25/CocinaArguinyano/main/CocinaArguinyano.xlsx"
-        self.recipes_table = self.load_recipes()
-        self.selected_dishes = {}  # {tipo: cantidad}
-        self.actual_date = datetime.now().strftime("%Y-%m-%d")
+class CocinaArguinyano(CocinaCore):
+    def __init__(self, autoload=True, on_live_change=None):
+        # PDFs con fpdf2 en la carpeta de descargas
+        super().__init__(pdf_backend='fpdf', pdf_dir=PDF_DIR)
+        self.on_live_change = on_live_change
+        if autoload:
+            self.load()
 
-    def load_recipes(self):
-        print("Cargando recetas...")
-        """Lee XLSX directamente desde GitHub raw URL"""
-        try:
-            # Método 1: directo con pandas
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", UserWarning)
-                return pd.read_excel(self.EXCEL_URL, sheet_name=None)
-        except Exception as e:
-            print(f"Error directo: {e}")
-            # Método 2: requests + BytesIO
-            response = requests.get(self.EXCEL_URL)
-            response.raise_for_status()
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", UserWarning)
-                return pd.read_excel(BytesIO(response.content), sheet_name=None)
-
-    def get_recipe_types(self):
-        # Devuelve lista de tipos de plato (sin "Ingredientes", "Unidades")
-        return [sheet for sheet in self.recipes_table.keys()
-                if sheet not in ('Ingredientes', 'Unidades')]
-
-    def add_selected_dish(self, dish_type, quantity):
-        if not dish_type:
-            return "No se ha seleccionado tipo de receta"
-        try:
-            qty = int(quantity)
-            if qty <= 0:
-                return "La cantidad debe ser mayor que 0"
-            self.selected_dishes[dish_type] = qty
-            return ""
-        except ValueError:
-            return "La cantidad debe ser un número entero"
-
-    def remove_selected_dish(self, dish_type):
-        self.selected_dishes.pop(dish_type, None)
-
-    def edit_selected_dish(self, old_type, new_type, new_quantity):
-        self.remove_selected_dish(old_type)
-        return self.add_selected_dish(new_type, new_quantity)
-
-    # === NUEVA FUNCIONALIDAD === #
-    # Reemplazo de generate_pdf (ReportLab → FPDF)
-
-    def generate_pdf(self, from_df, title):
-        """
-        Genera un PDF con una tabla a partir de un DataFrame,
-        usando fpdf2 en lugar de ReportLab.
-        """
-        if from_df is None or from_df.empty:
-            return ""
-
-        pdf_file = os.path.join(PDF_DIR, f"{title}.pdf")
-
-        # Asegurar que el directorio exista
-        if not os.path.exists(PDF_DIR):
-            os.makedirs(PDF_DIR, exist_ok=True)
-
-        pdf = FPDF(orientation="P", unit="mm", format="A4")
-        pdf.set_auto_page_break(auto=True, margin=15)
-        pdf.add_page()
-        pdf.set_font("Times", "B", 16)
-        pdf.cell(0, 10, title, ln=True, align="C")
-        pdf.ln(10)
-
-        # Encabezado de la tabla
-        col_widths = [pdf.epw / max(1, len(from_df.columns))] * len(from_df.columns)
-        pdf.set_font("Times", "B", 12)
-        for i, col in enumerate(from_df.columns):
-            pdf.cell(col_widths[i], 10, str(col), border=1, align="C")
-        pdf.ln(10)
-
-        # Filas de datos
-        pdf.set_font("Times", "", 10)
-        for _, row in from_df.iterrows():
-            pdf.cell(col_widths[0], 10, str(row.iloc[0]), border=1, align="C")
-            for i in range(1, len(row)):
-                pdf.cell(col_widths[i], 10, str(row.iloc[i]), border=1, align="C")
-            pdf.ln(10)
-
-        pdf.output(pdf_file)
-        print(f"PDF generado: {pdf_file}")
-        return pdf_file
-
-    # === Funciones de selección de platos e ingredientes === #
-
-    def get_selected_dishes(self, saving_dishes=False):
-        """Selecciona y retorna los platos basados en selected_dishes"""
-        df_excel = self.recipes_table
-        selected_dishes = []
-
-        for plate_type, desired_num in self.selected_dishes.items():
-            if plate_type not in df_excel:
-                print(f'No se han encontrado recetas de {plate_type}')
-                continue
-
-            if desired_num <= 0:
-                print(f'No se han solicitado platos de tipo {plate_type}')
-                continue
-
-            df_plate = df_excel[plate_type].copy()
-            df_plate['Plato'] = df_plate['Plato'].ffill()
-            platos = df_plate['Plato'].drop_duplicates().dropna()
-            plate_num = min(len(platos), desired_num)
-
-            if plate_num == 0:
-                print(f'No hay platos disponibles de tipo {plate_type}')
-                continue
-
-            print(f'\nSeleccionando {plate_num} platos de tipo {plate_type}...\n')
-
-            try:
-                selected_plates = np.random.choice(platos.values, plate_num, replace=False)
-            except ValueError as e:
-                print(f'Error al seleccionar platos de {plate_type}: {e}')
-                continue
-
-            mask = df_plate['Plato'].isin(selected_plates)
-            df_selected = df_plate[mask]
-            page_col = 'Página' if 'Página' in df_selected.columns else 'Pagina'
-            plate_info = df_selected.groupby('Plato', as_index=False).first()
-
-            plate_info['Tipo'] = plate_type
-            plate_info['Página'] = plate_info[page_col].astype('Int64')
-            selected_dishes.extend(plate_info[['Tipo', 'Plato', 'Página']].to_dict('records'))
-
-        # Almacenamos los platos seleccionados
-        dishes_result = pd.DataFrame(selected_dishes) if selected_dishes else pd.DataFrame()
-        if saving_dishes:
-            pdf_path = self.generate_pdf(dishes_result, f"Recetas-{self.actual_date}")
-            print(f"Lista de recetas guardada en: {pdf_path}")
-        return dishes_result
-
-    def get_ingredients_from_dishes(self):
-        """Extrae y retorna los ingredientes de los platos seleccionados"""
-        df_excel = self.recipes_table
-        dishes_df = self.get_selected_dishes(False)
-
-        all_ingredients = []
-
-        for plate_type, desired_num in self.selected_dishes.items():
-            if plate_type not in df_excel:
-                continue
-
-            if desired_num <= 0:
-                continue
-
-            df_plate = df_excel[plate_type].copy()
-            df_plate['Plato'] = df_plate['Plato'].ffill()
-
-            selected_plate_names = dishes_df[dishes_df['Tipo'] == plate_type]['Plato'].values
-            mask = df_plate['Plato'].isin(selected_plate_names)
-            df_selected = df_plate[mask]
-
-            ingredients_df = df_selected[['Ingredientes', 'Cantidades', 'Unidades']].copy()
-            all_ingredients.append(ingredients_df)
-
-        if not all_ingredients:
-            return pd.DataFrame(columns=['Ingredientes', 'Cantidades', 'Unidades'])
-
-        combined_df = pd.concat(all_ingredients, ignore_index=True)
-        ingredients_result = combined_df.groupby('Ingredientes', as_index=False).agg({
-            'Cantidades': 'sum',
-            'Unidades': 'first'
-        })
-
-        # Almacenamos los ingredientes seleccionados en PDF
-        pdf_path = self.generate_pdf(ingredients_result, f"Compra-{self.actual_date}")
-        print(f"Lista de compra guardada en: {pdf_path}")
-        return ingredients_result
-
-    def generate_list(self):
-        # Generamos ambas listas
-        ingredients_result = self.get_ingredients_from_dishes()
-        dishes_result = self.get_selected_dishes(False)
-        return ingredients_result, dishes_result
+    def live_changed(self, codes):
+        if self.on_live_change is not None:
+            self.on_live_change(codes)
 
 
 # --- Interfaz Kivy (CocinaApp)
 
 class CocinaApp(App):
     def build(self):
-        self.logic = CocinaArguinyano()
+        # La interfaz se construye ya y las recetas se cargan en segundo plano
+        self.logic = CocinaArguinyano(autoload=False, on_live_change=self.on_live_change)
         self.entries = []  # Lista de widgets DishEntry
+        self.shopping_lines = {}  # {código del vocabulario: Label de su línea en la lista}
 
         # Layout principal
         layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
@@ -246,6 +75,14 @@ class CocinaApp(App):
         scroll.add_widget(self.scroll_content)
         layout.add_widget(scroll)
 
+        # Lista de la compra en vivo: una línea por ingrediente, que se actualiza
+        # por separado con cada cambio de la selección (como el Treeview de Tk)
+        shopping_scroll = ScrollView()
+        self.shopping_box = GridLayout(cols=1, size_hint_y=None)
+        self.shopping_box.bind(minimum_height=self.shopping_box.setter('height'))
+        shopping_scroll.add_widget(self.shopping_box)
+        layout.add_widget(shopping_scroll)
+
         # Botones de acción
         btn_layout = BoxLayout(size_hint=(1, 0.2))
         btn_add = Button(text="Añadir")
@@ -254,10 +91,16 @@ class CocinaApp(App):
         btn_edit.bind(on_release=self.on_edit_press)
         btn_delete = Button(text="Eliminar")
         btn_delete.bind(on_release=self.on_delete_press)
+        btn_search = Button(text="Buscar")
+        btn_search.bind(on_release=self.on_search_press)
+        btn_reload = Button(text="Recargar")
+        btn_reload.bind(on_release=self.on_reload_press)
 
         btn_layout.add_widget(btn_add)
         btn_layout.add_widget(btn_edit)
         btn_layout.add_widget(btn_delete)
+        btn_layout.add_widget(btn_search)
+        btn_layout.add_widget(btn_reload)
         layout.add_widget(btn_layout)
 
         # Botones de generación de listas
@@ -277,14 +120,122 @@ class CocinaApp(App):
         layout.add_widget(list_btns)
         layout.add_widget(btn_ambas)
 
-        # Cargar tipos de receta disponibles
+        # Selección optimizada: menos ingredientes distintos en la lista de la compra
+        optimize_row = BoxLayout(orientation='horizontal', size_hint=(1, 0.1))
+        optimize_check = CheckBox(size_hint=(0.2, 1))
+        optimize_check.bind(active=self.on_optimize_toggle)
+        optimize_row.add_widget(optimize_check)
+        optimize_row.add_widget(Label(text="Minimizar ingredientes"))
+        layout.add_widget(optimize_row)
+
+        # Estado de carga de las recetas
+        self.layout = layout
+        self.recipe_types = []
+        self.pdf_progress = None
+        self.status_label = Label(text="Cargando recetas...", size_hint=(1, 0.1))
+        layout.add_widget(self.status_label)
+
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.reloading = False
+        self.executor.submit(self.load_recipes_async)
+        Clock.schedule_once(self.report_first_frame, 0)
+
+        return layout
+
+    def load_recipes_async(self):
+        # Se ejecuta en el hilo de carga; el resultado se entrega en el hilo principal
+        try:
+            with Tracing.run("carga"):
+                self.logic.load()
+        except Exception as e:
+            self.on_recipes_loaded(str(e))
+        else:
+            self.on_recipes_loaded("")
+
+    @mainthread
+    def on_recipes_loaded(self, error):
+        # El hilo de carga se conserva para las recargas del libro
         self.recipe_types = self.logic.get_recipe_types()
-        if self.recipe_types:
-            self.refresh_entries()
+        if error or not self.recipe_types:
+            if error:
+                print(f"Error al cargar recetas: {error}")
+            self.status_label.text = "No se han cargado recetas"
+            self.status_label.color = (1, 0, 0, 1)
+            return
+
+        print(f"Recetas cargadas en {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
+        self.layout.remove_widget(self.status_label)
+        self.refresh_entries()
+        self.show_shopping_list()
+
+    def report_first_frame(self, dt):
+        print(f"Primer frame en {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
+
+    def check_loaded(self):
+        if not self.logic.loaded:
+            self.show_info("Cargando recetas, espera un momento")
+            return False
+        return True
+
+    def on_optimize_toggle(self, checkbox, active):
+        self.logic.objective = 'distinct' if active else None
+        # Se vuelven a elegir los platos con el nuevo criterio
+        self.logic.reset_live()
+        self.show_shopping_list()
+
+    def on_reload_press(self, *args):
+        # Aplica las ediciones del libro sin reiniciar (solo las hojas cambiadas);
+        # la revalidación y el parseo van al hilo de carga
+        if not self.check_loaded() or self.reloading:
+            return
+        self.reloading = True
+        self.executor.submit(self.reload_async)
+
+    def reload_async(self):
+        try:
+            reloaded = self.logic.fetch_reload()
+        except Exception as e:
+            self.on_reloaded(None, str(e))
         else:
-            layout.add_widget(Label(text="No se han cargado recetas", color=(1, 0, 0, 1)))
+            self.on_reloaded(reloaded, "")
 
-        return layout
+    @mainthread
+    def on_reloaded(self, reloaded, error):
+        self.reloading = False
+        if error:
+            self.show_error(f"Error al recargar el libro: {error}")
+            return
+        changed = self.logic.apply_reload(reloaded)
+        self.show_shopping_list()
+        self.show_info(f"Hojas recargadas: {', '.join(changed)}" if changed
+                       else "El libro no ha cambiado")
+
+    def show_shopping_list(self):
+        # Lista completa, solo al terminar la carga o al cambiar de criterio
+        self.shopping_box.clear_widgets()
+        self.shopping_lines = {}
+        if self.logic.live_list is not None:
+            self.on_live_change(self.logic.live_list.uses.nonzero()[0])
+
+    def on_live_change(self, codes):
+        # Solo se tocan las líneas de los ingredientes cuya cantidad ha cambiado
+        live_list = self.logic.live_list
+        for code, name, quantity, unit in live_list.rows(codes).itertuples():
+            line = self.shopping_lines.get(code)
+            if quantity != quantity:  # NaN: ya no está en la lista
+                if line is not None:
+                    self.shopping_box.remove_widget(self.shopping_lines.pop(code))
+            elif line is not None:
+                line.text = f"{name}: {quantity:g} {unit}"
+            else:
+                line = Label(text=f"{name}: {quantity:g} {unit}", size_hint_y=None,
+                             halign='left', valign='middle')
+                line.bind(texture_size=lambda label, size: setattr(label, 'height', size[1]))
+                line.bind(width=lambda label, width: setattr(label, 'text_size', (width, None)))
+                # Kivy guarda los hijos en orden inverso: index cuenta desde el final
+                position = live_list.position(code)
+                self.shopping_box.add_widget(line, index=len(self.shopping_lines) - position)
+                self.shopping_lines[code] = line
 
     def refresh_entries(self, *args):
         self.scroll_content.clear_widgets()
@@ -297,6 +248,8 @@ class CocinaApp(App):
             self.entries.append(entry)
 
     def on_add_press(self, *args):
+        if not self.check_loaded():
+            return
         types = self.logic.get_recipe_types()
         if not types:
             self.show_error("No hay tipos de receta disponibles")
@@ -342,32 +295,62 @@ class CocinaApp(App):
         self.logic.remove_selected_dish(dish_type)
         self.refresh_entries()
 
+    def on_search_press(self, *args):
+        if not self.check_loaded():
+            return
+        SearchPopup(logic=self.logic).open()
+
     def on_generate_recipes(self, *args):
-        try:
-            df = self.logic.get_selected_dishes(saving_dishes=True)
-            if df.empty:
-                self.show_info("No hay recetas seleccionadas")
-            else:
-                self.show_info("Lista de recetas generada")
-        except Exception as e:
-            self.show_error(f"Error al generar recetas: {str(e)}")
+        self.start_pdfs("Lista de recetas generada", "No hay recetas seleccionadas",
+                        shopping=False)
 
     def on_generate_shopping(self, *args):
-        try:
-            df = self.logic.get_ingredients_from_dishes()
-            if df.empty:
-                self.show_info("No hay ingredientes seleccionados")
-            else:
-                self.show_info("Lista de compra generada")
-        except Exception as e:
-            self.show_error(f"Error al generar compra: {str(e)}")
+        self.start_pdfs("Lista de compra generada", "No hay ingredientes seleccionados",
+                        recipes=False)
 
     def on_generate_both(self, *args):
+        self.start_pdfs("Listas de recetas y compra generadas", "No hay platos seleccionados")
+
+    def start_pdfs(self, done_msg, empty_msg, recipes=True, shopping=True):
+        # Los PDFs se generan en otros procesos; la interfaz sigue respondiendo
+        if not self.check_loaded():
+            return
+        # Con COCINA_TRACE la ejecución abarca hasta que terminan los PDFs (on_pdf_done)
+        Tracing.begin_run(done_msg)
         try:
-            self.logic.generate_list()
-            self.show_info("Listas de recetas y compra generadas")
+            futures = self.logic.submit_pdfs(self.logic.live_plan(), recipes, shopping)
         except Exception as e:
+            Tracing.end_run()
             self.show_error(f"Error al generar listas: {str(e)}")
+            return
+        if not futures:
+            Tracing.end_run()
+            self.show_info(empty_msg)
+            return
+        self.pdf_progress = Popup(title="Generando PDFs",
+                                  content=Label(text=f"0/{len(futures)}"),
+                                  size_hint=(0.8, 0.4), auto_dismiss=False)
+        self.pdf_progress.open()
+        for future in futures:
+            future.add_done_callback(lambda future: self.on_pdf_done(futures, done_msg))
+
+    @mainthread
+    def on_pdf_done(self, futures, done_msg):
+        # Varias llamadas pueden ver todos los PDFs terminados: solo avisa la primera
+        if self.pdf_progress is None:
+            return
+        done = sum(future.done() for future in futures)
+        self.pdf_progress.content.text = f"{done}/{len(futures)}"
+        if done < len(futures):
+            return
+        self.pdf_progress.dismiss()
+        self.pdf_progress = None
+        Tracing.end_run()
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            self.show_error(f"Error al generar listas: {str(errors[0])}")
+        else:
+            self.show_info(done_msg)
 
     def show_error(self, msg):
         popup = Popup(title="Error",
@@ -382,6 +365,35 @@ class CocinaApp(App):
         popup.open()
 
 
+class SearchPopup(Popup):
+    def __init__(self, logic, **kwargs):
+        self.logic = logic
+        super().__init__(title="Buscar receta", size_hint=(0.9, 0.8), **kwargs)
+
+        layout = BoxLayout(orientation='vertical', spacing=10, padding=10)
+
+        layout.add_widget(Label(text="Nombre, ingrediente o elaboración:", size_hint=(1, None), height=30))
+        self.query_input = TextInput(multiline=False, size_hint=(1, None), height=44)
+        # La búsqueda tarda menos de un milisegundo: se repite con cada tecla
+        self.query_input.bind(text=self.on_query)
+        layout.add_widget(self.query_input)
+
+        self.results_label = Label(text="", halign='left', valign='top')
+        self.results_label.bind(size=self.results_label.setter('text_size'))
+        layout.add_widget(self.results_label)
+
+        btn_close = Button(text="Cerrar", size_hint=(1, None), height=50)
+        btn_close.bind(on_release=self.dismiss)
+        layout.add_widget(btn_close)
+
+        self.content = layout
+
+    def on_query(self, instance, query):
+        results = self.logic.search(query)
+        self.results_label.text = "\n".join(f"{tipo}: {plato}" for tipo, plato
+                                            in results[['Tipo', 'Plato']].itertuples(index=False))
+
+
 class AddPopup(Popup):
     def __init__(self, logic, callback, types, **kwargs):
         self.logic = logic
@@ -0,0 +1,115 @@
+# PdfPool.py
+# Generación de PDFs en paralelo: ReportLab y fpdf2 son Python puro y ocupan
+# un núcleo por PDF, así que se reparten entre procesos.
+# Uso: python PdfPool.py [planes] [máx. procesos]  (escalado con 1..N procesos)
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import Tracing
+from PdfRenderer import render_pdf
+
+
+def default_workers():
+    # Un núcleo se deja libre para la interfaz
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def render_job(job):
+    """Renderiza un trabajo (tabla, fichero, título, motor); se ejecuta en el proceso hijo"""
+    from_df, pdf_file, title, backend = job
+    render_pdf(from_df, pdf_file, title, backend)
+    return pdf_file
+
+
+class PdfPool:
+    """
+    Pool de procesos para renderizar PDFs sin bloquear la interfaz. Los
+    procesos se arrancan con 'spawn' (seguro aunque haya hilos, como en
+    Tk) y se reutilizan entre llamadas. Donde no se pueden crear procesos
+    (p. ej. Android) se usan hilos: no hay paralelismo, pero la interfaz
+    sigue respondiendo.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or default_workers()
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            try:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"))
+            except (ImportError, NotImplementedError, OSError):
+                self._executor = ThreadPoolExecutor(self.workers)
+        return self._executor
+
+    def submit(self, from_df, pdf_file, title, backend='reportlab'):
+        """Encola un PDF y devuelve su Future (resultado: la ruta del fichero)"""
+        start = time.perf_counter()
+        future = self.executor.submit(render_job, (from_df, pdf_file, title, backend))
+        if Tracing.enabled():
+            # El PDF se hace en otro proceso: se mide desde que se encola hasta que termina
+            future.add_done_callback(lambda future: Tracing.record(
+                "render_pdf_pool", start, motor=backend, titulo=title, filas=len(from_df)))
+        return future
+
+    def render_many(self, jobs, progress=None):
+        """
+        Renderiza todos los trabajos (tabla, fichero, título, motor) y
+        devuelve las rutas en el mismo orden. progress(hechos, total) se
+        llama desde este hilo cada vez que termina uno.
+        """
+        futures = {self.submit(*job): i for i, job in enumerate(jobs)}
+        results = [None] * len(futures)
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress is not None:
+                progress(done, len(futures))
+        return results
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def _serial(jobs):
+    return [render_job(job) for job in jobs]
+
+
+if __name__ == '__main__':
+    from MenuPlanner import MenuPlan
+    from RecipeIndex import RecipeIndex
+    from RecipeLoader import load_recipes
+
+    num_plans = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    index = RecipeIndex.from_sheets(load_recipes())
+    menu_request = {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Pescados': 2, 'Postres': 1}
+    plans = [MenuPlan.from_request(index, menu_request, verbose=False,
+                                   dish_columns=('Tipo', 'Plato', 'Elaboración'))
+             for _ in range(num_plans)]
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        jobs = [job for i, plan in enumerate(plans) for job in (
+            (plan.dishes, os.path.join(out_dir, f"Recetas-{i}.pdf"), "Recetas", 'reportlab'),
+            (plan.shopping_list, os.path.join(out_dir, f"Compra-{i}.pdf"), "Compra", 'reportlab'))]
+
+        t0 = time.perf_counter()
+        _serial(jobs)
+        serial = time.perf_counter() - t0
+        print(f"{len(jobs)} PDFs en serie: {serial:.2f} s ({os.cpu_count()} núcleos)")
+
+        for workers in range(1, max_workers + 1):
+            pool = PdfPool(workers)
+            pool.render_many(jobs[:workers])  # arranque de los procesos, fuera de la medida
+            t0 = time.perf_counter()
+            pool.render_many(jobs)
+            elapsed = time.perf_counter() - t0
+            pool.shutdown()
+            print(f"{workers:2d} procesos: {elapsed:.2f} s (x{serial / elapsed:.2f})")
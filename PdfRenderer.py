@@ -0,0 +1,258 @@
+# PdfRenderer.py
+# Renderizado de DataFrames a PDF por bloques de filas (ReportLab y fpdf2)
+from xml.sax.saxutils import escape
+
+from Tracing import span
+
+# Motores disponibles para render_pdf
+BACKENDS = ('reportlab', 'fpdf')
+
+# Filas por bloque: cada bloque es una tabla independiente con su cabecera
+CHUNK_ROWS = 200
+
+
+def column_text(from_df):
+    """Columnas del DataFrame como listas de texto (sin iterrows)"""
+    return [from_df[col].astype('string').fillna('').tolist() for col in from_df.columns]
+
+
+def column_weights(from_df, columns_text, max_weight=60):
+    """Anchura relativa de cada columna según la longitud media de su texto"""
+    weights = []
+    for col, values in zip(from_df.columns, columns_text):
+        mean_len = sum(map(len, values)) / max(1, len(values))
+        weights.append(min(max(mean_len, len(str(col)), 4), max_weight))
+    return weights
+
+
+def iter_chunks(columns_text, chunk_rows=CHUNK_ROWS):
+    """Genera las filas de chunk_rows en chunk_rows"""
+    num_rows = len(columns_text[0]) if columns_text else 0
+    for start in range(0, num_rows, chunk_rows):
+        yield list(zip(*(values[start:start + chunk_rows] for values in columns_text)))
+
+
+def _chunk_flowable(make_table):
+    """
+    Flowable que crea la LongTable de un bloque de filas solo cuando
+    ReportLab llega a maquetarlo: los párrafos de un bloque no existen
+    hasta entonces y los de los bloques ya dibujados se liberan, así que
+    la memoria no crece con el número de bloques.
+    """
+    from reportlab.platypus import Flowable
+
+    class ChunkTable(Flowable):
+        def __init__(self):
+            super().__init__()
+            self._table = None
+
+        @property
+        def table(self):
+            if self._table is None:
+                self._table = make_table()
+            return self._table
+
+        # ReportLab llama tanto a wrap/split como a wrapOn/splitOn; todo va a la tabla
+        def wrap(self, aW, aH):
+            return self.table.wrap(aW, aH)
+
+        def split(self, aW, aH):
+            return self.table.split(aW, aH)
+
+        def wrapOn(self, canv, aW, aH):
+            return self.table.wrapOn(canv, aW, aH)
+
+        def splitOn(self, canv, aW, aH):
+            return self.table.splitOn(canv, aW, aH)
+
+        def drawOn(self, canvas, x, y, _sW=0):
+            return self.table.drawOn(canvas, x, y, _sW)
+
+    return ChunkTable()
+
+
+def render_reportlab(from_df, pdf_file, chunk_rows=CHUNK_ROWS):
+    """
+    Genera el PDF con ReportLab. Las filas se maquetan en LongTables de
+    chunk_rows filas con la cabecera repetida en cada página, y los textos
+    largos (la elaboración) se ajustan a la anchura de su columna. Cada
+    tabla se crea al llegar a ella (_chunk_flowable) y una fila más alta
+    que una página se parte entre páginas (splitInRow).
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, TableStyle
+
+    doc = SimpleDocTemplate(pdf_file, pagesize=letter)
+    cell_style = getSampleStyleSheet()['BodyText']
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+    columns_text = column_text(from_df)
+    weights = column_weights(from_df, columns_text)
+    col_widths = [doc.width * w / sum(weights) for w in weights] if weights else None
+    header = [str(col) for col in from_df.columns]
+
+    # Solo los textos que no caben en su columna se maquetan como párrafos
+    limits = [width - 12 for width in col_widths] if col_widths else []
+
+    def cell(text, limit):
+        if '\n' not in text and stringWidth(text, 'Helvetica', 10) <= limit:
+            return text
+        # Los saltos de línea de la elaboración se conservan como párrafos
+        return Paragraph(escape(text).replace('\n', '<br/>'), cell_style)
+
+    def make_table(rows):
+        data = [header] + [[cell(text, limit) for text, limit in zip(row, limits)]
+                           for row in rows]
+        table = LongTable(data, colWidths=col_widths, repeatRows=1, splitInRow=1)
+        table.setStyle(table_style)
+        return table
+
+    elements = [_chunk_flowable(lambda rows=rows: make_table(rows))
+                for rows in iter_chunks(columns_text, chunk_rows)]
+    if not elements:
+        elements.append(LongTable([header] if header else [['']], colWidths=col_widths))
+
+    doc.build(elements)
+    return pdf_file
+
+
+def latin1(text):
+    # Las fuentes estándar de fpdf2 solo admiten latin-1
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+def wrap_text(text, width, string_width, cache):
+    """
+    Ajuste de línea voraz por palabras. Las anchuras de las palabras se
+    memorizan en `cache`, así que el coste es lineal en la longitud del texto.
+    """
+    def measure(word):
+        if word not in cache:
+            cache[word] = string_width(word)
+        return cache[word]
+
+    space = measure(' ')
+    lines = []
+    for paragraph in text.split('\n'):
+        line, line_width = [], 0.0
+        for word in paragraph.split(' '):
+            word_width = measure(word)
+            if line and line_width + space + word_width > width:
+                lines.append(' '.join(line))
+                line, line_width = [], 0.0
+            line_width += word_width + (space if line else 0.0)
+            line.append(word)
+        lines.append(' '.join(line))
+    return lines
+
+
+def _fpdf_cells(pdf, col_widths, texts, cache, style=""):
+    """
+    Líneas de cada celda de una fila. Solo se calcula el ajuste de línea
+    de las celdas que no caben en una línea.
+    """
+    pdf.set_font("Times", style, 10)
+    cell_lines = []
+    for width, text in zip(col_widths, texts):
+        usable = width - 2 * pdf.c_margin
+        if '\n' not in text and pdf.get_string_width(text) <= usable:
+            cell_lines.append([text])
+        else:
+            cell_lines.append(wrap_text(text, usable, pdf.get_string_width, cache))
+    return cell_lines
+
+
+def _fpdf_row(pdf, col_widths, cell_lines, line_height, style=""):
+    """Dibuja una fila de la tabla (ya partida en líneas) en la posición actual"""
+    pdf.set_font("Times", style, 10)
+    row_height = max(1, max(len(lines) for lines in cell_lines)) * line_height
+    x, y = pdf.l_margin, pdf.get_y()
+    for width, lines in zip(col_widths, cell_lines):
+        if len(lines) == 1:
+            pdf.set_xy(x, y)
+            pdf.cell(width, row_height, lines[0], border=1)
+        else:
+            pdf.rect(x, y, width, row_height)
+            for i, line in enumerate(lines):
+                pdf.set_xy(x, y + i * line_height)
+                pdf.cell(width, line_height, line)
+        x += width
+    pdf.set_xy(pdf.l_margin, y + row_height)
+
+
+def render_fpdf(from_df, pdf_file, title, line_height=6):
+    """
+    Genera el PDF con fpdf2 fila a fila leyendo las columnas directamente
+    (sin iterrows): la cabecera se repite en cada página y los textos largos
+    se ajustan a la anchura de su columna. Una fila que no cabe en lo que
+    queda de página pasa a la siguiente; si no cabe ni en una página entera,
+    sus celdas se parten y continúan en las páginas siguientes.
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF(orientation="P", unit="mm", format="A4")
+    pdf.set_auto_page_break(auto=False, margin=15)
+    pdf.add_page()
+    pdf.set_font("Times", "B", 16)
+    pdf.cell(0, 10, latin1(title), new_x="LMARGIN", new_y="NEXT", align="C")
+    pdf.ln(10)
+
+    columns_text = column_text(from_df)
+    weights = column_weights(from_df, columns_text)
+    col_widths = [pdf.epw * w / sum(weights) for w in weights]
+    header = _fpdf_cells(pdf, col_widths, [latin1(str(col)) for col in from_df.columns], {}, "B")
+    header_lines = max(len(lines) for lines in header) if header else 1
+
+    def lines_left():
+        return int((pdf.page_break_trigger - pdf.get_y()) // line_height)
+
+    def new_page():
+        # Nueva página con la cabecera repetida
+        pdf.add_page()
+        _fpdf_row(pdf, col_widths, header, line_height, "B")
+
+    # Líneas de una página sin título, debajo de la cabecera
+    page_lines = int((pdf.page_break_trigger - pdf.t_margin) // line_height) - header_lines
+    # Anchuras de palabra ya medidas (solo para la fuente normal de las filas)
+    cache = {}
+    _fpdf_row(pdf, col_widths, header, line_height, "B")
+    for rows in iter_chunks(columns_text):
+        for row in rows:
+            cell_lines = _fpdf_cells(pdf, col_widths, [latin1(text) for text in row], cache)
+            height = max(len(lines) for lines in cell_lines)
+            if lines_left() < height <= page_lines:
+                new_page()
+            while height > lines_left():
+                room = lines_left()
+                if room > 0:
+                    _fpdf_row(pdf, col_widths, [lines[:room] for lines in cell_lines], line_height)
+                    cell_lines = [lines[room:] for lines in cell_lines]
+                    height -= room
+                new_page()
+            _fpdf_row(pdf, col_widths, cell_lines, line_height)
+
+    pdf.output(pdf_file)
+    return pdf_file
+
+
+def render_pdf(from_df, pdf_file, title, backend='reportlab'):
+    """Genera el PDF con el motor indicado (ruta o fichero abierto en binario)"""
+    with span("render_pdf", motor=backend, titulo=title, filas=len(from_df)):
+        if backend == 'fpdf':
+            return render_fpdf(from_df, pdf_file, title)
+        if backend == 'reportlab':
+            return render_reportlab(from_df, pdf_file)
+    raise ValueError(f"Motor PDF desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
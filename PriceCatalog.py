@@ -0,0 +1,112 @@
+# PriceCatalog.py
+# Catálogo local de precios (CSV o SQLite) por ingrediente y unidad, para
+# calcular el coste de cada plato una sola vez al compilar el índice
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from RecipeIndex import normalize_name
+from Units import compile_units
+
+# Columnas del catálogo: Precio es lo que cuesta Cantidad de Unidad
+# (p. ej. "Harina,1.10,1,kg"); sin Cantidad se entiende 1
+PRICE_COLUMNS = ['Ingrediente', 'Precio', 'Cantidad', 'Unidad']
+# Tabla de los ficheros SQLite, con las mismas columnas
+PRICE_TABLE = 'precios'
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+
+def read_prices(path):
+    """Tabla de precios de un CSV o de la tabla `precios` de un SQLite"""
+    if os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS:
+        with sqlite3.connect(path) as conn:
+            prices = pd.read_sql_query(f'SELECT * FROM {PRICE_TABLE}', conn)
+    else:
+        prices = pd.read_csv(path)
+    # Los nombres de columna se aceptan sin distinguir mayúsculas
+    columns = {name.lower(): name for name in PRICE_COLUMNS}
+    prices = prices.rename(columns=lambda col: columns.get(str(col).strip().lower(), col))
+    missing = [col for col in ('Ingrediente', 'Precio', 'Unidad') if col not in prices]
+    if missing:
+        raise ValueError(f"Faltan columnas en {path}: {', '.join(missing)}")
+    if 'Cantidad' not in prices:
+        prices['Cantidad'] = 1.0
+    return prices[PRICE_COLUMNS]
+
+
+class PriceCatalog:
+    """
+    Precio por unidad base (Units.UNIT_TABLE) de cada par (ingrediente,
+    unidad base). Los nombres se comparan sin mayúsculas ni espacios extra,
+    igual que la despensa; un mismo ingrediente puede tener precio en
+    varias unidades base (p. ej. 'g' y 'uds'). Si un par se repite, vale
+    la última fila.
+    """
+
+    def __init__(self, prices):
+        prices = prices.dropna(subset=['Ingrediente', 'Precio'])
+        base_units, factors, _ = compile_units(prices['Unidad'])
+        amount = prices['Cantidad'].fillna(1).to_numpy(dtype=np.float64) * factors
+        table = pd.DataFrame({
+            'name': [normalize_name(name) for name in prices['Ingrediente']],
+            'unit': base_units.astype(str),
+            'price': prices['Precio'].to_numpy(dtype=np.float64) / amount,
+        }).drop_duplicates(['name', 'unit'], keep='last')
+        self.keys = pd.MultiIndex.from_arrays([table['name'], table['unit']])
+        self.unit_prices = table['price'].to_numpy()
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(read_prices(path))
+
+    def __len__(self):
+        return len(self.unit_prices)
+
+    def price_vector(self, vocabulary, vocabulary_units):
+        """
+        Precio por unidad base de cada entrada del vocabulario de un índice
+        (NaN si el catálogo no lo tiene), con un único cruce de claves.
+        """
+        keys = pd.MultiIndex.from_arrays([[normalize_name(name) for name in vocabulary],
+                                          np.asarray(vocabulary_units, dtype=str)])
+        positions = self.keys.get_indexer(keys)
+        prices = np.full(len(positions), np.nan)
+        found = positions >= 0
+        prices[found] = self.unit_prices[positions[found]]
+        return prices
+
+
+if __name__ == '__main__':
+    # Menús dentro de presupuesto: python PriceCatalog.py precios.csv [presupuesto] [candidatos]
+    from MenuOptimizer import select_within_budget
+    from RecipeLoader import load_recipes
+    from RecipeIndex import RecipeIndex
+
+    catalog = PriceCatalog.from_file(sys.argv[1])
+    index = RecipeIndex.from_sheets(load_recipes())
+    t0 = time.perf_counter()
+    index.set_prices(catalog)
+    costs = index.dish_costs
+    join = time.perf_counter() - t0
+    priced = np.count_nonzero(~np.isnan(index.ingredient_prices))
+    print(f"{priced}/{len(index.vocabulary)} ingredientes con precio; "
+          f"costes de {len(index)} platos en {join * 1000:.1f} ms")
+
+    menu_request = {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Pescados': 2, 'Postres': 1}
+    # Sin presupuesto se toma un 25 % más que el menú más barato posible
+    cheapest = sum(float(np.sort(costs[index.dish_ids(t)])[:n].sum()) for t, n in menu_request.items())
+    max_cost = float(sys.argv[2]) if len(sys.argv) > 2 else 1.25 * cheapest
+    candidates = int(sys.argv[3]) if len(sys.argv) > 3 else 4096
+    rng = np.random.default_rng(0)
+    repeats = 20
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        ids = select_within_budget(index, menu_request, max_cost, rng, candidates=candidates)
+    elapsed = (time.perf_counter() - t0) / repeats
+    cost = 'sin solución' if ids is None else f"{index.menu_cost(ids):.2f}"
+    print(f"Menú más barato posible: {cheapest:.2f}; elegido: {cost} (máximo {max_cost:.2f})")
+    print(f"{elapsed * 1000:.1f} ms para {candidates} candidatos, {candidates / elapsed:,.0f} menús/s")
@@ -1,34 +1,34 @@
 # PyInterface.py
+import time
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk
-import pandas as pd
-import requests
-from io import BytesIO
-import warnings
-import numpy as np
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-
-class CocinaArguinyano:
+
+# pandas y ReportLab se importan en el hilo de carga, no antes de abrir la ventana
+import Tracing
+from CocinaCore import CocinaCore
+
+# Instante de arranque, para medir el tiempo hasta el primer frame
+START_TIME = time.perf_counter()
+LOAD_POLL_MS = 50
+PDF_POLL_MS = 100
+
+class CocinaArguinyano(CocinaCore):
     def __init__(self, master):
-        # Configuración de rutas
-        self.EXCEL_URL = "https://raw.githubusercontent.com/alherca25/CocinaArguinyano/main/CocinaArguinyano.xlsx"
-        response = requests.get(self.EXCEL_URL)
-        print(f"Status: {response.status_code}")
-        print(f"URL probada: {self.EXCEL_URL}")
-        print(f"Primeros 100 bytes: {response.content[:100]}")
-
-        self.recipes_table = self.load_recipes()
-        self.selected_dishes = {}
-        self.actual_date = pd.Timestamp.now().strftime("%Y-%m-%d")
+        # PDFs con ReportLab en el directorio actual, con la elaboración de cada plato
+        super().__init__(pdf_backend='reportlab', pdf_dir=".",
+                         dish_columns=('Tipo', 'Plato', 'Elaboración'))
+        # Las recetas se cargan en segundo plano; hasta entonces la ventana ya es usable
+        self.recipe_combos = []
     
         self.master = master
         master.title("Cocina Rápida")
 
         self.label = tk.Label(master, text="¡Bienvenid@ a la Cocina Rápida!")
         self.label.pack()
+
+        self.status_label = tk.Label(master, text="Cargando recetas...")
+        self.status_label.pack()
         
         # Create frame for table
         self.frame = tk.Frame(master)
@@ -45,6 +45,15 @@ class CocinaArguinyano:
         self.tree.heading("Cantidad", text="Cantidad", anchor=tk.W)
         self.tree.pack()
 
+        # Lista de la compra en vivo: se actualiza fila a fila con cada cambio
+        tk.Label(master, text="Lista de la compra:").pack()
+        self.shopping_tree = ttk.Treeview(master, columns=("Ingrediente", "Cantidad", "Unidad"),
+                                          show="headings", height=8)
+        for column, width in (("Ingrediente", 200), ("Cantidad", 80), ("Unidad", 70)):
+            self.shopping_tree.heading(column, text=column, anchor=tk.W)
+            self.shopping_tree.column(column, anchor=tk.W, width=width)
+        self.shopping_tree.pack(padx=10)
+
         # Create frame for buttons
         self.button_frame = tk.Frame(master)
         self.button_frame.pack(pady=10)
@@ -58,37 +67,156 @@ class CocinaArguinyano:
         self.delete_button = tk.Button(self.button_frame, text="Eliminar", command=self.delete_recipe)
         self.delete_button.pack(side=tk.LEFT, padx=5)
 
+        self.search_button = tk.Button(self.button_frame, text="Buscar", command=self.search_recipes)
+        self.search_button.pack(side=tk.LEFT, padx=5)
+
+        # Aplica las ediciones del libro sin reiniciar (solo las hojas cambiadas)
+        self.reload_button = tk.Button(self.button_frame, text="Recargar", command=self.reload_book)
+        self.reload_button.pack(side=tk.LEFT, padx=5)
+
         tk.Label(master, text="Generar listas:").pack(pady=5)
 
+        # Selección optimizada: menos ingredientes distintos en la lista de la compra
+        self.optimize_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(master, text="Minimizar ingredientes", variable=self.optimize_var,
+                       command=self.toggle_optimize).pack()
+
         # Frame para los botones de Recetas y Compra en la misma fila
         self.list_buttons_frame = tk.Frame(master)
         self.list_buttons_frame.pack(pady=5)
-        self.generate_recipes = tk.Button(self.list_buttons_frame, text="Recetas", command=lambda: self.get_selected_dishes(True))
+        # Los PDFs salen de los platos en vivo, los mismos de la lista mostrada,
+        # y se generan en otros procesos sin bloquear la ventana
+        self.generate_recipes = tk.Button(self.list_buttons_frame, text="Recetas", command=lambda: self.start_pdfs(shopping=False))
         self.generate_recipes.pack(side=tk.LEFT, padx=5)
-        self.generate_shopping = tk.Button(self.list_buttons_frame, text="Compra", command=self.get_ingredients_from_dishes)
+        self.generate_shopping = tk.Button(self.list_buttons_frame, text="Compra", command=lambda: self.start_pdfs(recipes=False))
         self.generate_shopping.pack(side=tk.LEFT, padx=5)
 
         # Botón Ambas en la siguiente fila, centrado
-        self.generate_both = tk.Button(master, text="Ambas", command=self.generate_list)
+        self.generate_both = tk.Button(master, text="Ambas", command=self.start_pdfs)
         self.generate_both.pack(pady=10)
 
-    def load_recipes(self):
-        print("Cargando recetas...")
-        """Lee XLSX directamente desde GitHub raw URL"""
+        # Los botones de generación se habilitan al terminar la carga
+        self.generate_buttons = (self.generate_recipes, self.generate_shopping, self.generate_both)
+        for button in self.generate_buttons:
+            button.config(state=tk.DISABLED)
+
+        # Lanzamos la carga en un hilo y la consultamos desde el bucle de Tk
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.loading = self.executor.submit(self.load_recipe_data)
+        self.reloading = None
+        master.after(LOAD_POLL_MS, self.check_loading)
+        master.after_idle(self.report_first_frame)
+
+    def load_recipe_data(self):
+        # Se ejecuta en el hilo de carga: no debe tocar ningún widget
+        with Tracing.run("carga"):
+            self.load()
+
+    def check_loading(self):
+        if not self.loading.done():
+            self.master.after(LOAD_POLL_MS, self.check_loading)
+            return
+
+        # El hilo de carga se conserva para las recargas del libro
         try:
-            # Método 1: directo con pandas (funciona muchas veces)
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", category=UserWarning)
-                return pd.read_excel(self.EXCEL_URL, sheet_name=None)
-            
-        except:
-            # Método 2: requests + BytesIO (100% fiable para XLSX)
-            response = requests.get(self.EXCEL_URL)
-            response.raise_for_status()  # Lanza error si falla
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", category=UserWarning)
-                return pd.read_excel(BytesIO(response.content), sheet_name=None)
-        
+            self.loading.result()
+        except Exception as e:
+            self.status_label.config(text=f"Error al cargar recetas: {e}")
+            return
+
+        print(f"Recetas cargadas en {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
+        self.status_label.config(text="")
+        self.show_shopping_list()
+        for button in self.generate_buttons:
+            button.config(state=tk.NORMAL)
+
+        # Rellenamos los desplegables de tipos que ya estuvieran abiertos
+        recipe_types = self.get_recipe_types()
+        for combo in self.recipe_combos:
+            if combo.winfo_exists():
+                combo.config(values=recipe_types)
+        self.recipe_combos = []
+
+    def start_pdfs(self, recipes=True, shopping=True):
+        # Con COCINA_TRACE la ejecución abarca hasta que terminan los PDFs (check_pdfs)
+        Tracing.begin_run("Recetas" if not shopping else "Compra" if not recipes else "Ambas")
+        futures = self.submit_pdfs(self.live_plan(), recipes, shopping)
+        if not futures:
+            Tracing.end_run()
+            self.status_label.config(text="No hay platos seleccionados")
+            return
+        self.status_label.config(text=f"Generando PDFs (0/{len(futures)})...")
+        self.master.after(PDF_POLL_MS, self.check_pdfs, futures)
+
+    def check_pdfs(self, futures):
+        # Progreso de los PDFs consultado desde el bucle de Tk
+        done = sum(future.done() for future in futures)
+        if done < len(futures):
+            self.status_label.config(text=f"Generando PDFs ({done}/{len(futures)})...")
+            self.master.after(PDF_POLL_MS, self.check_pdfs, futures)
+            return
+
+        Tracing.end_run()
+        errors = [future.exception() for future in futures if future.exception()]
+        if errors:
+            self.status_label.config(text=f"Error al generar PDFs: {errors[0]}")
+            return
+        for future in futures:
+            print(f"PDF generado: {future.result()}")
+        self.status_label.config(text=f"PDFs generados: {len(futures)}")
+
+    def report_first_frame(self):
+        print(f"Primer frame en {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
+
+    def toggle_optimize(self):
+        self.objective = 'distinct' if self.optimize_var.get() else None
+        # Se vuelven a elegir los platos con el nuevo criterio
+        self.reset_live()
+        self.show_shopping_list()
+
+    def reload_book(self):
+        # La revalidación y el parseo van al hilo de carga; el resultado se aplica con after()
+        if not self.loaded or self.reloading is not None:
+            return
+        self.status_label.config(text="Recargando el libro...")
+        self.reloading = self.executor.submit(self.fetch_reload)
+        self.master.after(LOAD_POLL_MS, self.check_reload, time.perf_counter())
+
+    def check_reload(self, start):
+        if not self.reloading.done():
+            self.master.after(LOAD_POLL_MS, self.check_reload, start)
+            return
+
+        reloading, self.reloading = self.reloading, None
+        try:
+            changed = self.apply_reload(reloading.result())
+        except Exception as e:
+            self.status_label.config(text=f"Error al recargar el libro: {e}")
+            return
+        self.show_shopping_list()
+        elapsed = (time.perf_counter() - start) * 1000
+        self.status_label.config(text=f"Hojas recargadas: {', '.join(changed)} ({elapsed:.0f} ms)"
+                                 if changed else "El libro no ha cambiado")
+
+    def show_shopping_list(self):
+        # Lista completa, solo al terminar la carga o al cambiar de criterio
+        self.shopping_tree.delete(*self.shopping_tree.get_children())
+        if self.live_list is not None:
+            self.live_changed(self.live_list.uses.nonzero()[0])
+
+    def live_changed(self, codes):
+        # Solo se tocan las filas de los ingredientes cuya cantidad ha cambiado
+        for code, name, quantity, unit in self.live_list.rows(codes).itertuples():
+            iid = str(code)
+            if quantity != quantity:  # NaN: ya no está en la lista
+                if self.shopping_tree.exists(iid):
+                    self.shopping_tree.delete(iid)
+            elif self.shopping_tree.exists(iid):
+                self.shopping_tree.item(iid, values=(name, f"{quantity:g}", unit))
+            else:
+                self.shopping_tree.insert("", self.live_list.position(code), iid=iid,
+                                          values=(name, f"{quantity:g}", unit))
+
     def display_recipes(self):
         # Limpiar tabla antes de mostrar nuevas recetas
         for item in self.tree.get_children():
@@ -106,9 +234,10 @@ class CocinaArguinyano:
         add_window.geometry("400x200")
         
         tk.Label(add_window, text="Tipo de Receta:").pack(pady=5)
-        recipe_types = [sheet for sheet in self.recipes_table.keys() if sheet not in ('Ingredientes', 'Unidades')]
-        recipe_combo = ttk.Combobox(add_window, values=recipe_types, width=37)
+        recipe_combo = ttk.Combobox(add_window, values=self.get_recipe_types(), width=37)
         recipe_combo.pack(pady=5)
+        if self.recipe_index is None:
+            self.recipe_combos.append(recipe_combo)
         
         tk.Label(add_window, text="Número de platos:").pack(pady=5)
         cantidad_entry = tk.Entry(add_window, width=40)
@@ -119,13 +248,12 @@ class CocinaArguinyano:
             cantidad = cantidad_entry.get()
             
             if recipe_type and cantidad:
-                try:
-                    cantidad = int(cantidad)
-                    self.tree.insert("", "end", values=(recipe_type, cantidad, ""))
-                    add_window.destroy()
-                    self.selected_dishes[recipe_type] = cantidad
-                except ValueError:
-                    print("Por favor, ingresa un número válido")
+                error = self.add_selected_dish(recipe_type, cantidad)
+                if error:
+                    print(error)
+                    return
+                self.tree.insert("", "end", values=(recipe_type, int(cantidad), ""))
+                add_window.destroy()
             else:
                 print("Por favor, completa todos los campos")
         
@@ -146,9 +274,10 @@ class CocinaArguinyano:
         edit_window.geometry("400x300")
 
         tk.Label(edit_window, text="Tipo de Receta:").pack(pady=5)
-        recipe_types = [sheet for sheet in self.recipes_table.keys() if sheet not in ('Ingredientes', 'Unidades')]
-        recipe_combo = ttk.Combobox(edit_window, values=recipe_types, width=37)
+        recipe_combo = ttk.Combobox(edit_window, values=self.get_recipe_types(), width=37)
         recipe_combo.pack(pady=5)
+        if self.recipe_index is None:
+            self.recipe_combos.append(recipe_combo)
         recipe_combo.set(values[0])  # Prellenar con el valor actual
         
         tk.Label(edit_window, text="Número de platos:").pack(pady=5)
@@ -161,9 +290,12 @@ class CocinaArguinyano:
             cantidad = cantidad_entry.get()
 
             if nombre and cantidad:
+                error = self.edit_selected_dish(values[0], nombre, cantidad)
+                if error:
+                    print(error)
+                    return
                 self.tree.delete(selected[0])
-                self.tree.insert("", "end", values=(nombre, cantidad, ""))
-                self.selected_dishes[nombre] = cantidad
+                self.tree.insert("", "end", values=(nombre, int(cantidad), ""))
                 edit_window.destroy()
             else:
                 print("Por favor, completa todos los campos")
@@ -171,144 +303,41 @@ class CocinaArguinyano:
         update_button = tk.Button(edit_window, text="Actualizar", command=update_recipe)
         update_button.pack(pady=10)
 
+    def search_recipes(self):
+        if self.recipe_index is None:
+            print("Cargando recetas, espera un momento")
+            return
+
+        search_window = tk.Toplevel(self.master)
+        search_window.title("Buscar Receta")
+        search_window.geometry("500x300")
+
+        tk.Label(search_window, text="Nombre, ingrediente o elaboración:").pack(pady=5)
+        query_entry = tk.Entry(search_window, width=50)
+        query_entry.pack(pady=5)
+        query_entry.focus_set()
+
+        results_list = tk.Listbox(search_window, width=70, height=10)
+        results_list.pack(pady=5, fill=tk.BOTH, expand=True)
+
+        def update_results(event=None):
+            # La búsqueda tarda menos de un milisegundo: se repite con cada tecla
+            results_list.delete(0, tk.END)
+            for tipo, plato in self.search(query_entry.get())[['Tipo', 'Plato']].itertuples(index=False):
+                results_list.insert(tk.END, f"{tipo}: {plato}")
+
+        query_entry.bind("<KeyRelease>", update_results)
+
     def delete_recipe(self):
         # Eliminamos la receta seleccionada
         selected = self.tree.selection()
         if not selected:
             print("No hay receta seleccionada para eliminar")
             return
+        self.remove_selected_dish(self.tree.item(selected[0])['values'][0])
         self.tree.delete(selected[0])
 
-    def generate_pdf(self, from_df, title):
-        # Generamos un PDF a partir de un DataFrame (placeholder)
-        # Create PDF document
-        pdf_file = fr".\{title}.pdf"
-        doc = SimpleDocTemplate(pdf_file, pagesize=letter)
-        elements = []
-
-        # Convert DataFrame to table data
-        data = [from_df.columns.tolist()] + from_df.values.tolist()
-        table = Table(data)
-
-        # Style the table
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-
-        elements.append(table)
-        doc.build(elements)
-        print(f"PDF generado: {pdf_file}")
-
-    def generate_list(self):
-        # Generamos ambas listas
-        ingredients_result, dishes_result = self.get_ingredients_and_dishes()
-
-        # Almacenamos ambas listas
-        self.generate_pdf(dishes_result, f"Recetas-{self.actual_date}")
-        self.generate_pdf(ingredients_result, f"Compra-{self.actual_date}")
-
-        return ingredients_result, dishes_result
-
-    def get_selected_dishes(self, saving_dishes=False):
-        """Selecciona y retorna los platos basados en selected_dishes"""
-        df_excel = self.recipes_table
-        selected_dishes = []
-
-        for plate_type, desired_num in self.selected_dishes.items():
-            if plate_type not in df_excel:
-                print(f'No se han encontrado recetas de {plate_type}')
-                continue
-            
-            if desired_num <= 0:
-                print(f'No se han solicitado platos de tipo {plate_type}')
-                continue
-
-            df_plate = df_excel[plate_type].copy()
-            df_plate['Plato'] = df_plate['Plato'].ffill()
-            platos = df_plate['Plato'].drop_duplicates().dropna()
-            plate_num = min(len(platos), desired_num)
-
-            if plate_num == 0:
-                print(f'No hay platos disponibles de tipo {plate_type}')
-                continue
-
-            print(f'\nSeleccionando {plate_num} platos de tipo {plate_type}...\n')
-
-            try:
-                selected_plates = np.random.choice(platos.values, plate_num, replace=False)
-            except ValueError as e:
-                print(f'Error al seleccionar platos de {plate_type}: {e}')
-                continue
-
-            mask = df_plate['Plato'].isin(selected_plates)
-            df_selected = df_plate[mask]
-            elaboration_col = 'Elaboración' if 'Elaboración' in df_selected.columns else 'Elaboracion'
-            plate_info = df_selected.groupby('Plato', as_index=False).first()
-            
-            plate_info['Tipo'] = plate_type
-            plate_info['Elaboración'] = plate_info[elaboration_col].astype('string')
-            selected_dishes.extend(plate_info[['Tipo', 'Plato', 'Elaboración']].to_dict('records'))
-
-        # Almacenamos los platos seleccionados
-        dishes_result = pd.DataFrame(selected_dishes) if selected_dishes else pd.DataFrame()
-        if saving_dishes:
-            '''
-            Debería ajustar el formato del texto de la elaboración de las recetas para que se vea mejor en el PDF
-            '''
-            self.generate_pdf(dishes_result, f"Recetas-{self.actual_date}")
-        return dishes_result
-
-    def get_ingredients_from_dishes(self):
-        """Extrae y retorna los ingredientes de los platos seleccionados"""
-        df_excel = self.recipes_table
-        dishes_df = self.get_selected_dishes(False)
-
-        all_ingredients = []
-
-        for plate_type, desired_num in self.selected_dishes.items():
-            if plate_type not in df_excel:
-                continue
-            
-            if desired_num <= 0:
-                continue
-
-            df_plate = df_excel[plate_type].copy()
-            df_plate['Plato'] = df_plate['Plato'].ffill()
-            
-            selected_plate_names = dishes_df[dishes_df['Tipo'] == plate_type]['Plato'].values
-            mask = df_plate['Plato'].isin(selected_plate_names)
-            df_selected = df_plate[mask]
-            
-            ingredients_df = df_selected[['Ingredientes', 'Cantidades', 'Unidades']].copy()
-            all_ingredients.append(ingredients_df)
 
-        if not all_ingredients:
-            return pd.DataFrame(columns=['Ingredientes', 'Cantidades', 'Unidades'])
-        
-        combined_df = pd.concat(all_ingredients, ignore_index=True)
-        ingredients_result = combined_df.groupby('Ingredientes', as_index=False).agg({
-            'Cantidades': 'sum',
-            'Unidades': 'first'
-        })
-        
-        # Almacenamos los ingredientes seleccionados
-        self.generate_pdf(ingredients_result, f"Compra-{self.actual_date}")
-        return ingredients_result
-
-    def get_ingredients_and_dishes(self):
-        """Retorna tanto los platos como sus ingredientes"""
-        dishes_result = self.get_selected_dishes(True)
-        ingredients_result = self.get_ingredients_from_dishes()
-        return ingredients_result, dishes_result
-
-        
 if __name__ == "__main__":
     root = tk.Tk()
     app = CocinaArguinyano(root)
@@ -0,0 +1,181 @@
+# RecipeCatalog.py
+# Catálogo de varios libros de recetas (URLs o ficheros locales) con un único
+# índice: los libros nuevos se añaden sin volver a leer los ya cargados
+import copy
+import os
+import sys
+import time
+from collections.abc import Mapping
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from RecipeIndex import RecipeIndex
+from RecipeLoader import (CACHE_DIR, EXCEL_URL, intern_frames, is_recipe_sheet, load_recipes,
+                          reload_recipes)
+
+
+def book_name(source):
+    """Nombre corto de un libro: el del fichero sin extensión"""
+    path = urlparse(source).path if source.startswith(("http://", "https://")) else source
+    return os.path.splitext(os.path.basename(path))[0] or source
+
+
+class RecipeCatalog(Mapping):
+    """
+    Varios libros vistos como uno solo. Cada libro conserva sus hojas ya
+    compiladas (las de su instantánea); el índice común, recipe_index, es
+    la concatenación de los índices de cada libro (RecipeIndex.concat), con
+    los platos de cada tipo contiguos, una columna 'Libro' y el vocabulario
+    de ingredientes compartido.
+
+    Los identificadores de plato son posiciones en recipe_index y cambian
+    al añadir un libro; la clave estable de un plato es (libro, tipo, plato),
+    ver dish_key y dish_id. Como diccionario {hoja: DataFrame} se comporta
+    igual que un libro suelto: cada hoja une las de todos los libros.
+    """
+
+    def __init__(self):
+        self.books = {}          # {libro: hojas}
+        self.sources = {}        # {libro: URL o ruta}
+        self.indexes = {}        # {libro: RecipeIndex del libro}, para recargar uno solo
+        self.recipe_index = None
+        self._sheets = {}
+        self._search = None
+
+    @classmethod
+    def load(cls, sources, cache_dir=CACHE_DIR):
+        """Catálogo con los libros dados (None: el libro del repositorio)"""
+        catalog = cls()
+        for source in sources:
+            catalog.add_book(source, cache_dir=cache_dir)
+        return catalog
+
+    def add_book(self, source=None, name=None, sheets=None, cache_dir=CACHE_DIR):
+        """
+        Añade un libro: se carga (con su instantánea) solo ese libro y su
+        índice se concatena al común. Con `sheets` se usan esas hojas ya
+        cargadas en lugar de leer `source`. Devuelve el nombre del libro.
+        """
+        source = EXCEL_URL if source is None else source
+        name = book_name(source) if name is None else name
+        if name in self.books:
+            raise ValueError(f"El libro '{name}' ya está en el catálogo")
+        if sheets is None:
+            sheets = load_recipes(source, cache_dir)
+
+        book_index = RecipeIndex.from_sheets(sheets)
+        if self.recipe_index is None:
+            self.recipe_index = RecipeIndex.concat([book_index], [name])
+        else:
+            self.recipe_index = RecipeIndex.concat([self.recipe_index, book_index], [None, name])
+        self.books[name] = sheets
+        self.sources[name] = source
+        self.indexes[name] = book_index
+        self._sheets = {}
+        self._search = None
+        return name
+
+    def reloaded(self, cache_dir=CACHE_DIR):
+        """
+        Vuelve a leer los libros y aplica solo las hojas que han cambiado
+        (RecipeLoader.reload_recipes) sobre una copia del catálogo; este no
+        cambia, así que se puede llamar desde otro hilo. El índice común se
+        rehace uniendo los índices de los libros, sin recompilar los que no
+        cambian. Devuelve la copia y {libro: hojas cambiadas}.
+        """
+        updated = copy.copy(self)
+        updated.books, updated.indexes = dict(self.books), dict(self.indexes)
+        changes = {}
+        for name, sheets in self.books.items():
+            sheets, changed = reload_recipes(sheets, self.sources[name], cache_dir)
+            if changed:
+                updated.books[name] = sheets
+                updated.indexes[name] = self.indexes[name].patched(sheets, changed)
+                changes[name] = changed
+        if changes:
+            updated.recipe_index = RecipeIndex.concat(updated.indexes.values(), list(updated.indexes))
+            if self.recipe_index.prices is not None:
+                updated.recipe_index.set_prices(self.recipe_index.prices)
+            updated._sheets = {}
+            updated._search = None
+        return updated, changes
+
+    def reload(self, cache_dir=CACHE_DIR):
+        """
+        Como reloaded(), pero sobre este catálogo: el índice común se
+        sustituye en sitio. Devuelve {libro: hojas cambiadas}.
+        """
+        updated, changes = self.reloaded(cache_dir)
+        if changes:
+            self.books, self.indexes = updated.books, updated.indexes
+            self.recipe_index.__dict__.clear()
+            self.recipe_index.__dict__.update(updated.recipe_index.__dict__)
+            self._sheets = {}
+            self._search = None
+        return changes
+
+    # === Vista {hoja: DataFrame} === #
+
+    def __getitem__(self, sheet):
+        if sheet not in self._sheets:
+            frames = [sheets[sheet].assign(Libro=name) for name, sheets in self.books.items()
+                      if sheet in sheets]
+            if not frames:
+                raise KeyError(sheet)
+            if all(is_recipe_sheet(df) for df in frames):
+                intern_frames(frames)
+            self._sheets[sheet] = pd.concat(frames, ignore_index=True)
+        return self._sheets[sheet]
+
+    def __iter__(self):
+        return iter(dict.fromkeys(sheet for sheets in self.books.values() for sheet in sheets))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    @property
+    def search(self):
+        """Índice de búsqueda sobre todos los libros (se construye al pedirlo)"""
+        if self._search is None:
+            from RecipeSearch import RecipeSearch
+            self._search = RecipeSearch.from_sheets(self)
+        return self._search
+
+    # === Claves estables de los platos === #
+
+    def dish_key(self, dish_id):
+        """(libro, tipo, plato) del plato con ese identificador"""
+        dishes = self.recipe_index.dishes
+        return (dishes['Libro'].iat[dish_id], dishes['Tipo'].iat[dish_id],
+                dishes['Plato'].iat[dish_id])
+
+    def dish_id(self, book, plate_type, plato):
+        """Identificador actual de un plato a partir de su clave (libro, tipo, plato)"""
+        return self.recipe_index._book_dish_ids[(book, plate_type, plato)]
+
+
+if __name__ == '__main__':
+    # Añadir un libro frente a recompilar todo: python RecipeCatalog.py [factor]
+    from Benchmarks import scale_sheets
+    from RecipeLoader import LOCAL_EXCEL, compile_workbook
+
+    factor = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with open(LOCAL_EXCEL, "rb") as f:
+        base = compile_workbook(f.read())
+    big = scale_sheets(base, factor)
+
+    catalog = RecipeCatalog()
+    catalog.add_book(name=f"x{factor}", sheets=big)
+    t0 = time.perf_counter()
+    catalog.add_book(name="nuevo", sheets=base)
+    append = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    RecipeIndex.from_sheets(catalog)
+    rebuild = time.perf_counter() - t0
+    index = catalog.recipe_index
+    print(f"{len(catalog.books)} libros, {len(index)} platos, "
+          f"{len(index.vocabulary)} ingredientes en el vocabulario común")
+    print(f"Añadir un libro: {append * 1000:.1f} ms; "
+          f"reconstruir el índice de todas las hojas: {rebuild * 1000:.1f} ms")
@@ -0,0 +1,445 @@
+# RecipeIndex.py
+# Índice normalizado del libro de recetas, construido una sola vez al cargar
+import copy
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from Bitsets import pack_positions, popcount
+from Tracing import traced
+from RecipeLoader import intern_frames, is_recipe_sheet, normalize_sheet
+from Units import compile_units
+
+DISH_COLUMNS = ['Tipo', 'Plato', 'Página', 'Elaboración']
+INGREDIENT_COLUMNS = ['Ingredientes', 'Cantidades', 'Unidades']
+# Entradas (menús x vocabulario) que menu_entries agrega de una vez
+ENTRY_BLOCK = 1 << 20
+
+
+def normalize_name(name):
+    """Nombre de ingrediente sin mayúsculas ni espacios repetidos"""
+    return ' '.join(str(name).split()).casefold()
+
+
+class RecipeIndex:
+    """
+    Tabla de platos con identificadores enteros contiguos por tipo y tabla
+    de ingredientes en formato CSR: los ingredientes del plato i ocupan las
+    filas offsets[i]:offsets[i + 1] de la tabla de ingredientes.
+
+    La misma estructura es una matriz dispersa platos x ingredientes:
+    indptr = offsets, indices = ingredient_codes (posición en vocabulary)
+    y data = quantities.
+    """
+
+    # Catálogo de precios unido con set_prices (None: sin precios)
+    prices = None
+
+    def __init__(self, dishes, offsets, ingredients, category_slices):
+        self.dishes = dishes
+        self.offsets = offsets
+        self.ingredients = ingredients
+        self.category_slices = category_slices
+        # Con varios libros, un mismo (tipo, plato) es el del primer libro que lo tenga
+        self._dish_ids = {}
+        for i, key in enumerate(zip(dishes['Tipo'].tolist(), dishes['Plato'].tolist())):
+            self._dish_ids.setdefault(key, i)
+        self._compile_matrix()
+
+    def _compile_matrix(self):
+        # Unidades normalizadas a su unidad base con un único producto vectorizado
+        base_units, factors, self.unknown_units = compile_units(self.ingredients['Unidades'])
+        self.quantities = self.ingredients['Cantidades'].fillna(0).to_numpy(dtype=np.float64) * factors
+        self.base_units = base_units
+
+        # Vocabulario ordenado de pares (ingrediente, unidad base) a partir de los
+        # códigos enteros de la columna categórica; -1 para filas sin ingrediente
+        names = self.ingredients['Ingredientes']
+        if not isinstance(names.dtype, pd.CategoricalDtype):
+            names = names.astype('string').astype('category')
+        name_codes = names.cat.codes.to_numpy(dtype=np.int64)
+        # factorize (por hash) en lugar de np.unique: ordenar textos fila a fila es lento
+        unit_codes, units = pd.factorize(base_units, sort=True)
+        keys = name_codes * max(len(units), 1) + unit_codes
+        valid = name_codes >= 0
+        pairs, inverse = np.unique(keys[valid], return_inverse=True)
+        codes = np.full(len(keys), -1, dtype=np.int32)
+        codes[valid] = inverse
+        self.ingredient_codes = codes
+
+        self.vocabulary = pd.Index(names.cat.categories[pairs // max(len(units), 1)],
+                                   name='Ingredientes')
+        self.vocabulary_units = units[pairs % max(len(units), 1)]
+
+    @classmethod
+    @traced("build_index")
+    def from_sheets(cls, sheets, categories=None):
+        """
+        Construye el índice a partir del diccionario {hoja: DataFrame}.
+        Con `categories` solo se accede a esas hojas, de modo que con un
+        LazyWorkbook únicamente se parsean los tipos pedidos.
+        """
+        names, frames = [], []
+        for plate_type in sheets:
+            if categories is not None and plate_type not in categories:
+                continue
+            df = sheets[plate_type]
+            if not is_recipe_sheet(df):
+                continue
+            df = normalize_sheet(df.copy())
+            names.append(plate_type)
+            frames.append(df[df['Plato'].notna()])
+
+        if not frames:
+            return cls(pd.DataFrame(columns=DISH_COLUMNS), np.zeros(1, dtype=np.int64),
+                       pd.DataFrame(columns=INGREDIENT_COLUMNS), {})
+
+        # Todas las hojas a la vez sobre los códigos del vocabulario común
+        intern_frames(frames)
+        sheet_of_row = np.repeat(np.arange(len(frames)), [len(df) for df in frames])
+        rows = pd.concat(frames, ignore_index=True)
+        plato_codes = rows['Plato'].cat.codes.to_numpy(dtype=np.int64)
+        num_platos = len(rows['Plato'].cat.categories)
+
+        # Un identificador por (hoja, plato), en orden de aparición: contiguo por tipo
+        codes, keys = pd.factorize(sheet_of_row * num_platos + plato_codes)
+        sheet_of_dish = keys // num_platos
+        order = np.argsort(codes, kind='stable')
+
+        # Página y elaboración: primer valor no nulo de cada plato
+        info = rows.groupby(codes, sort=True)[['Página', 'Elaboración']].first()
+        dishes = pd.DataFrame({
+            'Tipo': np.array(names, dtype=object)[sheet_of_dish],
+            'Plato': rows['Plato'].cat.categories[keys % num_platos].astype('string'),
+            'Página': info['Página'].astype('Int64').array,
+            'Elaboración': info['Elaboración'].astype('string').array,
+        })
+        ingredients = rows[INGREDIENT_COLUMNS].iloc[order].reset_index(drop=True)
+
+        category_slices = {}
+        bounds = np.searchsorted(sheet_of_dish, np.arange(len(frames) + 1))
+        for i, plate_type in enumerate(names):
+            if bounds[i + 1] > bounds[i]:
+                category_slices[plate_type] = (int(bounds[i]), int(bounds[i + 1]))
+
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(keys)), out=offsets[1:])
+        return cls(dishes, offsets, ingredients, category_slices)
+
+    @classmethod
+    @traced("concat_index")
+    def concat(cls, indices, books=None, categories=None):
+        """
+        Une índices ya compilados (p. ej. uno por libro) sin volver a leer
+        sus hojas. Los platos de cada tipo siguen siendo contiguos: primero
+        los del primer índice, después los del segundo... Con `books` se
+        añade a cada índice la columna 'Libro' (None: se deja la que tenga).
+        `categories` fija el orden de los tipos (por defecto, el de aparición).
+        """
+        indices = list(indices)
+        books = [None] * len(indices) if books is None else list(books)
+        if categories is None:
+            categories = list(dict.fromkeys(plate_type for index in indices
+                                            for plate_type in index.category_slices))
+
+        # Posición de cada plato en la concatenación de las tablas, tipo a tipo
+        dish_base = np.cumsum([0] + [len(index) for index in indices])
+        slices = [[index.category_slices.get(plate_type, (0, 0)) for index in indices]
+                  for plate_type in categories]
+        order = np.concatenate([np.arange(dish_base[k] + start, dish_base[k] + stop)
+                                for per_index in slices
+                                for k, (start, stop) in enumerate(per_index)]
+                               or [np.zeros(0, dtype=np.int64)])
+        bounds = np.cumsum([0] + [sum(stop - start for start, stop in per_index)
+                                  for per_index in slices])
+        category_slices = {plate_type: (int(bounds[i]), int(bounds[i + 1]))
+                           for i, plate_type in enumerate(categories)}
+
+        dishes = pd.concat([index.dishes if book is None else index.dishes.assign(Libro=book)
+                            for index, book in zip(indices, books)], ignore_index=True)
+        dishes = dishes.iloc[order].reset_index(drop=True)
+
+        # Vocabulario común: las categorías de los libros se unen recodificando
+        frames = [index.ingredients.copy(deep=False) for index in indices]
+        intern_frames(frames, ('Ingredientes', 'Unidades'))
+        ingredients = pd.concat(frames, ignore_index=True)
+        row_base = np.cumsum([0] + [index.offsets[-1] for index in indices])
+        all_offsets = np.concatenate([index.offsets[:-1] + row_base[k]
+                                      for k, index in enumerate(indices)] + [row_base[-1:]])
+        lengths = np.diff(all_offsets)[order]
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        shift = np.repeat(all_offsets[order] - offsets[:-1], lengths)
+        ingredients = ingredients.iloc[shift + np.arange(offsets[-1])].reset_index(drop=True)
+        return cls(dishes, offsets, ingredients, category_slices)
+
+    def patched(self, sheets, changed):
+        """
+        Índice con los platos de las hojas `changed` leídos de nuevo de
+        `sheets` y los del resto de tipos tomados de este índice, sin
+        recompilar las hojas que no han cambiado (ver update_workbook).
+        """
+        changed = set(changed)
+        part = type(self).from_sheets(sheets, changed)
+        kept = copy.copy(self)
+        kept.category_slices = {plate_type: bounds for plate_type, bounds
+                                in self.category_slices.items() if plate_type not in changed}
+        # Los tipos en el orden de las hojas del libro, como en from_sheets
+        order = [plate_type for plate_type in sheets
+                 if plate_type in kept.category_slices or plate_type in part.category_slices]
+        updated = type(self).concat([kept, part], categories=order)
+        if self.prices is not None:
+            updated.set_prices(self.prices)
+        return updated
+
+    def patch(self, sheets, changed):
+        """
+        Aplica patched() sobre este mismo objeto, de modo que quien tenga
+        una referencia al índice ve el cambio. Los identificadores de los
+        platos cambian. No es seguro mientras otros hilos lo leen: en ese
+        caso se sustituye la referencia por el resultado de patched().
+        """
+        updated = self.patched(sheets, changed)
+        self.__dict__.clear()
+        self.__dict__.update(updated.__dict__)
+
+    @cached_property
+    def ingredient_names(self):
+        """Nombres distintos de ingrediente (sin distinguir unidades), ordenados"""
+        return pd.Index(self.vocabulary.unique(), name='Ingredientes')
+
+    @cached_property
+    def dish_of_row(self):
+        """Plato al que pertenece cada fila de la tabla de ingredientes"""
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    @cached_property
+    def dish_bitsets(self):
+        """
+        Conjunto de ingredientes de cada plato como bitset empaquetado
+        (platos x palabras uint64); el bit j es ingredient_names[j].
+        """
+        valid = self.ingredient_codes >= 0
+        name_of_code = self.ingredient_names.get_indexer(self.vocabulary)
+        return pack_positions(self.dish_of_row[valid],
+                              name_of_code[self.ingredient_codes[valid]],
+                              len(self), len(self.ingredient_names))
+
+    @cached_property
+    def _ingredient_positions(self):
+        # Posición de cada ingrediente por su nombre normalizado
+        return {normalize_name(name): j for j, name in enumerate(self.ingredient_names)}
+
+    def pantry_bitset(self, names):
+        """
+        Bitset de los ingredientes de la despensa y lista de los nombres que
+        no aparecen en ninguna receta (se comparan sin mayúsculas ni espacios extra).
+        """
+        positions, unknown = [], []
+        for name in names:
+            j = self._ingredient_positions.get(normalize_name(name))
+            if j is None:
+                unknown.append(name)
+            else:
+                positions.append(j)
+        bits = pack_positions(np.zeros(len(positions), dtype=np.int64), positions,
+                              1, len(self.ingredient_names))
+        return bits[0], unknown
+
+    def missing_ingredients(self, pantry_bits):
+        """Número de ingredientes que le faltan a cada plato con esa despensa"""
+        return popcount(self.dish_bitsets & ~pantry_bits)
+
+    def pantry_filter(self, names, max_missing=0):
+        """Máscara de los platos a los que faltan como mucho max_missing ingredientes"""
+        pantry_bits, _ = self.pantry_bitset(names)
+        return self.missing_ingredients(pantry_bits) <= max_missing
+
+    @cached_property
+    def dish_totals(self):
+        """Suma de las cantidades (en unidades base) de cada plato"""
+        return np.bincount(self.dish_of_row, weights=self.quantities,
+                           minlength=len(self))
+
+    def set_prices(self, prices):
+        """
+        Une un PriceCatalog al índice: el precio de cada entrada del
+        vocabulario y el coste de cada plato se calculan una sola vez (al
+        pedirlos) y el coste de un menú es una suma de dish_costs.
+        """
+        self.prices = prices
+        for name in ('ingredient_prices', 'dish_costs', 'dish_unpriced'):
+            self.__dict__.pop(name, None)
+
+    @cached_property
+    def ingredient_prices(self):
+        """Precio por unidad base de cada entrada del vocabulario (NaN: sin precio)"""
+        if self.prices is None:
+            return np.full(len(self.vocabulary), np.nan)
+        return self.prices.price_vector(self.vocabulary, self.vocabulary_units)
+
+    @cached_property
+    def dish_costs(self):
+        """Coste de cada plato; los ingredientes sin precio no suman"""
+        valid = self.ingredient_codes >= 0
+        prices = np.nan_to_num(self.ingredient_prices)[self.ingredient_codes[valid]]
+        return np.bincount(self.dish_of_row[valid], weights=self.quantities[valid] * prices,
+                           minlength=len(self))
+
+    @cached_property
+    def dish_unpriced(self):
+        """Número de ingredientes sin precio de cada plato"""
+        valid = self.ingredient_codes >= 0
+        unpriced = np.isnan(self.ingredient_prices)[self.ingredient_codes[valid]]
+        return np.bincount(self.dish_of_row[valid][unpriced], minlength=len(self))
+
+    def menu_cost(self, ids):
+        """Coste de un menú: producto escalar de la selección por dish_costs"""
+        selection = np.bincount(np.asarray(ids, dtype=np.int64), minlength=len(self))
+        return float(selection @ self.dish_costs)
+
+    @property
+    def categories(self):
+        return list(self.category_slices)
+
+    def __len__(self):
+        # Desde offsets: no obliga a construir la tabla de platos (SharedRecipeIndex)
+        return len(self.offsets) - 1
+
+    def dish_ids(self, plate_type, allowed=None):
+        """Identificadores de los platos de un tipo (solo los de la máscara `allowed`)"""
+        start, stop = self.category_slices.get(plate_type, (0, 0))
+        if allowed is None:
+            return np.arange(start, stop)
+        return start + np.flatnonzero(allowed[start:stop])
+
+    @cached_property
+    def _book_dish_ids(self):
+        # (libro, tipo, plato) -> identificador, para índices con varios libros
+        if 'Libro' not in self.dishes:
+            return {}
+        return {key: i for i, key in enumerate(zip(self.dishes['Libro'].tolist(),
+                                                   self.dishes['Tipo'].tolist(),
+                                                   self.dishes['Plato'].tolist()))}
+
+    def lookup(self, plate_type, names, book=None):
+        """
+        Identificadores de los platos de un tipo a partir de sus nombres
+        (con `book`, solo los de ese libro)
+        """
+        if book is not None:
+            return np.array([self._book_dish_ids[(book, plate_type, name)] for name in names
+                             if (book, plate_type, name) in self._book_dish_ids], dtype=np.int64)
+        return np.array([self._dish_ids[(plate_type, name)] for name in names
+                         if (plate_type, name) in self._dish_ids], dtype=np.int64)
+
+    def sample(self, plate_type, plate_num, rng=None, allowed=None):
+        """Selecciona al azar plate_num platos distintos de un tipo"""
+        start, stop = self.category_slices[plate_type]
+        rng = np.random.default_rng() if rng is None else rng
+        if allowed is None:
+            return np.sort(start + rng.choice(stop - start, plate_num, replace=False))
+        return np.sort(rng.choice(self.dish_ids(plate_type, allowed), plate_num, replace=False))
+
+    def ingredient_rows(self, ids):
+        """Filas de la tabla de ingredientes de los platos dados, sin recorrer las hojas"""
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = self.offsets[ids]
+        lengths = self.offsets[ids + 1] - starts
+        # Concatenación vectorizada de los rangos starts[i]:starts[i] + lengths[i]
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return shift + np.arange(lengths.sum())
+
+    @traced("get_dishes")
+    def get_dishes(self, ids, columns=DISH_COLUMNS):
+        """Información de los platos dados"""
+        return self.dishes.iloc[np.asarray(ids, dtype=np.int64)][columns].reset_index(drop=True)
+
+    def get_ingredients(self, ids):
+        """Ingredientes (sin agregar) de los platos dados"""
+        return self.ingredients.iloc[self.ingredient_rows(ids)].reset_index(drop=True)
+
+    def menu_entries(self, dish_ids, menu_of_dish):
+        """
+        Producto disperso (menús x platos) @ (platos x ingredientes) en forma
+        de coordenadas: menú, código del vocabulario y cantidad de cada par
+        presente, ordenados por menú y código. Los menús se agregan por
+        bloques de ENTRY_BLOCK entradas, así que la memoria crece con las
+        entradas no nulas y no con menús x vocabulario.
+        """
+        dish_ids = np.asarray(dish_ids, dtype=np.int64)
+        menu_of_dish = np.asarray(menu_of_dish, dtype=np.int64)
+        if np.any(menu_of_dish[1:] < menu_of_dish[:-1]):
+            order = np.argsort(menu_of_dish, kind='stable')
+            dish_ids, menu_of_dish = dish_ids[order], menu_of_dish[order]
+        size = max(len(self.vocabulary), 1)
+        step = max(1, ENTRY_BLOCK // size)
+        num_menus = int(menu_of_dish[-1]) + 1 if len(menu_of_dish) else 0
+        bounds = np.searchsorted(menu_of_dish, np.arange(0, num_menus + step, step))
+
+        parts = [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))]
+        for first, start, stop in zip(range(0, num_menus, step), bounds[:-1], bounds[1:]):
+            # El último bloque (o el único, con pocos menús) solo abarca los menús que hay
+            block = min(step, num_menus - first)
+            ids = dish_ids[start:stop]
+            rows = self.ingredient_rows(ids)
+            codes = self.ingredient_codes[rows]
+            menus = np.repeat(menu_of_dish[start:stop] - first,
+                              self.offsets[ids + 1] - self.offsets[ids])
+            valid = codes >= 0
+            keys = menus[valid] * size + codes[valid]
+            uses = np.bincount(keys, minlength=block * size)
+            quantities = np.bincount(keys, weights=self.quantities[rows][valid],
+                                     minlength=block * size)
+            present = np.flatnonzero(uses)
+            parts.append((first + present // size, present % size, quantities[present]))
+        return tuple(np.concatenate(part) for part in zip(*parts))
+
+    def ingredient_vector(self, ids):
+        """Cantidades agregadas por ingrediente del vocabulario para los platos dados"""
+        # Un solo menú: basta un bincount sobre el vocabulario
+        rows = self.ingredient_rows(ids)
+        codes = self.ingredient_codes[rows]
+        valid = codes >= 0
+        size = len(self.vocabulary)
+        quantities = np.bincount(codes[valid], weights=self.quantities[rows][valid], minlength=size)
+        present = np.bincount(codes[valid], minlength=size) > 0
+        return quantities, present
+
+    def vector_to_frame(self, quantities, present):
+        """Convierte un vector de cantidades en una lista de la compra"""
+        codes = np.flatnonzero(present)
+        shopping_list = pd.DataFrame({
+            'Ingredientes': self.vocabulary[codes],
+            'Cantidades': quantities[codes],
+            'Unidades': self.vocabulary_units[codes],
+        }, columns=INGREDIENT_COLUMNS)
+        if self.prices is not None:
+            # Coste de cada línea; NaN si el ingrediente no tiene precio
+            shopping_list['Precio'] = quantities[codes] * self.ingredient_prices[codes]
+        return shopping_list
+
+    @traced("shopping_list")
+    def shopping_list(self, ids):
+        """Lista de la compra agregada de los platos dados"""
+        return self.vector_to_frame(*self.ingredient_vector(ids))
+
+    @staticmethod
+    def unit_conflicts(shopping_list):
+        """
+        Filas de una lista de la compra cuyo ingrediente aparece con más de
+        una unidad base no convertible entre sí (p. ej. 'g' y 'uds').
+        """
+        conflicts = shopping_list['Ingredientes'].duplicated(keep=False)
+        return shopping_list.loc[conflicts, ['Ingredientes', 'Cantidades', 'Unidades']]
+
+
+def report_unit_conflicts(shopping_list):
+    """Avisa de los ingredientes de la lista que no se han podido unificar"""
+    conflicts = RecipeIndex.unit_conflicts(shopping_list)
+    if not conflicts.empty:
+        print('Ingredientes con unidades no convertibles (se listan por separado):')
+        for name, group in conflicts.groupby('Ingredientes', sort=False):
+            print(f"- {name}: {', '.join(group['Unidades'])}")
+    return conflicts
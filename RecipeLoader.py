@@ -0,0 +1,449 @@
+# RecipeLoader.py
+# Capa común de carga del libro de recetas para la CLI, Tk y Kivy
+import os
+import json
+import sys
+import hashlib
+import pickle
+import zipfile
+import threading
+import warnings
+from collections.abc import Mapping
+from io import BytesIO
+from xml.etree import ElementTree
+
+import pandas as pd
+import requests
+
+from Tracing import span, traced
+
+# Configuración de rutas
+EXCEL_URL = "https://raw.githubusercontent.com/alherca25/CocinaArguinyano/main/CocinaArguinyano.xlsx"
+LOCAL_EXCEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CocinaArguinyano.xlsx")
+CACHE_DIR = os.environ.get(
+    "COCINA_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "CocinaArguinyano"),
+)
+REQUEST_TIMEOUT = 10
+
+# Versión del formato de la instantánea; se incrementa al cambiar compile_workbook
+SNAPSHOT_VERSION = 4
+
+# Nombres normalizados de las columnas de las hojas de recetas
+COLUMN_ALIASES = {'Pagina': 'Página', 'Elaboracion': 'Elaboración'}
+TEXT_COLUMNS = ('Plato', 'Elaboración', 'Ingredientes', 'Unidades')
+# Columnas muy repetidas que se guardan como categorías con un vocabulario común
+CATEGORICAL_COLUMNS = ('Plato', 'Ingredientes', 'Unidades')
+# Partes del XLSX comunes a todas las hojas: si cambian se vuelven a leer todas
+SHARED_MEMBERS = ('xl/sharedStrings.xml', 'xl/styles.xml')
+
+
+def _cache_paths(url, cache_dir):
+    # Una entrada de caché por URL para poder servir varios libros
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+    return (os.path.join(cache_dir, f"{key}.xlsx"),
+            os.path.join(cache_dir, f"{key}.json"))
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_atomic(path, data):
+    # Escribimos en un temporal y lo renombramos para no dejar cachés a medias
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+@traced("fetch_workbook")
+def fetch_workbook(url=EXCEL_URL, cache_dir=CACHE_DIR, timeout=REQUEST_TIMEOUT):
+    """
+    Devuelve los bytes del XLSX usando una copia local revalidada con
+    ETag/Last-Modified. Con un 304 o sin red se sirve la copia en caché.
+    Si `url` es una ruta local el libro se lee directamente del disco.
+    """
+    if not url.startswith(("http://", "https://")):
+        return _read_file(url)
+
+    data_path, meta_path = _cache_paths(url, cache_dir)
+    cached = os.path.exists(data_path)
+
+    meta = {}
+    if cached and os.path.exists(meta_path):
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+
+    # Petición condicional: solo se descarga el libro si ha cambiado
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached:
+            return _read_file(data_path)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if cached:
+            print(f"No se pudo revalidar el libro ({e}), usando la copia local")
+            return _read_file(data_path)
+        if os.path.exists(LOCAL_EXCEL):
+            print(f"No se pudo descargar el libro ({e}), usando {LOCAL_EXCEL}")
+            return _read_file(LOCAL_EXCEL)
+        raise
+
+    # Guardamos la nueva versión junto con sus validadores
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_atomic(data_path, response.content)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    except OSError as e:
+        print(f"No se pudo guardar la caché de recetas: {e}")
+
+    return response.content
+
+
+@traced("read_workbook")
+def read_workbook(data):
+    """Convierte los bytes del XLSX en un diccionario {hoja: DataFrame}"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return pd.read_excel(BytesIO(data), sheet_name=None)
+
+
+def is_recipe_sheet(df):
+    """Las hojas de recetas son las que tienen columna 'Plato'"""
+    return 'Plato' in df.columns
+
+
+def normalize_sheet(df):
+    """Normaliza una hoja de recetas: nombres de columna, tipos y 'Plato' relleno"""
+    df = df.rename(columns=COLUMN_ALIASES)
+    df['Plato'] = df['Plato'].ffill()
+    for col in TEXT_COLUMNS:
+        # Las columnas ya categóricas (hojas ya internadas) se dejan como están
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('string')
+    if 'Página' in df.columns:
+        df['Página'] = df['Página'].astype('Int64')
+    if 'Cantidades' in df.columns:
+        df['Cantidades'] = pd.to_numeric(df['Cantidades'], errors='coerce').astype('float64')
+    return df
+
+
+def intern_frames(frames, columns=CATEGORICAL_COLUMNS):
+    """
+    Convierte en sitio las columnas `columns` de todos los DataFrames en
+    categorías con las mismas categorías (ordenadas), de modo que cada
+    texto se guarda una sola vez y las agrupaciones usan códigos enteros.
+    """
+    for col in columns:
+        present = [df for df in frames if col in df.columns]
+        if not present:
+            continue
+        dtypes = [df[col].dtype for df in present]
+        if isinstance(dtypes[0], pd.CategoricalDtype) and all(d == dtypes[0] for d in dtypes):
+            continue
+        uniques = [df[col].cat.categories if isinstance(df[col].dtype, pd.CategoricalDtype)
+                   else pd.Index(df[col].dropna().unique()) for df in present]
+        categories = uniques[0].append(uniques[1:]).astype('string').unique().sort_values()
+        dtype = pd.CategoricalDtype(categories)
+        for df in present:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                # Ya internada (p. ej. otro libro): solo se recodifican los códigos
+                df[col] = df[col].cat.set_categories(categories)
+            else:
+                df[col] = df[col].astype('string').astype(dtype)
+    return frames
+
+
+class RecipeBook(dict):
+    """
+    Diccionario {hoja: DataFrame} ya normalizado que además guarda el
+    índice de búsqueda (RecipeSearch), de modo que ambos viajan juntos en
+    la instantánea y la búsqueda no se reconstruye en cada arranque, y
+    los hashes de las hojas del XLSX (sheet_hashes) para recargar solo
+    las que cambien (update_workbook).
+    """
+    _search = None
+    sheet_hashes = None
+
+    @property
+    def search(self):
+        if self._search is None:
+            from RecipeSearch import RecipeSearch
+            self._search = RecipeSearch.from_sheets(self)
+        return self._search
+
+
+@traced("compile_workbook")
+def compile_workbook(data):
+    """Parsea el XLSX y normaliza sus hojas de recetas"""
+    sheets = read_workbook(data)
+    book = RecipeBook((name, normalize_sheet(df) if is_recipe_sheet(df) else df)
+                      for name, df in sheets.items())
+    intern_frames([df for df in book.values() if is_recipe_sheet(df)])
+    book.sheet_hashes = sheet_hashes(data)
+    return book
+
+
+def list_sheet_names(data):
+    """Nombres de las hojas leídos de xl/workbook.xml, sin parsear ninguna hoja"""
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        root = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    return [node.get("name") for node in root.iter() if node.tag.endswith("}sheet")]
+
+
+def sheet_hashes(data):
+    """
+    Hash del XML de cada hoja ({hoja: sha256}) y de las partes comunes
+    (SHARED_MEMBERS), leídos del zip sin parsear ninguna hoja
+    """
+    relationships = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+        members = set(archive.namelist())
+        hashes = {}
+        for node in workbook.iter():
+            if node.tag.endswith("}sheet"):
+                target = targets.get(node.get(relationships), "")
+                # Las rutas son relativas a xl/ salvo que empiecen por /
+                member = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+                hashes[node.get("name")] = hashlib.sha256(archive.read(member)).hexdigest()
+        for member in SHARED_MEMBERS:
+            if member in members:
+                hashes[member] = hashlib.sha256(archive.read(member)).hexdigest()
+    return hashes
+
+
+def read_sheets(data, names):
+    """Parsea solo las hojas `names` del XLSX (openpyxl no recorre las demás)"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        return pd.read_excel(BytesIO(data), sheet_name=list(names))
+
+
+@traced("update_workbook")
+def update_workbook(book, data):
+    """
+    Libro actualizado con los bytes nuevos del XLSX y lista de las hojas
+    que han cambiado. Solo se parsean las hojas cuyo XML ha cambiado; si
+    cambian las partes comunes (textos compartidos, estilos) o la lista de
+    hojas, o `book` no trae hashes, se vuelve a compilar todo el libro.
+    """
+    hashes = sheet_hashes(data)
+    old_hashes = getattr(book, 'sheet_hashes', None)
+    sheet_names = [name for name in hashes if name not in SHARED_MEMBERS]
+    if (not old_hashes or [name for name in old_hashes if name not in SHARED_MEMBERS] != sheet_names
+            or any(old_hashes.get(member) != hashes.get(member) for member in SHARED_MEMBERS)):
+        return compile_workbook(data), sheet_names
+
+    changed = [name for name in sheet_names if old_hashes[name] != hashes[name]]
+    updated = RecipeBook(book)
+    updated.sheet_hashes = hashes
+    if changed:
+        for name, df in read_sheets(data, changed).items():
+            updated[name] = normalize_sheet(df) if is_recipe_sheet(df) else df
+        # Copias superficiales: internar no debe tocar las hojas del libro anterior
+        recipe_sheets = {name: df.copy(deep=False) for name, df in updated.items()
+                         if is_recipe_sheet(df)}
+        intern_frames(list(recipe_sheets.values()))
+        updated.update(recipe_sheets)
+    return updated, changed
+
+
+class LazyWorkbook(Mapping):
+    """
+    Diccionario {hoja: DataFrame} que solo parsea cada hoja la primera vez
+    que se accede a ella y la memoriza ya normalizada. Los nombres de las
+    hojas se obtienen de xl/workbook.xml sin tocar las hojas. Con
+    `snapshot` = (ruta, clave), cuando todas las hojas están parseadas se
+    guarda la instantánea (con la búsqueda, si se ha construido), igual
+    que la de load_recipes.
+    """
+
+    def __init__(self, data, snapshot=None):
+        self._data = data
+        self._names = list_sheet_names(data)
+        self._excel = None
+        self._sheets = {}
+        self._search = None
+        self._snapshot = snapshot
+        self._building_search = False
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        if name not in self._sheets:
+            if name not in self._names:
+                raise KeyError(name)
+            with self._lock, warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                if name not in self._sheets:
+                    # openpyxl en modo solo lectura no recorre las hojas no pedidas
+                    if self._excel is None:
+                        self._excel = pd.ExcelFile(BytesIO(self._data), engine="openpyxl")
+                    with span("read_sheet", hoja=name):
+                        df = self._excel.parse(name)
+                    self._sheets[name] = normalize_sheet(df) if is_recipe_sheet(df) else df
+            # La búsqueda recorre todas las hojas: se guarda al terminarla, con ella
+            if not self._building_search:
+                self._save_snapshot()
+        return self._sheets[name]
+
+    def _save_snapshot(self):
+        with self._lock:
+            if self._snapshot is None or len(self._sheets) < len(self._names):
+                return
+            path, key = self._snapshot
+            self._snapshot = None
+        # Copias superficiales: internar no debe tocar las hojas ya entregadas
+        book = RecipeBook((name, self._sheets[name].copy(deep=False)) for name in self._names)
+        intern_frames([df for df in book.values() if is_recipe_sheet(df)])
+        book.sheet_hashes = sheet_hashes(self._data)
+        book._search = self._search
+        write_snapshot(path, key, book)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    @property
+    def loaded_sheets(self):
+        """Hojas ya parseadas"""
+        return list(self._sheets)
+
+    @property
+    def search(self):
+        """Índice de búsqueda; al crearlo se parsean todas las hojas"""
+        if self._search is None:
+            from RecipeSearch import RecipeSearch
+            self._building_search = True
+            try:
+                self._search = RecipeSearch.from_sheets(self)
+            finally:
+                self._building_search = False
+            self._save_snapshot()
+        return self._search
+
+
+def _snapshot_path(url, cache_dir):
+    data_path, _ = _cache_paths(url, cache_dir)
+    return data_path[:-len(".xlsx")] + ".snapshot.pkl"
+
+
+def _snapshot_key(data):
+    # La instantánea solo es válida para el mismo libro y la misma versión de pandas
+    return {
+        "version": SNAPSHOT_VERSION,
+        "pandas": pd.__version__,
+        "source_hash": hashlib.sha256(data).hexdigest(),
+    }
+
+
+@traced("read_snapshot")
+def read_snapshot(path, key, any_source=False):
+    """
+    Devuelve las hojas de la instantánea si coincide con la clave, o None.
+    Con any_source=True no se exige el mismo libro (sí el mismo formato),
+    para recargar solo las hojas que hayan cambiado.
+    """
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(snapshot, dict):
+        return None
+    stored = snapshot.get("key")
+    if any_source and isinstance(key, dict) and isinstance(stored, dict):
+        stored, key = dict(stored, source_hash=None), dict(key, source_hash=None)
+    if stored != key:
+        return None
+    return snapshot["sheets"]
+
+
+@traced("write_snapshot")
+def write_snapshot(path, key, sheets):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_atomic(path, pickle.dumps({"key": key, "sheets": sheets},
+                                         protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        print(f"No se pudo guardar la instantánea de recetas: {e}")
+
+
+@traced("load_recipes")
+def load_recipes(url=EXCEL_URL, cache_dir=CACHE_DIR, lazy=False):
+    """
+    Carga todas las hojas del libro de recetas (un RecipeBook, con su
+    índice de búsqueda). Se lee la instantánea precompilada y solo se
+    vuelve a parsear el XLSX si su hash cambia.
+    Con lazy=True, si no hay instantánea válida se devuelve un LazyWorkbook
+    que solo parsea las hojas que se usen (y guarda la instantánea cuando
+    se han usado todas).
+    """
+    print("Cargando recetas...")
+    data = fetch_workbook(url, cache_dir)
+    key = _snapshot_key(data)
+    path = _snapshot_path(url, cache_dir)
+
+    sheets = read_snapshot(path, key)
+    if sheets is not None:
+        return sheets
+    # El libro ha cambiado: se parten de la instantánea anterior y solo se
+    # parsean las hojas modificadas
+    previous = read_snapshot(path, key, any_source=True)
+    if previous is None and lazy:
+        return LazyWorkbook(data, (path, key))
+    if previous is None:
+        sheets = compile_workbook(data)
+    else:
+        sheets, changed = update_workbook(previous, data)
+        print(f"Hojas actualizadas: {', '.join(changed) or 'ninguna'}")
+    # El índice de búsqueda se construye ahora para guardarlo en la instantánea
+    sheets.search
+    write_snapshot(path, key, sheets)
+    return sheets
+
+
+@traced("reload_recipes")
+def reload_recipes(book, url=EXCEL_URL, cache_dir=CACHE_DIR):
+    """
+    Vuelve a leer el libro (revalidando la caché) y devuelve el libro
+    actualizado y las hojas que han cambiado, sin parsear las demás. La
+    instantánea se actualiza; la búsqueda se reconstruirá al usarse.
+    """
+    data = fetch_workbook(url, cache_dir)
+    if getattr(book, 'sheet_hashes', None) == sheet_hashes(data):
+        return book, []
+    book, changed = update_workbook(book, data)
+    write_snapshot(_snapshot_path(url, cache_dir), _snapshot_key(data), book)
+    return book, changed
+
+
+if __name__ == '__main__':
+    # Paso de compilación: python RecipeLoader.py [URL]
+    source_url = sys.argv[1] if len(sys.argv) > 1 else EXCEL_URL
+    recipes = load_recipes(source_url)
+    print(f"Instantánea generada en {_snapshot_path(source_url, CACHE_DIR)} "
+          f"({len(recipes)} hojas)")
@@ -0,0 +1,181 @@
+# RecipeSearch.py
+# Búsqueda de platos por nombre, ingredientes y elaboración: índice invertido
+# sin acentos más coincidencia aproximada por trigramas
+import re
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from RecipeLoader import is_recipe_sheet
+from Tracing import traced
+
+# Peso de cada campo en la puntuación
+FIELD_WEIGHTS = {'Plato': 3.0, 'Ingredientes': 2.0, 'Elaboración': 1.0}
+# Palabras demasiado frecuentes para aportar nada a la búsqueda
+STOPWORDS = frozenset("""
+a al con de del el en la las lo los o para por se su sus un una y
+""".split())
+TOKEN_RE = re.compile(r"\w+")
+
+# Factor de las palabras que solo empiezan por el término buscado
+PREFIX_FACTOR = 0.8
+MAX_PREFIX_MATCHES = 50
+# Similitud mínima (Jaccard de trigramas) para aceptar una palabra aproximada
+FUZZY_THRESHOLD = 0.4
+MAX_FUZZY_MATCHES = 5
+
+
+def fold(text):
+    """Texto en minúsculas y sin acentos ni diacríticos (á -> a, ñ -> n)"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(fold(text))
+            if token not in STOPWORDS and len(token) > 1]
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RecipeSearch:
+    """
+    Índice invertido de platos. Los platos se identifican por su posición
+    en `keys` (pares (tipo, plato)); las entradas de la palabra t ocupan
+    postings[offsets[t]:offsets[t + 1]], igual que el CSR de RecipeIndex.
+    """
+
+    def __init__(self, keys, vocabulary, offsets, posting_docs, posting_weights):
+        self.keys = keys
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.posting_docs = posting_docs
+        self.posting_weights = posting_weights
+        self._token_ids = {token: i for i, token in enumerate(vocabulary)}
+
+        # idf de cada palabra: las más raras pesan más
+        doc_freq = np.diff(offsets)
+        self.idf = np.log1p(len(keys) / np.maximum(doc_freq, 1))
+
+        # Trigramas -> palabras del vocabulario que los contienen, también en
+        # CSR: miles de arrays pequeños harían lenta la carga de la instantánea
+        self._trigram_counts = np.zeros(len(vocabulary), dtype=np.int32)
+        trigram_tokens = {}
+        for i, token in enumerate(vocabulary):
+            grams = trigrams(token)
+            self._trigram_counts[i] = len(grams)
+            for gram in grams:
+                trigram_tokens.setdefault(gram, []).append(i)
+        self._trigram_ids = {gram: j for j, gram in enumerate(trigram_tokens)}
+        self._trigram_offsets = np.zeros(len(trigram_tokens) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in trigram_tokens.values()], out=self._trigram_offsets[1:])
+        self._trigram_tokens = np.fromiter((i for ids in trigram_tokens.values() for i in ids),
+                                           dtype=np.int32, count=self._trigram_offsets[-1])
+
+    @classmethod
+    @traced("build_search")
+    def from_sheets(cls, sheets):
+        """Construye el índice a partir de las hojas de recetas ya normalizadas"""
+        keys = []
+        weights = {}  # (palabra, plato) -> peso acumulado de los campos
+
+        for plate_type in sheets:
+            df = sheets[plate_type]
+            if not is_recipe_sheet(df):
+                continue
+            df = df[df['Plato'].notna()]
+            for plato, group in df.groupby('Plato', sort=False, observed=True):
+                doc = len(keys)
+                keys.append((plate_type, str(plato)))
+                fields = {'Plato': str(plato)}
+                if 'Ingredientes' in group:
+                    fields['Ingredientes'] = " ".join(group['Ingredientes'].dropna().astype(str))
+                if 'Elaboración' in group:
+                    fields['Elaboración'] = " ".join(group['Elaboración'].dropna().astype(str))
+                for field, text in fields.items():
+                    for token in set(tokenize(text)):
+                        key = (token, doc)
+                        weights[key] = weights.get(key, 0.0) + FIELD_WEIGHTS[field]
+
+        vocabulary = sorted({token for token, _ in weights})
+        token_ids = {token: i for i, token in enumerate(vocabulary)}
+        entries = sorted((token_ids[token], doc, weight) for (token, doc), weight in weights.items())
+        entries = np.array(entries, dtype=np.float64).reshape(-1, 3)
+
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(entries[:, 0].astype(np.int64), minlength=len(vocabulary)),
+                  out=offsets[1:])
+        return cls(keys, vocabulary, offsets,
+                   entries[:, 1].astype(np.int32), entries[:, 2].astype(np.float32))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _expand(self, token):
+        """Palabras del vocabulario que encajan con un término y su factor"""
+        matches = {}
+        exact = self._token_ids.get(token)
+        if exact is not None:
+            matches[exact] = 1.0
+
+        # Palabras que empiezan por el término (búsqueda mientras se escribe)
+        if len(token) >= 3:
+            i = bisect_left(self.vocabulary, token)
+            stop = min(i + MAX_PREFIX_MATCHES, len(self.vocabulary))
+            while i < stop and self.vocabulary[i].startswith(token):
+                matches.setdefault(i, PREFIX_FACTOR)
+                i += 1
+
+        # Aproximadas por trigramas, solo si no hay coincidencia exacta
+        if exact is None:
+            grams = trigrams(token)
+            hits = [self._trigram_tokens[self._trigram_offsets[j]:self._trigram_offsets[j + 1]]
+                    for j in (self._trigram_ids.get(g) for g in grams) if j is not None]
+            if hits:
+                common = np.bincount(np.concatenate(hits), minlength=len(self.vocabulary))
+                candidates = np.flatnonzero(common)
+                similarity = common[candidates] / (len(grams) + self._trigram_counts[candidates]
+                                                   - common[candidates])
+                best = np.argsort(-similarity)[:MAX_FUZZY_MATCHES]
+                for i, sim in zip(candidates[best], similarity[best]):
+                    if sim >= FUZZY_THRESHOLD:
+                        matches[int(i)] = max(matches.get(int(i), 0.0), float(sim))
+        return matches
+
+    def search_ids(self, query, limit=10):
+        """Posiciones en `keys` de los mejores platos y sus puntuaciones"""
+        token_factors = {}
+        for token in tokenize(query):
+            for i, factor in self._expand(token).items():
+                token_factors[i] = token_factors.get(i, 0.0) + factor
+        if not token_factors:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        ids = np.fromiter(token_factors, dtype=np.int64, count=len(token_factors))
+        factors = np.fromiter(token_factors.values(), dtype=np.float64, count=len(ids))
+        starts = self.offsets[ids]
+        lengths = self.offsets[ids + 1] - starts
+        # Misma concatenación vectorizada de rangos que RecipeIndex.ingredient_rows
+        rows = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        scores = np.bincount(self.posting_docs[rows],
+                             weights=self.posting_weights[rows] * np.repeat(factors * self.idf[ids], lengths),
+                             minlength=len(self.keys))
+
+        found = np.flatnonzero(scores)
+        top = found[np.argsort(-scores[found], kind='stable')[:limit]]
+        return top, scores[top]
+
+    @traced("search")
+    def search(self, query, limit=10):
+        """Tabla de los platos mejor puntuados para una búsqueda libre"""
+        top, scores = self.search_ids(query, limit)
+        return pd.DataFrame({
+            'Tipo': [self.keys[i][0] for i in top],
+            'Plato': [self.keys[i][1] for i in top],
+            'Puntuación': np.round(scores, 2),
+        })
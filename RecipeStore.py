@@ -0,0 +1,352 @@
+# RecipeStore.py
+# Índice de recetas publicado una sola vez en memoria compartida (o en un
+# fichero mapeado) para que los procesos trabajadores lo usen sin copiarlo.
+# Uso: python RecipeStore.py [procesos] [factor]  (arranque y memoria por proceso)
+import json
+import mmap
+import os
+import sys
+import time
+from functools import cached_property
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from RecipeIndex import RecipeIndex
+
+MAGIC = b"COCINA01"
+ALIGNMENT = 64
+
+
+def _pack_strings(values):
+    """Textos como bytes UTF-8 concatenados, sus offsets y una máscara de nulos"""
+    values = pd.Series(values, dtype=object)
+    missing = values.isna().to_numpy()
+    encoded = [b"" if na else str(value).encode("utf-8") for value, na in zip(values, missing)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, missing
+
+
+def _unpack_strings(data, offsets, missing):
+    raw = data.tobytes()
+    return [None if na else raw[start:stop].decode("utf-8")
+            for start, stop, na in zip(offsets[:-1], offsets[1:], missing)]
+
+
+def _codes(values):
+    # Códigos enteros y vocabulario de una columna (categórica o de texto)
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(dtype=np.int32), list(values.cat.categories)
+    codes, uniques = pd.factorize(values.astype('string'))
+    return codes.astype(np.int32), list(uniques)
+
+
+def index_arrays(index):
+    """
+    Arrays planos que describen el índice. Los textos van como bytes UTF-8
+    con offsets; el resto son arrays numéricos que se usan tal cual.
+    """
+    arrays = {
+        'offsets': index.offsets,
+        'ingredient_codes': index.ingredient_codes,
+        'quantities': index.quantities,
+        'dish_bitsets': index.dish_bitsets,
+        'dish_totals': index.dish_totals,
+    }
+    text_columns = {
+        'vocabulary': list(index.vocabulary),
+        'vocabulary_units': list(index.vocabulary_units),
+        'dish_plato': list(index.dishes['Plato']),
+        'dish_elaboracion': list(index.dishes['Elaboración']),
+    }
+    if 'Libro' in index.dishes:
+        text_columns['dish_libro'] = list(index.dishes['Libro'])
+
+    # Tabla de ingredientes sin agregar: códigos de nombre y unidad originales
+    name_codes, names = _codes(index.ingredients['Ingredientes'])
+    unit_codes, units = _codes(index.ingredients['Unidades'])
+    arrays['row_name_codes'] = name_codes
+    arrays['row_unit_codes'] = unit_codes
+    arrays['row_quantities'] = index.ingredients['Cantidades'].to_numpy(dtype=np.float64)
+    text_columns['row_names'] = names
+    text_columns['row_units'] = units
+
+    # Tipo como código sobre category_slices y página con -1 para los nulos
+    arrays['dish_tipo'] = np.zeros(len(index), dtype=np.int32)
+    for code, (start, stop) in enumerate(index.category_slices.values()):
+        arrays['dish_tipo'][start:stop] = code
+    arrays['dish_pagina'] = index.dishes['Página'].astype('Int64').fillna(-1).to_numpy(dtype=np.int64)
+
+    for name, values in text_columns.items():
+        arrays[f'{name}.data'], arrays[f'{name}.offsets'], arrays[f'{name}.missing'] = \
+            _pack_strings(values)
+    return arrays
+
+
+def _layout(arrays, meta):
+    # Cabecera JSON con la posición de cada array, alineada a ALIGNMENT bytes
+    specs, position = {}, 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        specs[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': position}
+        position += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({'meta': meta, 'arrays': specs}).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+    return header, data_start, data_start + position
+
+
+def _write(buffer, arrays, header, data_start):
+    buffer[:len(MAGIC)] = MAGIC
+    buffer[len(MAGIC):len(MAGIC) + 8] = len(header).to_bytes(8, "little")
+    buffer[len(MAGIC) + 8:len(MAGIC) + 8 + len(header)] = header
+    specs = json.loads(header)['arrays']
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        start = data_start + specs[name]['offset']
+        np.frombuffer(buffer, dtype=np.uint8, count=array.nbytes, offset=start)[:] = \
+            array.view(np.uint8).reshape(-1)
+
+
+def _read(buffer):
+    # Vistas sin copia sobre el bloque compartido
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("El bloque no contiene un índice de recetas")
+    header_len = int.from_bytes(bytes(buffer[len(MAGIC):len(MAGIC) + 8]), "little")
+    header = json.loads(bytes(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + header_len]))
+    data_start = -(-(len(MAGIC) + 8 + header_len) // ALIGNMENT) * ALIGNMENT
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        array = np.frombuffer(buffer, dtype=dtype, count=count,
+                              offset=data_start + spec['offset']).reshape(spec['shape'])
+        array.flags.writeable = False
+        arrays[name] = array
+    return header['meta'], arrays
+
+
+class RecipeStore:
+    """
+    Bloque de memoria con el índice compilado: una cabecera JSON y los
+    arrays de index_arrays alineados. Se publica una vez (publish) en
+    multiprocessing.shared_memory o, con `path`, en un fichero que se
+    mapea en memoria; los trabajadores lo abren con attach y obtienen un
+    SharedRecipeIndex cuyos arrays apuntan al bloque, sin copiarlo.
+    """
+
+    def __init__(self, buffer, name, handle, owner):
+        self.name = name
+        self._buffer = buffer
+        self._handle = handle
+        self._owner = owner
+        self.meta, self.arrays = _read(buffer)
+
+    @classmethod
+    def publish(cls, index, path=None):
+        """Copia el índice al bloque compartido (o al fichero `path`) y lo devuelve abierto"""
+        arrays = index_arrays(index)
+        meta = {'categories': list(index.category_slices),
+                'category_slices': list(index.category_slices.values()),
+                'unknown_units': list(index.unknown_units)}
+        header, data_start, size = _layout(arrays, meta)
+
+        if path is None:
+            handle = shared_memory.SharedMemory(create=True, size=size)
+            _write(handle.buf, arrays, header, data_start)
+            return cls(handle.buf, handle.name, handle, owner=True)
+
+        # Fichero temporal + rename: los lectores nunca ven un bloque a medias
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        with open(tmp_path, "r+b") as f:
+            with mmap.mmap(f.fileno(), size) as buffer:
+                _write(buffer, arrays, header, data_start)
+        os.replace(tmp_path, path)
+        return cls.attach(path)
+
+    @classmethod
+    def attach(cls, name):
+        """Abre un bloque publicado: nombre de memoria compartida o ruta de fichero"""
+        if os.path.exists(name):
+            with open(name, "rb") as f:
+                handle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return cls(memoryview(handle), name, handle, owner=False)
+        try:
+            handle = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 no tiene track=False: sin registrar el bloque, el
+            # resource_tracker del trabajador no lo borra al terminar
+            from multiprocessing import resource_tracker
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                handle = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(handle.buf, name, handle, owner=False)
+
+    @property
+    def nbytes(self):
+        return len(self._buffer)
+
+    def index(self):
+        return SharedRecipeIndex(self)
+
+    def close(self):
+        """
+        Suelta las vistas; el publicador además borra el bloque compartido.
+        Los índices obtenidos con index() deben haberse liberado antes.
+        """
+        self.arrays = {}
+        if isinstance(self._buffer, memoryview):
+            self._buffer.release()
+        self._handle.close()
+        if self._owner and isinstance(self._handle, shared_memory.SharedMemory):
+            self._handle.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SharedRecipeIndex(RecipeIndex):
+    """
+    RecipeIndex sobre los arrays de un RecipeStore. Los arrays numéricos
+    (CSR, cantidades, bitsets) se usan sin copiar; las tablas de platos e
+    ingredientes, que solo hacen falta para mostrar resultados, se
+    reconstruyen la primera vez que se piden.
+    """
+
+    def __init__(self, store):
+        arrays = store.arrays
+        self.store = store
+        self.category_slices = {name: tuple(bounds) for name, bounds
+                                in zip(store.meta['categories'], store.meta['category_slices'])}
+        self.unknown_units = store.meta['unknown_units']
+        self.offsets = arrays['offsets']
+        self.ingredient_codes = arrays['ingredient_codes']
+        self.quantities = arrays['quantities']
+        self.vocabulary = pd.Index(self._strings('vocabulary'), dtype='string', name='Ingredientes')
+        self.vocabulary_units = np.array(self._strings('vocabulary_units'), dtype=object)
+        # Propiedades ya calculadas al publicar
+        self.__dict__['dish_bitsets'] = arrays['dish_bitsets']
+        self.__dict__['dish_totals'] = arrays['dish_totals']
+
+    def _strings(self, name):
+        arrays = self.store.arrays
+        return _unpack_strings(arrays[f'{name}.data'], arrays[f'{name}.offsets'],
+                               arrays[f'{name}.missing'])
+
+    @cached_property
+    def dishes(self):
+        arrays = self.store.arrays
+        categories = np.array(list(self.category_slices), dtype=object)
+        pagina = pd.array(arrays['dish_pagina'], dtype='Int64')
+        pagina[arrays['dish_pagina'] < 0] = pd.NA
+        dishes = pd.DataFrame({
+            'Tipo': categories[arrays['dish_tipo']],
+            'Plato': pd.array(self._strings('dish_plato'), dtype='string'),
+            'Página': pagina,
+            'Elaboración': pd.array(self._strings('dish_elaboracion'), dtype='string'),
+        })
+        if 'dish_libro.data' in arrays:
+            dishes['Libro'] = self._strings('dish_libro')
+        return dishes
+
+    @cached_property
+    def ingredients(self):
+        arrays = self.store.arrays
+        names = pd.CategoricalDtype(pd.Index(self._strings('row_names'), dtype='string'))
+        units = pd.CategoricalDtype(pd.Index(self._strings('row_units'), dtype='string'))
+        return pd.DataFrame({
+            'Ingredientes': pd.Categorical.from_codes(arrays['row_name_codes'], dtype=names),
+            'Cantidades': arrays['row_quantities'].copy(),
+            'Unidades': pd.Categorical.from_codes(arrays['row_unit_codes'], dtype=units),
+        })
+
+    @cached_property
+    def _dish_ids(self):
+        return {(tipo, plato): i for i, (tipo, plato)
+                in enumerate(zip(self.dishes['Tipo'], self.dishes['Plato']))}
+
+
+def _memory_kb():
+    # PSS (las páginas compartidas se reparten entre procesos) o, si no hay, RSS
+    for path, field in (("/proc/self/smaps_rollup", "Pss:"), ("/proc/self/status", "VmRSS:")):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+    return 0
+
+
+def _attach_worker(name):
+    # Trabajador que se engancha al bloque publicado
+    t0 = time.perf_counter()
+    store = RecipeStore.attach(name)
+    index = store.index()
+    startup = time.perf_counter() - t0
+    from MenuPlanner import generate_menus
+    generate_menus(index, {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Postres': 1}, replicas=100)
+    memory = _memory_kb()
+    del index
+    store.close()
+    return startup, memory
+
+
+def _load_worker(path):
+    # Trabajador que lee la instantánea del libro y compila su propio índice
+    t0 = time.perf_counter()
+    from RecipeLoader import read_snapshot
+    index = RecipeIndex.from_sheets(read_snapshot(path, None))
+    startup = time.perf_counter() - t0
+    from MenuPlanner import generate_menus
+    generate_menus(index, {'Sopas': 2, 'Verduras': 3, 'Carnes': 2, 'Postres': 1}, replicas=100)
+    return startup, _memory_kb()
+
+
+if __name__ == '__main__':
+    import multiprocessing
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    from Benchmarks import scaled_book_path
+    from RecipeLoader import LOCAL_EXCEL, compile_workbook, write_snapshot
+
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    factor = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with open(LOCAL_EXCEL, "rb") as f:
+        base_sheets = compile_workbook(f.read())
+    with open(scaled_book_path(base_sheets, factor), "rb") as f:
+        sheets = compile_workbook(f.read())
+    index = RecipeIndex.from_sheets(sheets)
+    # Sin almacén compartido cada trabajador parte de la instantánea (el caso rápido)
+    path = os.path.join(tempfile.mkdtemp(), "recetas.snapshot.pkl")
+    write_snapshot(path, None, sheets)
+
+    t0 = time.perf_counter()
+    store = RecipeStore.publish(index)
+    print(f"Libro x{factor}: {len(index)} platos, bloque de {store.nbytes / 2**20:.1f} MB "
+          f"publicado en {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    context = multiprocessing.get_context("spawn")
+    for workers in sorted({1, max_workers}):
+        for label, worker, arg in (("compartido", _attach_worker, store.name),
+                                   ("carga propia", _load_worker, path)):
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                results = list(pool.map(worker, [arg] * workers))
+            startup = np.mean([r[0] for r in results]) * 1000
+            memory = np.mean([r[1] for r in results]) / 1024
+            print(f"{workers} procesos, {label:12s}: arranque {startup:8.1f} ms, "
+                  f"memoria {memory:6.1f} MB por proceso")
+    store.close()
+    os.remove(path)
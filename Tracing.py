@@ -0,0 +1,255 @@
+# Tracing.py
+# Instrumentación de las etapas lentas (carga, selección, agregación, PDFs):
+# spans con nombre, pico de memoria opcional con tracemalloc, informe por
+# ejecución, traza JSON (chrome://tracing, Perfetto) y volcado de cProfile.
+#
+# Se activa con COCINA_TRACE=time|memory (o --trace en la CLI); la traza y
+# el perfil se escriben en COCINA_TRACE_FILE y COCINA_PROFILE (--trace-file,
+# --profile). Desactivado, cada span es una comprobación de una variable.
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+MODES = ('time', 'memory')
+
+_mode = None            # None (desactivado), 'time' o 'memory'
+_trace_file = None
+_profile_file = None
+_run = None             # Ejecución en curso: solo se registran spans dentro de una
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enable(mode='time', trace_file=None, profile_file=None):
+    """Activa los spans ('time' o 'memory'); con mode=None se desactivan"""
+    global _mode, _trace_file, _profile_file
+    if mode is not None and mode not in MODES:
+        raise ValueError(f"Modo de traza desconocido: {mode} (opciones: {', '.join(MODES)})")
+    _mode, _trace_file, _profile_file = mode, trace_file, profile_file
+
+
+def enabled():
+    return _mode is not None
+
+
+class _Run:
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.records = []
+        self.profiler = None
+
+
+def begin_run(name):
+    """
+    Empieza una ejecución (main(), un botón...). Solo hay una a la vez: si
+    ya había otra, se cierra antes. Para manejadores que terminan en otro
+    momento (PDFs en segundo plano) se cierra con end_run().
+    """
+    global _run
+    if _mode is None:
+        return
+    if _run is not None:
+        end_run()
+    current = _Run(name)
+    if _mode == 'memory' and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if _profile_file:
+        current.profiler = cProfile.Profile()
+        current.profiler.enable()
+    _run = current
+
+
+def end_run(verbose=True):
+    """Cierra la ejecución en curso: imprime el informe y escribe la traza y el perfil"""
+    global _run
+    current, _run = _run, None
+    if current is None:
+        return None
+    elapsed = (time.perf_counter() - current.start) * 1000
+    if current.profiler is not None:
+        current.profiler.disable()
+        current.profiler.dump_stats(_profile_file)
+    if _mode == 'memory' and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    if _trace_file:
+        write_trace(current, _trace_file)
+    if verbose:
+        print_report(current, elapsed)
+    return current.records
+
+
+class run:
+    """Context manager alrededor de una ejecución completa (main(), un botón...)"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        begin_run(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        end_run()
+        return False
+
+
+def _frames():
+    # Pila de spans abiertos del hilo actual
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def _begin_span():
+    stack = _frames()
+    frame = {'start': time.perf_counter(), 'depth': len(stack)}
+    if _mode == 'memory':
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # El pico del padre hasta ahora no debe perderse al reiniciarlo
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['memory'] = frame['peak'] = current
+    stack.append(frame)
+    return frame
+
+
+def _end_span(frame, name, attrs):
+    end = time.perf_counter()
+    stack = _frames()
+    stack.pop()
+    current = _run
+    if current is None:
+        # La ejecución terminó con el span abierto: solo se cierra
+        return
+    entry = {
+        'name': name,
+        'start_ms': (frame['start'] - current.start) * 1000,
+        'duration_ms': (end - frame['start']) * 1000,
+        'depth': frame['depth'],
+        'thread': threading.current_thread().name,
+    }
+    if attrs:
+        entry['args'] = attrs
+    if 'memory' in frame and tracemalloc.is_tracing():
+        frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+        entry['peak_kb'] = (frame['peak'] - frame['memory']) / 1024
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], frame['peak'])
+        tracemalloc.reset_peak()
+    with _lock:
+        current.records.append(entry)
+
+
+class span:
+    """
+    Span con nombre: `with span('read_workbook', filas=n): ...`. Fuera de
+    una ejecución o con la instrumentación desactivada no hace nada.
+    """
+    __slots__ = ('name', 'attrs', 'frame')
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.frame = None
+
+    def __enter__(self):
+        if _run is not None:
+            self.frame = _begin_span()
+        return self
+
+    def __exit__(self, *exc):
+        if self.frame is not None:
+            _end_span(self.frame, self.name, self.attrs)
+            self.frame = None
+        return False
+
+
+def traced(name):
+    """Decorador: la función completa es un span con ese nombre"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _run is None:
+                return func(*args, **kwargs)
+            frame = _begin_span()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _end_span(frame, name, None)
+        return wrapper
+    return decorator
+
+
+def record(name, start, **attrs):
+    """
+    Registra un intervalo medido fuera de un span (p. ej. un PDF hecho en
+    otro proceso, desde que se encoló hasta que terminó); `start` es un
+    time.perf_counter().
+    """
+    if _run is None:
+        return
+    entry = {
+        'name': name,
+        'start_ms': (start - _run.start) * 1000,
+        'duration_ms': (time.perf_counter() - start) * 1000,
+        'depth': 0,
+        'thread': threading.current_thread().name,
+    }
+    if attrs:
+        entry['args'] = attrs
+    with _lock:
+        _run.records.append(entry)
+
+
+def summarize(records):
+    """{nombre: {count, total_ms, max_ms, peak_kb}} en orden de tiempo total"""
+    summary = {}
+    for entry in records:
+        stats = summary.setdefault(entry['name'], {'count': 0, 'total_ms': 0.0,
+                                                   'max_ms': 0.0, 'peak_kb': None})
+        stats['count'] += 1
+        stats['total_ms'] += entry['duration_ms']
+        stats['max_ms'] = max(stats['max_ms'], entry['duration_ms'])
+        if 'peak_kb' in entry:
+            stats['peak_kb'] = max(stats['peak_kb'] or 0.0, entry['peak_kb'])
+    return dict(sorted(summary.items(), key=lambda item: -item[1]['total_ms']))
+
+
+def print_report(current, elapsed_ms):
+    print(f"\n=== Traza de {current.name}: {elapsed_ms:.1f} ms ===")
+    print(f"{'span':28s} {'veces':>6s} {'total ms':>10s} {'máx ms':>10s} {'pico KB':>10s}")
+    for name, stats in summarize(current.records).items():
+        peak = f"{stats['peak_kb']:10.0f}" if stats['peak_kb'] is not None else f"{'-':>10s}"
+        print(f"{name:28s} {stats['count']:6d} {stats['total_ms']:10.2f} "
+              f"{stats['max_ms']:10.2f} {peak}")
+
+
+def write_trace(current, path):
+    """Traza en formato Trace Event (se abre en chrome://tracing o ui.perfetto.dev)"""
+    threads = {}
+    events = []
+    for entry in current.records:
+        tid = threads.setdefault(entry['thread'], len(threads))
+        args = dict(entry.get('args', {}))
+        if 'peak_kb' in entry:
+            args['peak_kb'] = round(entry['peak_kb'], 1)
+        events.append({'name': entry['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                       'ts': entry['start_ms'] * 1000, 'dur': entry['duration_ms'] * 1000,
+                       'args': args})
+    events += [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                'args': {'name': thread}} for thread, tid in threads.items()]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                   'otherData': {'run': current.name}}, f)
+
+
+# Configuración desde el entorno, p. ej. COCINA_TRACE=memory python PyInterface.py
+if os.environ.get("COCINA_TRACE"):
+    enable(os.environ["COCINA_TRACE"] if os.environ["COCINA_TRACE"] in MODES else 'time',
+           os.environ.get("COCINA_TRACE_FILE"), os.environ.get("COCINA_PROFILE"))
@@ -0,0 +1,51 @@
+# Units.py
+# Normalización de unidades: cada unidad se traduce a una unidad base y un factor
+import numpy as np
+import pandas as pd
+
+# {unidad: (unidad base, factor)}; las claves se comparan en minúsculas
+UNIT_TABLE = {
+    # Masa
+    'mg': ('g', 0.001),
+    'g': ('g', 1.0),
+    'gr': ('g', 1.0),
+    'kg': ('g', 1000.0),
+    # Volumen
+    'ml': ('mL', 1.0),
+    'cl': ('mL', 10.0),
+    'dl': ('mL', 100.0),
+    'l': ('mL', 1000.0),
+    'cuch': ('mL', 15.0),   # Cucharada sopera
+    'cdta': ('mL', 5.0),    # Cucharadita
+    # Piezas
+    'uds': ('uds', 1.0),
+    'ud': ('uds', 1.0),
+}
+
+
+def compile_units(units):
+    """
+    Compila la conversión de una columna de unidades. Devuelve, fila a fila,
+    la unidad base y el factor por el que multiplicar la cantidad, junto con
+    la lista de unidades que no aparecen en UNIT_TABLE (se dejan tal cual).
+    La tabla se consulta una vez por unidad distinta, no por fila.
+    """
+    units = pd.Series(units)
+    if isinstance(units.dtype, pd.CategoricalDtype):
+        # Columna ya internada: basta con sus códigos y su vocabulario
+        codes, uniques = units.cat.codes.to_numpy(), units.cat.categories
+    else:
+        codes, uniques = pd.factorize(units.astype('string'))
+    base = np.empty(len(uniques) + 1, dtype=object)
+    factor = np.ones(len(uniques) + 1, dtype=np.float64)
+    unknown = []
+    for i, unit in enumerate(uniques):
+        key = str(unit).strip().lower()
+        if key in UNIT_TABLE:
+            base[i], factor[i] = UNIT_TABLE[key]
+        else:
+            base[i] = str(unit).strip()
+            unknown.append(base[i])
+    # La última posición recoge las filas sin unidad (código -1)
+    base[-1] = ''
+    return base[codes], factor[codes], unknown
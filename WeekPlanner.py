@@ -0,0 +1,233 @@
+# WeekPlanner.py
+# Planificación de varias semanas sin repetir platos dentro de una ventana,
+# con historial y replanificación de un único plato
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from MenuOptimizer import MenuOptimizer, DEFAULT_TIME_BUDGET
+from MenuPlanner import MenuPlan, ShoppingTally
+from Tracing import traced
+
+# Semanas consecutivas en las que un plato no puede repetirse (1: solo dentro de la semana)
+NO_REPEAT_WEEKS = 2
+
+
+def week_start(day=None):
+    """Lunes de la semana de `day` (por defecto, la semana actual)"""
+    day = date.today() if day is None else day
+    return day - timedelta(days=day.weekday())
+
+
+class WeekPlan:
+    """
+    Menús de varias semanas para una misma petición {tipo: cantidad}.
+    Un plato no aparece dos veces en `window` semanas consecutivas,
+    contando también las semanas anteriores del historial. Con max_cost
+    (requiere RecipeIndex.set_prices) ninguna semana cuesta más. Cada semana
+    mantiene su lista de la compra como ShoppingTally, de modo que
+    cambiar un plato solo recalcula ese hueco y los ingredientes afectados.
+    """
+
+    def __init__(self, index, menu_request, weeks=(), window=NO_REPEAT_WEEKS, history=(),
+                 objective=None, allowed=None, start=None, max_cost=None):
+        self.index = index
+        self.menu_request = dict(menu_request)
+        self.window = window
+        self.history = [np.asarray(ids, dtype=np.int64) for ids in history]
+        self.objective = objective
+        self.allowed = allowed
+        self.max_cost = max_cost
+        self.start = week_start(start)
+        self.weeks, self.tallies = [], []
+        for ids in weeks:
+            self._append(ids)
+
+    def _append(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        self.weeks.append(ids)
+        self.tallies.append(ShoppingTally(self.index, ids))
+
+    @classmethod
+    @traced("plan_weeks")
+    def generate(cls, index, menu_request, num_weeks, window=NO_REPEAT_WEEKS, history=(),
+                 rng=None, objective=None, time_budget=DEFAULT_TIME_BUDGET, allowed=None,
+                 start=None, verbose=True, max_cost=None):
+        """
+        Genera num_weeks semanas seguidas. Cada semana se elige como un
+        MenuPlan (al azar o con el MenuOptimizer si hay `objective`) entre
+        los platos que no se han usado en las window - 1 semanas anteriores
+        y, con `max_cost`, sin que la semana cueste más.
+        """
+        log = print if verbose else (lambda *args: None)
+        rng = np.random.default_rng() if rng is None else rng
+        plan = cls(index, menu_request, (), window, history, objective, allowed, start, max_cost)
+        requested = sum(min(max(int(num), 0), len(index.dish_ids(plate_type)))
+                        for plate_type, num in menu_request.items()
+                        if plate_type in index.category_slices)
+
+        for week in range(num_weeks):
+            menu = MenuPlan.from_request(index, menu_request, rng, verbose=False,
+                                         objective=objective, time_budget=time_budget,
+                                         allowed=plan._available(week), max_cost=max_cost)
+            if max_cost is not None and requested and not len(menu):
+                log(f'Semana {week + 1}: ningún menú sin repetir platos cuesta {max_cost:g} o menos')
+            elif len(menu) < requested:
+                log(f'Semana {week + 1}: solo hay {len(menu)} de {requested} platos '
+                    f'sin repetir en {window} semanas')
+            plan._append(menu.dish_ids)
+        return plan
+
+    def __len__(self):
+        return len(self.weeks)
+
+    def week_date(self, week):
+        return self.start + timedelta(weeks=week)
+
+    def cost(self, week):
+        """Coste estimado de una semana (RecipeIndex.menu_cost)"""
+        return self.index.menu_cost(self.weeks[week])
+
+    def _available(self, week):
+        # Platos permitidos que no están en las semanas vecinas dentro de la ventana
+        mask = np.ones(len(self.index), dtype=bool) if self.allowed is None else self.allowed.copy()
+        timeline = self.history + self.weeks
+        position = len(self.history) + week
+        for other in range(max(0, position - self.window + 1),
+                           min(len(timeline), position + self.window)):
+            if other != position:
+                mask[timeline[other]] = False
+        return mask
+
+    def swap(self, week, dish_id, rng=None):
+        """
+        Cambia el plato dish_id de la semana `week` por otro del mismo tipo
+        que respete la ventana (y max_cost), sin tocar el resto del plan. Devuelve el
+        cambio de la lista de la compra de esa semana (ShoppingTally.replace)
+        o None si no queda ningún plato alternativo.
+        """
+        ids = self.weeks[week]
+        slot = np.flatnonzero(ids == dish_id)
+        if not len(slot):
+            raise ValueError(f"El plato {dish_id} no está en la semana {week + 1}")
+        slot = slot[0]
+
+        mask = self._available(week)
+        mask[ids] = False
+        plate_type = self.index.dishes['Tipo'].iat[dish_id]
+        candidates = self.index.dish_ids(plate_type, mask)
+        if self.max_cost is not None:
+            costs = self.index.dish_costs
+            rest = costs[ids].sum() - costs[dish_id]
+            candidates = candidates[rest + costs[candidates] <= self.max_cost]
+        if not len(candidates):
+            return None
+
+        rng = np.random.default_rng() if rng is None else rng
+        if self.objective is None:
+            new_id = int(rng.choice(candidates))
+        else:
+            # El candidato que mejor encaja con el resto de platos de la semana
+            costs = MenuOptimizer(self.index, self.objective).costs_with(np.delete(ids, slot), candidates)
+            best = np.flatnonzero(costs == costs.min())
+            new_id = int(candidates[rng.choice(best)])
+
+        # Mismo tipo en el mismo hueco: la semana sigue agrupada por tipo
+        ids[slot] = new_id
+        return self.tallies[week].replace([dish_id], [new_id])
+
+    def dishes(self, columns=('Tipo', 'Plato', 'Página')):
+        """Platos de todas las semanas apilados, con una columna 'Semana' (fecha del lunes)"""
+        dish_ids = np.concatenate(self.weeks) if self.weeks else np.zeros(0, dtype=np.int64)
+        dishes_result = self.index.get_dishes(dish_ids, list(columns))
+        dishes_result.insert(0, 'Semana', np.repeat([self.week_date(w).isoformat()
+                                                     for w in range(len(self))],
+                                                    [len(ids) for ids in self.weeks]))
+        return dishes_result
+
+    def shopping_list(self, week):
+        """Lista de la compra de una semana"""
+        return self.tallies[week].frame()
+
+    # === Historial === #
+
+    def save(self, path):
+        """
+        Guarda las semanas del plan en el historial JSON {lunes: [[tipo, plato], ...]},
+        sustituyendo las semanas que ya estuvieran guardadas con la misma fecha.
+        Se guardan nombres y no identificadores, que cambian al editar el libro;
+        con varios libros (RecipeCatalog) cada plato lleva también su libro.
+        """
+        history = read_history_file(path)
+        dishes = self.index.dishes
+        columns = ['Tipo', 'Plato'] + (['Libro'] if 'Libro' in dishes else [])
+        for week, ids in enumerate(self.weeks):
+            history[self.week_date(week).isoformat()] = [
+                [dishes[col].iat[i] for col in columns] for i in ids]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(history.items())), f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_history(index, path, before=None):
+        """
+        Semanas del historial anteriores a `before` (por defecto, la semana
+        actual) como identificadores de `index`, de la más antigua a la más
+        reciente. Los platos que ya no están en el libro se descartan.
+        """
+        before = week_start(before).isoformat()
+        weeks = []
+        for day, entries in sorted(read_history_file(path).items()):
+            if day >= before:
+                continue
+            by_type = {}
+            for plate_type, plato, *book in entries:
+                by_type.setdefault((plate_type, book[0] if book else None), []).append(plato)
+            weeks.append(np.concatenate([index.lookup(plate_type, names, book)
+                                         for (plate_type, book), names in by_type.items()]
+                                        or [np.zeros(0, dtype=np.int64)]))
+        return weeks
+
+
+def read_history_file(path):
+    """Contenido del historial JSON, o vacío si todavía no existe"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    # Replanificar un plato frente a regenerar el plan: python WeekPlanner.py [semanas]
+    from RecipeLoader import load_recipes
+    from RecipeIndex import RecipeIndex
+
+    num_weeks = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    index = RecipeIndex.from_sheets(load_recipes())
+    menu_request = {'Sopas': 1, 'Verduras': 2, 'Carnes': 2, 'Pescados': 2, 'Postres': 1}
+    rng = np.random.default_rng(0)
+
+    t0 = time.perf_counter()
+    plan = WeekPlan.generate(index, menu_request, num_weeks, rng=rng, verbose=False)
+    for week in range(len(plan)):
+        plan.shopping_list(week)
+    regenerate = time.perf_counter() - t0
+
+    repeats = 200
+    t0 = time.perf_counter()
+    for k in range(repeats):
+        week = k % len(plan)
+        plan.swap(week, plan.weeks[week][k % len(plan.weeks[week])], rng)
+    swap = (time.perf_counter() - t0) / repeats
+
+    used = pd.Series(np.concatenate(plan.weeks))
+    print(f"Plan de {num_weeks} semanas: {regenerate * 1000:.1f} ms; "
+          f"cambiar un plato: {swap * 1000:.2f} ms")
+    print(f"Platos distintos: {used.nunique()} de {len(used)}")
@@ -0,0 +1,124 @@
+# test_RecipeLoader.py
+# Caché revalidada de fetch_workbook contra un servidor HTTP local
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import RecipeLoader  # noqa: E402
+from RecipeLoader import fetch_workbook, _cache_paths  # noqa: E402
+
+ETAG = '"libro-v1"'
+
+
+class WorkbookHandler(BaseHTTPRequestHandler):
+    """Sirve el XLSX con ETag y responde 304 si el cliente ya lo tiene"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG:
+            server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+        server.bodies += 1
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Type', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.send_header('Content-Length', str(len(server.payload)))
+        self.end_headers()
+        self.wfile.write(server.payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchWorkbookTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(RecipeLoader.LOCAL_EXCEL, 'rb') as f:
+            self.payload = f.read()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), WorkbookHandler)
+        self.server.payload = self.payload
+        self.server.requests = []
+        self.server.bodies = 0
+        self.server.not_modified = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/CocinaArguinyano.xlsx'
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+        self.running = True
+
+    def tearDown(self):
+        self.stop_server()
+        self.tmp.cleanup()
+
+    def stop_server(self):
+        if self.running:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.running = False
+
+    def fetch(self):
+        with redirect_stdout(StringIO()) as out:
+            data = fetch_workbook(self.url, self.cache_dir, timeout=5)
+        return data, out.getvalue()
+
+    def test_first_download_fills_cache(self):
+        data, _ = self.fetch()
+        self.assertEqual(data, self.payload)
+        self.assertEqual(self.server.bodies, 1)
+        self.assertNotIn('If-None-Match', self.server.requests[0])
+
+        data_path, meta_path = _cache_paths(self.url, self.cache_dir)
+        with open(data_path, 'rb') as f:
+            self.assertEqual(f.read(), self.payload)
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        self.assertEqual(meta['etag'], ETAG)
+        self.assertEqual(meta['url'], self.url)
+
+    def test_not_modified_uses_cache(self):
+        self.fetch()
+        data_path, _ = _cache_paths(self.url, self.cache_dir)
+        mtime = os.stat(data_path).st_mtime_ns
+        # Si se volviera a descargar el cuerpo, llegaría este contenido distinto
+        self.server.payload = b'no debe leerse'
+
+        data, _ = self.fetch()
+        self.assertEqual(data, self.payload)
+        self.assertEqual(self.server.requests[-1].get('If-None-Match'), ETAG)
+        self.assertEqual(self.server.not_modified, 1)
+        self.assertEqual(self.server.bodies, 1)
+        self.assertEqual(os.stat(data_path).st_mtime_ns, mtime)
+
+    def test_offline_falls_back_to_cache(self):
+        self.fetch()
+        self.stop_server()
+
+        data, out = self.fetch()
+        self.assertEqual(data, self.payload)
+        self.assertIn('usando la copia local', out)
+
+    def test_offline_without_cache_uses_local_excel(self):
+        self.stop_server()
+
+        data, out = self.fetch()
+        self.assertEqual(data, self.payload)
+        self.assertIn(RecipeLoader.LOCAL_EXCEL, out)
+        self.assertFalse(os.path.exists(_cache_paths(self.url, self.cache_dir)[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()